@@ -0,0 +1,272 @@
+"""
+Paged, filterable admin lists
+Each admin list page is an AdminTable: a base query plus the filters, sort
+columns and text search it accepts from the query string. Pages use keyset
+pagination on (sort column, id), so a deep page costs the same as the first,
+and totals come from the table's row estimate whenever an exact COUNT(*)
+would have to scan a large table.
+"""
+
+from datetime import datetime, timedelta
+
+from pagination import clamp_page_size, keyset_page
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+COUNT_LIMIT = 10000   # exact counts stop here; bigger totals are shown as estimates or "10,000+"
+
+ORDER_STATUSES = ['pending', 'processing', 'shipped', 'completed', 'cancelled']
+MESSAGE_STATUSES = ['new', 'read', 'replied']
+RATINGS = ['5', '4', '3', '2', '1']
+
+
+class Filter:
+    """
+    One query-string filter. `kind` is 'choice' (one of `choices`), 'int',
+    'date_from' or 'date_to' (YYYY-MM-DD, the whole day included).
+    """
+
+    def __init__(self, name, label, column, kind='choice', choices=None):
+        self.name = name
+        self.label = label
+        self.column = column
+        self.kind = kind
+        self.choices = choices or []
+
+    def parse(self, raw):
+        """The SQL parameter for a query-string value, or None to ignore it"""
+        raw = (raw or '').strip()
+        if not raw:
+            return None
+        if self.kind == 'choice':
+            return raw if raw in self.choices else None
+        if self.kind == 'int':
+            return int(raw) if raw.isdigit() else None
+        try:
+            day = datetime.strptime(raw, '%Y-%m-%d')
+        except ValueError:
+            return None
+        return day + timedelta(days=1) if self.kind == 'date_to' else day
+
+    @property
+    def condition(self):
+        if self.kind == 'date_from':
+            return f"{self.column} >= %s"
+        if self.kind == 'date_to':
+            return f"{self.column} < %s"
+        return f"{self.column} = %s"
+
+
+def date_filters(column):
+    return [Filter('from', 'From', column, 'date_from'), Filter('to', 'To', column, 'date_to')]
+
+
+class AdminTable:
+    """
+    `source` is the FROM clause of the main table (e.g. "orders o"), `joins`
+    anything joined onto it for display only; filters and search must use
+    columns of the main table so counts can skip the joins. `sorts` maps a
+    sort key to (sql expression, row key, label).
+    """
+
+    def __init__(self, table, source, columns, sorts, joins='', default_sort='created',
+                 filters=(), search=(), id_column='id'):
+        self.table = table
+        self.source = source
+        self.columns = columns
+        self.joins = joins
+        self.sorts = sorts
+        self.default_sort = default_sort
+        self.filters = list(filters)
+        self.search = list(search)   # (sql expression, 'id' | 'prefix' | 'contains')
+        self.id_column = id_column
+
+    def where(self, args):
+        """(WHERE clause, params, query-string values in effect) for the request args"""
+        conditions = []
+        params = []
+        active = {}
+        for f in self.filters:
+            value = f.parse(args.get(f.name))
+            if value is not None:
+                conditions.append(f.condition)
+                params.append(value)
+                active[f.name] = args.get(f.name).strip()
+
+        text = (args.get('q') or '').strip()
+        if text and self.search:
+            matches = []
+            for column, kind in self.search:
+                if kind == 'id':
+                    if text.isdigit():
+                        matches.append(f"{column} = %s")
+                        params.append(int(text))
+                elif kind == 'prefix':
+                    matches.append(f"{column} LIKE %s")
+                    params.append(_escape_like(text) + '%')
+                else:
+                    # Can't use an index, but the page LIMIT stops the scan early on common terms
+                    matches.append(f"{column} LIKE %s")
+                    params.append('%' + _escape_like(text) + '%')
+            if matches:
+                conditions.append('(' + ' OR '.join(matches) + ')')
+                active['q'] = text
+        return ' AND '.join(conditions) or '1=1', params, active
+
+    def count(self, cursor, where, params):
+        """
+        (total, qualifier) for the rows matching `where`; qualifier is None for
+        an exact count, 'about' for a row estimate, 'over' when counting stopped
+        at COUNT_LIMIT
+        """
+        if where == '1=1':
+            # InnoDB's row estimate is free; COUNT(*) of a big table scans a whole index
+            cursor.execute(
+                "SELECT TABLE_ROWS AS total FROM information_schema.TABLES "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+                (self.table,)
+            )
+            estimate = _total(cursor.fetchone())
+            if estimate > COUNT_LIMIT:
+                return estimate, 'about'
+            cursor.execute(f"SELECT COUNT(*) AS total FROM {self.source}")
+            return _total(cursor.fetchone()), None
+
+        # Stop counting at COUNT_LIMIT + 1 rows so a broad filter never scans the whole table
+        cursor.execute(
+            f"SELECT COUNT(*) AS total FROM (SELECT 1 FROM {self.source} WHERE {where} LIMIT %s) counted",
+            params + [COUNT_LIMIT + 1]
+        )
+        total = _total(cursor.fetchone())
+        if total > COUNT_LIMIT:
+            return COUNT_LIMIT, 'over'
+        return total, None
+
+    def empty(self):
+        """A listing with no rows, for when the database is unavailable"""
+        return self._listing({'items': [], 'next_cursor': None, 'prev_cursor': None}, 0, None,
+                             {}, self.default_sort, 'desc')
+
+    def list(self, cursor, args):
+        """
+        One page of the table for the request args (filters, q, sort, dir,
+        cursor, per_page), read with a dictionary cursor
+        """
+        where, params, active = self.where(args)
+        sort = args.get('sort') if args.get('sort') in self.sorts else self.default_sort
+        direction = 'asc' if args.get('dir') == 'asc' else 'desc'
+        expression, row_key, _ = self.sorts[sort]
+        page_size = clamp_page_size(args.get('per_page'), default=PAGE_SIZE, maximum=MAX_PAGE_SIZE)
+
+        query = ' '.join(filter(None, [f"SELECT {self.columns} FROM {self.source}", self.joins, f"WHERE {where}"]))
+        page = keyset_page(cursor, query, params, [(expression, row_key), (self.id_column, 'id')],
+                           args.get('cursor'), page_size, descending=direction == 'desc')
+        total, qualifier = self.count(cursor, where, params)
+
+        if args.get('per_page'):
+            active['per_page'] = page_size
+        return self._listing(page, total, qualifier, active, sort, direction)
+
+    def _listing(self, page, total, qualifier, active, sort, direction):
+        # Query-string arguments that links to other pages or sort orders must carry over
+        link_args = dict(active)
+        if sort != self.default_sort or direction != 'desc':
+            link_args.update(sort=sort, dir=direction)
+        sort_args = {}
+        for key in self.sorts:
+            flip = 'asc' if key == sort and direction == 'desc' else 'desc'
+            sort_args[key] = dict(link_args, sort=key, dir=flip)
+
+        return {
+            'items': page['items'],
+            'page': page,
+            'total': total,
+            'total_qualifier': qualifier,
+            'filters': [(f, active.get(f.name, '')) for f in self.filters],
+            'searchable': bool(self.search),
+            'q': active.get('q', ''),
+            'filtered': any(key != 'per_page' for key in active),
+            'sort': sort,
+            'dir': direction,
+            'sorts': {key: label for key, (_, _, label) in self.sorts.items()},
+            'args': link_args,
+            'sort_args': sort_args,
+        }
+
+
+def _total(row):
+    return int(row['total'] or 0) if row else 0
+
+
+def _escape_like(text):
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+USERS = AdminTable(
+    'users', 'users u',
+    # Everything but the password hash
+    'u.id, u.name, u.email, u.phone, u.role, u.created_at',
+    sorts={
+        'created': ('u.created_at', 'created_at', 'Joined'),
+        'name': ('u.name', 'name', 'Name'),
+        'email': ('u.email', 'email', 'Email'),
+    },
+    filters=[Filter('role', 'Role', 'u.role', choices=['user', 'admin'])] + date_filters('u.created_at'),
+    search=[('u.id', 'id'), ('u.name', 'prefix'), ('u.email', 'prefix')],
+    id_column='u.id',
+)
+
+ORDERS = AdminTable(
+    'orders', 'orders o',
+    'o.*, u.name AS user_name',
+    joins='JOIN users u ON o.user_id = u.id',
+    sorts={
+        'created': ('o.created_at', 'created_at', 'Date'),
+        'total': ('o.total_amount', 'total_amount', 'Total Amount'),
+    },
+    filters=[Filter('status', 'Status', 'o.status', choices=ORDER_STATUSES),
+             Filter('user', 'User ID', 'o.user_id', 'int')] + date_filters('o.created_at'),
+    search=[('o.id', 'id')],
+    id_column='o.id',
+)
+
+FEEDBACKS = AdminTable(
+    'feedbacks', 'feedbacks f',
+    'f.*, u.name AS user_name, p.name AS product_name',
+    joins='JOIN users u ON f.user_id = u.id JOIN products p ON f.product_id = p.id',
+    sorts={
+        'created': ('f.created_at', 'created_at', 'Date'),
+        'rating': ('f.rating', 'rating', 'Rating'),
+    },
+    filters=[Filter('rating', 'Rating', 'f.rating', choices=RATINGS),
+             Filter('user', 'User ID', 'f.user_id', 'int'),
+             Filter('product', 'Product ID', 'f.product_id', 'int')] + date_filters('f.created_at'),
+    search=[('f.id', 'id'), ('f.comment', 'contains')],
+    id_column='f.id',
+)
+
+GENERAL_FEEDBACK = AdminTable(
+    'general_feedback', 'general_feedback gf',
+    'gf.*, u.name AS user_name',
+    joins='LEFT JOIN users u ON gf.user_id = u.id',
+    sorts={
+        'created': ('gf.created_at', 'created_at', 'Date'),
+        'rating': ('gf.rating', 'rating', 'Rating'),
+    },
+    filters=[Filter('status', 'Status', 'gf.status', choices=MESSAGE_STATUSES),
+             Filter('rating', 'Rating', 'gf.rating', choices=RATINGS)] + date_filters('gf.created_at'),
+    search=[('gf.id', 'id'), ('gf.name', 'prefix'), ('gf.email', 'prefix'), ('gf.subject', 'prefix')],
+    id_column='gf.id',
+)
+
+CONTACT_MESSAGES = AdminTable(
+    'contact_messages', 'contact_messages cm',
+    'cm.*, u.name AS user_name',
+    joins='LEFT JOIN users u ON cm.user_id = u.id',
+    sorts={
+        'created': ('cm.created_at', 'created_at', 'Date'),
+    },
+    filters=[Filter('status', 'Status', 'cm.status', choices=MESSAGE_STATUSES)] + date_filters('cm.created_at'),
+    search=[('cm.id', 'id'), ('cm.name', 'prefix'), ('cm.email', 'prefix'), ('cm.subject', 'prefix')],
+    id_column='cm.id',
+)
@@ -0,0 +1,367 @@
+"""
+Versioned JSON API for Campus Marketplace (/api/v1)
+Authenticates with the JWT access tokens from flask_jwt_extended instead of
+the session cookie. List endpoints use the same cursor tokens as the HTML
+pages, `?fields=id,name,price` trims each object to the listed keys, and GET
+responses carry an ETag (304 on a match) and are gzipped when the client
+accepts it.
+"""
+
+import gzip
+import hashlib
+
+from flask import Blueprint, current_app, jsonify, request
+from flask_jwt_extended import create_access_token, get_jwt_identity, jwt_required
+from mysql.connector import Error
+
+from cart_service import MAX_BULK_ITEMS, add_item, add_items, reconcile_cart
+from order_service import StockChanged, place_order
+from passwords import PasswordBusy
+from pagination import clamp_page_size, keyset_page
+from ratings import PRODUCT_WITH_RATINGS_QUERY, rating_summary, record_rating, reviews_page
+from search import query_products
+
+api = Blueprint('api_v1', __name__, url_prefix='/api/v1')
+
+# Smaller bodies aren't worth the CPU or the extra header
+GZIP_MIN_SIZE = 1024
+
+ORDER_LIST_ORDER = [('o.created_at', 'created_at'), ('o.id', 'id')]
+
+
+def init_app(app, get_connection, release_connection, page_cache, password_hasher, upgrade_password_hash):
+    """
+    Register the blueprint; the app supplies its connection getter and the
+    function returning the request's connections to the pool, its page
+    cache, password hasher and the function that rehashes outdated passwords
+    """
+    app.extensions['api_v1'] = {'get_connection': get_connection, 'release_connection': release_connection,
+                                'page_cache': page_cache, 'password_hasher': password_hasher,
+                                'upgrade_password_hash': upgrade_password_hash}
+    app.register_blueprint(api)
+
+
+def _get_connection(readonly=False):
+    # Token clients have no session to pin them to the primary after a write, so only
+    # catalog reads use readonly=True; carts, orders and reviews read from the primary
+    return current_app.extensions['api_v1']['get_connection'](readonly=readonly)
+
+
+def _invalidate_pages(*namespaces):
+    current_app.extensions['api_v1']['page_cache'].invalidate(*namespaces)
+
+
+def _current_user_id():
+    return int(get_jwt_identity())
+
+
+def error(message, status):
+    return jsonify({'success': False, 'message': message}), status
+
+
+def select_fields(rows):
+    """Apply ?fields=a,b,c to a dict or list of dicts"""
+    fields = [f.strip() for f in request.args.get('fields', '').split(',') if f.strip()]
+    if not fields:
+        return rows
+    if isinstance(rows, dict):
+        return {k: rows[k] for k in fields if k in rows}
+    return [{k: row[k] for k in fields if k in row} for row in rows]
+
+
+def page_response(key, page):
+    return jsonify({
+        'success': True,
+        key: select_fields(page['items']),
+        'next_cursor': page['next_cursor'],
+        'prev_cursor': page['prev_cursor'],
+    })
+
+
+@api.after_request
+def conditional_and_compressed(response):
+    if request.method != 'GET' or response.status_code != 200 or response.direct_passthrough:
+        return response
+
+    body = response.get_data()
+    use_gzip = len(body) >= GZIP_MIN_SIZE and request.accept_encodings['gzip']
+    # Each encoding is its own representation, so it gets its own validator
+    etag = hashlib.md5(body).hexdigest() + ('-gz' if use_gzip else '')
+    response.set_etag(etag)
+    response.vary.add('Accept-Encoding')
+    response.vary.add('Authorization')
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.make_conditional(request)
+
+    if response.status_code == 200 and use_gzip:
+        response.set_data(gzip.compress(body, compresslevel=6))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
+# Auth -----------------------------------------------------------------------
+
+@api.route('/auth/token', methods=['POST'])
+def issue_token():
+    data = request.get_json(silent=True) or {}
+    email = data.get('email')
+    password = data.get('password')
+    if not email or not password:
+        return error('Email and password are required', 400)
+
+    conn = _get_connection()
+    if not conn:
+        return error('Database error', 500)
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute("SELECT id, name, email, password, role FROM users WHERE email = %s", (email,))
+    user = cursor.fetchone()
+    cursor.close()
+    # Give the connection back while the password is checked, as login() does
+    current_app.extensions['api_v1']['release_connection']()
+
+    try:
+        valid = bool(user) and current_app.extensions['api_v1']['password_hasher'].check(user['password'], password)
+    except PasswordBusy as e:
+        response, status = error('Too many sign-ins right now, retry shortly', 503)
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response, status
+    if not valid:
+        return error('Invalid email or password', 401)
+    current_app.extensions['api_v1']['upgrade_password_hash'](user, password)
+
+    # JWT subjects must be strings
+    access_token = create_access_token(identity=str(user['id']))
+    return jsonify({
+        'success': True,
+        'access_token': access_token,
+        'user': {'id': user['id'], 'name': user['name'], 'email': user['email'], 'role': user['role']},
+    })
+
+
+# Products -------------------------------------------------------------------
+
+@api.route('/products')
+def list_products():
+    conn = _get_connection(readonly=True)
+    if not conn:
+        return error('Database error', 500)
+    cursor = conn.cursor(dictionary=True)
+    page = query_products(cursor, request.args.get('search', ''), request.args.get('category', ''),
+                          request.args.get('cursor'), clamp_page_size(request.args.get('per_page')))
+    cursor.close()
+    conn.close()
+    return page_response('products', page)
+
+
+@api.route('/products/<int:product_id>')
+def get_product(product_id):
+    conn = _get_connection(readonly=True)
+    if not conn:
+        return error('Database error', 500)
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(PRODUCT_WITH_RATINGS_QUERY, (product_id,))
+    product = cursor.fetchone()
+    cursor.close()
+    conn.close()
+
+    if not product:
+        return error('Product not found', 404)
+    summary = rating_summary(product)
+    for column in ('rating_count', 'rating_sum', 'r1', 'r2', 'r3', 'r4', 'r5'):
+        product.pop(column)
+    product['rating'] = summary
+    return jsonify({'success': True, 'product': select_fields(product)})
+
+
+@api.route('/products/<int:product_id>/reviews')
+def list_reviews(product_id):
+    conn = _get_connection()
+    if not conn:
+        return error('Database error', 500)
+    cursor = conn.cursor(dictionary=True)
+    page = reviews_page(cursor, product_id, request.args.get('cursor'),
+                        clamp_page_size(request.args.get('per_page'), default=10))
+    cursor.close()
+    conn.close()
+    return page_response('reviews', page)
+
+
+@api.route('/products/<int:product_id>/reviews', methods=['POST'])
+@jwt_required()
+def add_review(product_id):
+    data = request.get_json(silent=True) or {}
+    try:
+        rating = int(data.get('rating', 5))
+    except (TypeError, ValueError):
+        return error('Rating must be a number', 400)
+    if rating < 1 or rating > 5:
+        return error('Rating must be between 1 and 5', 400)
+
+    conn = _get_connection()
+    if not conn:
+        return error('Database error', 500)
+    cursor = conn.cursor()
+    cursor.execute("SELECT id FROM products WHERE id = %s", (product_id,))
+    if not cursor.fetchone():
+        cursor.close()
+        conn.close()
+        return error('Product not found', 404)
+    cursor.execute(
+        "INSERT INTO feedbacks (user_id, product_id, rating, comment) VALUES (%s, %s, %s, %s)",
+        (_current_user_id(), product_id, rating, data.get('comment', ''))
+    )
+    review_id = cursor.lastrowid
+    record_rating(cursor, product_id, rating)
+    conn.commit()
+    cursor.close()
+    conn.close()
+    _invalidate_pages(f'product:{product_id}')
+    return jsonify({'success': True, 'review_id': review_id}), 201
+
+
+# Cart -----------------------------------------------------------------------
+
+@api.route('/cart')
+@jwt_required()
+def get_cart():
+    conn = _get_connection()
+    if not conn:
+        return error('Database error', 500)
+    result = reconcile_cart(conn, _current_user_id())
+    conn.close()
+    return jsonify({
+        'success': True,
+        'items': select_fields(result['items']),
+        'total': result['total'],
+        'messages': [text for text, _ in result['messages']],
+    })
+
+
+@api.route('/cart', methods=['POST'])
+@jwt_required()
+def add_to_cart():
+    """Body is {"product_id", "quantity"} or {"items": [{"product_id", "quantity"}, ...]}"""
+    data = request.get_json(silent=True) or {}
+    try:
+        if 'items' in data:
+            items = [(int(item['product_id']), int(item.get('quantity', 1))) for item in data['items']]
+        else:
+            items = [(int(data['product_id']), int(data.get('quantity', 1)))]
+    except (KeyError, TypeError, ValueError):
+        return error('Invalid items', 400)
+
+    items = [(product_id, quantity) for product_id, quantity in items if quantity > 0]
+    if not items:
+        return error('No items to add', 400)
+    if len(items) > MAX_BULK_ITEMS:
+        return error(f'At most {MAX_BULK_ITEMS} items per request', 400)
+
+    conn = _get_connection()
+    if not conn:
+        return error('Database error', 500)
+    if len(items) == 1:
+        changed = add_item(conn, _current_user_id(), *items[0])
+    else:
+        changed = add_items(conn, _current_user_id(), items)
+    conn.close()
+
+    if not changed:
+        return error('Not enough stock available', 409)
+    return jsonify({'success': True})
+
+
+@api.route('/cart/<int:product_id>', methods=['PUT', 'DELETE'])
+@jwt_required()
+def update_cart_item(product_id):
+    quantity = 0
+    if request.method == 'PUT':
+        data = request.get_json(silent=True) or {}
+        try:
+            quantity = int(data['quantity'])
+        except (KeyError, TypeError, ValueError):
+            return error('Quantity is required', 400)
+
+    conn = _get_connection()
+    if not conn:
+        return error('Database error', 500)
+    cursor = conn.cursor()
+    if quantity <= 0:
+        cursor.execute("DELETE FROM cart WHERE user_id = %s AND product_id = %s", (_current_user_id(), product_id))
+    else:
+        cursor.execute(
+            "UPDATE cart SET quantity = %s WHERE user_id = %s AND product_id = %s",
+            (quantity, _current_user_id(), product_id)
+        )
+    conn.commit()
+    cursor.close()
+    conn.close()
+    return jsonify({'success': True})
+
+
+# Orders ---------------------------------------------------------------------
+
+@api.route('/checkout', methods=['POST'])
+@jwt_required()
+def checkout():
+    data = request.get_json(silent=True) or {}
+    address = (data.get('shipping_address') or '').strip()
+    if not address:
+        return error('Please provide a shipping address', 400)
+
+    conn = _get_connection()
+    if not conn:
+        return error('Database error', 500)
+    try:
+        result = place_order(conn, _current_user_id(), data.get('payment_method', 'cash'), address)
+    except (Error, StockChanged) as e:
+        print(f"Error placing order: {e!r}")
+        return error('Could not place your order. Please try again.', 409)
+    finally:
+        conn.close()
+
+    messages = [text for text, _ in result['messages']]
+    if result['order_id'] is None:
+        return jsonify({'success': False, 'messages': messages}), 409
+    _invalidate_pages(*[f'product:{pid}' for pid in result['product_ids']])
+    return jsonify({'success': True, 'order_id': result['order_id'], 'messages': messages}), 201
+
+
+@api.route('/orders')
+@jwt_required()
+def list_orders():
+    conn = _get_connection()
+    if not conn:
+        return error('Database error', 500)
+    cursor = conn.cursor(dictionary=True)
+    page = keyset_page(cursor, "SELECT o.* FROM orders o WHERE o.user_id = %s", [_current_user_id()],
+                       ORDER_LIST_ORDER, request.args.get('cursor'), clamp_page_size(request.args.get('per_page')))
+    cursor.close()
+    conn.close()
+    return page_response('orders', page)
+
+
+@api.route('/orders/<int:order_id>')
+@jwt_required()
+def get_order(order_id):
+    conn = _get_connection()
+    if not conn:
+        return error('Database error', 500)
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute("SELECT * FROM orders WHERE id = %s AND user_id = %s", (order_id, _current_user_id()))
+    order = cursor.fetchone()
+    if order:
+        cursor.execute(
+            """SELECT oi.product_id, oi.quantity, oi.price, p.name, p.image
+               FROM order_items oi
+               LEFT JOIN products p ON oi.product_id = p.id
+               WHERE oi.order_id = %s""",
+            (order_id,)
+        )
+        order['items'] = cursor.fetchall()
+    cursor.close()
+    conn.close()
+
+    if not order:
+        return error('Order not found', 404)
+    return jsonify({'success': True, 'order': select_fields(order)})
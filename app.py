@@ -1,13 +1,39 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash
-from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
-from werkzeug.security import generate_password_hash, check_password_hash
-from werkzeug.utils import secure_filename
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash, g, has_app_context, has_request_context, stream_with_context
+from flask_jwt_extended import JWTManager, jwt_required, get_jwt_identity
 from functools import wraps
 import mysql.connector
 from mysql.connector import Error
 from datetime import datetime, timedelta
 import os
 import json
+import random
+import tempfile
+import threading
+import time
+try:
+    import fcntl
+except ImportError:  # not on Windows; every process then runs its own background jobs
+    fcntl = None
+from db_pool import ConnectionPool, PooledConnection
+from cache import TTLCache, make_backend
+from page_cache import PageCache
+from pagination import clamp_page_size
+from search import query_products, suggest_products, category_facets
+from order_service import place_order, StockChanged
+from cart_service import reconcile_cart, add_item, add_items, MAX_BULK_ITEMS
+import stats
+from ratings import record_rating, remove_user_ratings, rebuild_ratings, rating_summary, reviews_page, PRODUCT_WITH_RATINGS_QUERY
+from image_pipeline import ImagePipeline
+from passwords import PasswordHasher, PasswordBusy
+from storage import make_storage, add_ref, drop_ref, claim_blob, start_collector
+import assets
+import api
+import migrations
+import instrumentation
+import ratelimit
+import admin_tables
+from status_changes import change_status, parse_ids, StatusChangeError, ORDER_TRANSITIONS
+from bulk_io import import_products, read_rows, export_rows, ImportFormatError, EXPORT_COLUMNS, FORMATS
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key-change-in-production'
@@ -15,14 +41,136 @@ app.config['JWT_SECRET_KEY'] = 'jwt-secret-string-change-in-production'
 app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=24)
 app.config['UPLOAD_FOLDER'] = 'static/uploads'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+app.config['IMAGE_VARIANT_WIDTHS'] = (320, 640, 1024)  # resized copies served through srcset
+app.config['IMAGE_WORKERS'] = 2                        # background threads generating variants
+app.config['DEFAULT_PRODUCT_IMAGE'] = 'default-product.jpg'
 app.config['SESSION_COOKIE_HTTPONLY'] = True
 app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
 
+# Password hashing runs in a process pool so it can't tie up request threads (see passwords.py)
+app.config['PASSWORD_HASH_METHOD'] = 'scrypt:32768:8:1'  # older hashes are upgraded at login
+app.config['PASSWORD_HASH_WORKERS'] = 2       # processes per server worker; 0 = hash in the request thread
+app.config['PASSWORD_HASH_MAX_PENDING'] = 16  # queued checks beyond this get a 503 with Retry-After
+app.config['PASSWORD_HASH_TIMEOUT'] = 10      # seconds to wait for a result
+
+# Connection pool settings
+app.config['DB_POOL_SIZE'] = 5             # connections kept open between requests
+app.config['DB_POOL_MAX_OVERFLOW'] = 10    # extra connections allowed under load
+app.config['DB_POOL_IDLE_TIMEOUT'] = 300   # seconds before an idle connection is closed
+app.config['DB_POOL_TIMEOUT'] = 10         # seconds to wait for a free connection
+
+# Read replicas: DB_CONFIG overrides per replica, e.g. [{'host': 'replica1'}, {'port': 3307}].
+# Catalog reads go to a replica; a user who just wrote reads from the primary for a while
+app.config['DB_REPLICAS'] = []
+app.config['DB_REPLICA_PIN_SECONDS'] = 5     # read-your-writes window after a commit
+app.config['DB_REPLICA_RETRY_SECONDS'] = 30  # a replica that failed is skipped this long
+
+# Query instrumentation (see instrumentation.py)
+app.config['QUERY_INSTRUMENTATION'] = True  # time every query and add Server-Timing headers
+app.config['SLOW_QUERY_MS'] = 200           # queries slower than this are logged
+app.config['N_PLUS_ONE_THRESHOLD'] = 5      # same statement this often in one request is logged
+app.config['QUERY_DEBUG_PANEL'] = None      # query panel on HTML pages; None = only in debug mode
+app.config['METRICS_ALLOWED_IPS'] = ('127.0.0.1', '::1')  # who may scrape /metrics; None = anyone
+# Bearer token required to scrape /metrics instead of the IP check; use it behind a reverse proxy
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN') or None
+
+# Rate limits on write endpoints: endpoint -> {'ip' or 'user': (requests, per seconds)}.
+# Buckets are shared between workers through CACHE_BACKEND when it is set (see ratelimit.py).
+# Behind a reverse proxy, wrap the app in werkzeug's ProxyFix so 'ip' is the client's address
+app.config['RATE_LIMIT_ENABLED'] = True
+app.config['RATE_LIMITS'] = {
+    'login': {'ip': (10, 60)},
+    'register': {'ip': (5, 600)},
+    'add_to_cart': {'user': (60, 60), 'ip': (120, 60)},
+    'add_to_cart_bulk': {'user': (20, 60)},
+    'add_feedback': {'user': (10, 600)},
+    'feedback_page': {'ip': (5, 600)},
+    'contact': {'ip': (5, 600)},
+    'api_v1.issue_token': {'ip': (10, 60)},
+    # JSON API writes get the same limits as the pages they mirror
+    'api_v1.add_to_cart': {'user': (60, 60), 'ip': (120, 60)},
+    'api_v1.update_cart_item': {'user': (60, 60), 'ip': (120, 60)},
+    'api_v1.add_review': {'user': (10, 600)},
+    'api_v1.checkout': {'user': (20, 60)},
+}
+# Requests in progress per process before new ones get a 503; None = DB pool size + overflow, 0 = no cap
+app.config['MAX_CONCURRENT_REQUESTS'] = None
+app.config['OVERLOAD_RETRY_AFTER'] = 1      # seconds suggested to shed clients
+
+# Shared cache backend: None (per-process only), 'local' or a redis:// URL.
+# Gunicorn refuses to start more than one worker without a redis:// backend (see gunicorn.conf.py)
+app.config['CACHE_BACKEND'] = os.environ.get('CACHE_BACKEND') or None
+app.config['PRINCIPAL_CACHE_TTL'] = 300    # seconds a cached user role stays valid
+app.config['PAGE_CACHE_TTL'] = 60          # seconds a rendered home/product page is reused
+
+# Dashboard totals are kept incrementally and recomputed this often (seconds)
+app.config['STATS_RECONCILE_INTERVAL'] = 600
+# Only the process holding this lock runs the reconciler and upload collector
+app.config['BACKGROUND_JOBS_LOCK'] = os.path.join(tempfile.gettempdir(), 'campus-marketplace-jobs.lock')
+app.config['BACKGROUND_JOBS_RETRY'] = 30   # seconds between attempts by the other processes
+
+# Upload storage: 'local' (UPLOAD_FOLDER) or 's3' (any S3-compatible service, needs boto3)
+app.config['STORAGE_BACKEND'] = 'local'
+app.config['S3_BUCKET'] = None
+app.config['S3_ENDPOINT_URL'] = None       # e.g. http://localhost:9000 for MinIO
+app.config['S3_PUBLIC_URL'] = None         # CDN or bucket URL uploads are served from
+app.config['S3_PREFIX'] = 'uploads/'
+app.config['STORAGE_GC_INTERVAL'] = 3600   # seconds between unused-upload sweeps
+app.config['STORAGE_GC_GRACE'] = 3600      # seconds an upload must be unreferenced before removal
+
 jwt = JWTManager(app)
+# Fingerprinted, precompressed CSS/JS bundles from build_assets.py
+assets.init_app(app)
+
+cache_backend = make_backend(app.config['CACHE_BACKEND'])
+# user_id -> {'id', 'role'} so admin checks don't hit the database on every request
+user_principals = TTLCache(maxsize=4096, ttl=app.config['PRINCIPAL_CACHE_TTL'],
+                           backend=cache_backend, namespace='principal')
+# Rendered home and product pages, invalidated when products or feedback change. With read
+# replicas, pages rendered within DB_REPLICA_PIN_SECONDS of an invalidation aren't cached
+page_cache = PageCache(ttl=app.config['PAGE_CACHE_TTL'], backend=cache_backend,
+                       settle_seconds=app.config['DB_REPLICA_PIN_SECONDS'] if app.config['DB_REPLICAS'] else 0)
+
+def claim_upload(filename):
+    """Record an upload in blobs before its file is reused so the collector leaves it alone"""
+    conn = get_db_connection()
+    if conn:
+        claim_blob(conn, filename)
+    # Without a database the file stays unrecorded until the collector's orphan sweep finds it
+
+
+storage = make_storage(app.config, app.static_url_path)
+# Uploads are staged in UPLOAD_FOLDER while variants are generated, then live in storage
+image_pipeline = ImagePipeline(storage, app.config['UPLOAD_FOLDER'], widths=app.config['IMAGE_VARIANT_WIDTHS'],
+                               max_workers=app.config['IMAGE_WORKERS'], claim=claim_upload)
+rate_limiter = ratelimit.RateLimiter(app.config['RATE_LIMITS'], backend=cache_backend)
+max_concurrent = app.config['MAX_CONCURRENT_REQUESTS']
+if max_concurrent is None:
+    # Shed load before requests start queueing for a database connection
+    max_concurrent = app.config['DB_POOL_SIZE'] + app.config['DB_POOL_MAX_OVERFLOW']
+admission = ratelimit.AdmissionControl(max_concurrent)
+password_hasher = PasswordHasher(app.config['PASSWORD_HASH_METHOD'], workers=app.config['PASSWORD_HASH_WORKERS'],
+                                 max_pending=app.config['PASSWORD_HASH_MAX_PENDING'],
+                                 timeout=app.config['PASSWORD_HASH_TIMEOUT'])
+
+@app.template_global()
+def upload_url(filename):
+    """Public URL of an uploaded file (the bundled default image is always served locally)"""
+    if filename == app.config['DEFAULT_PRODUCT_IMAGE']:
+        return url_for('static', filename='uploads/' + filename)
+    return storage.url(filename)
+
+@app.template_global()
+def image_srcset(filename, fmt):
+    """srcset of resized variants for an uploaded image ('' until they are generated)"""
+    return image_pipeline.srcset(filename, fmt)
 
 # Allowed file extensions
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 
+# MySQL error for a value that already exists under a unique index
+DUPLICATE_ENTRY = 1062
+
 # Database configuration
 DB_CONFIG = {
     'host': 'localhost',
@@ -31,191 +179,231 @@ DB_CONFIG = {
     'database': 'campus_marketplace'
 }
 
-def get_db_connection():
-    """Create and return database connection"""
+_db_pool = None
+_db_pool_lock = threading.Lock()
+_replica_pools = None
+_replica_down_until = {}  # replica index -> time.monotonic() until which it is skipped
+
+def _new_pool(config):
+    return ConnectionPool(
+        config,
+        size=app.config['DB_POOL_SIZE'],
+        max_overflow=app.config['DB_POOL_MAX_OVERFLOW'],
+        idle_timeout=app.config['DB_POOL_IDLE_TIMEOUT'],
+        timeout=app.config['DB_POOL_TIMEOUT']
+    )
+
+def get_db_pool():
+    """Return the shared connection pool for the primary, creating it on first use"""
+    global _db_pool
+    if _db_pool is None:
+        with _db_pool_lock:
+            if _db_pool is None:
+                _db_pool = _new_pool(DB_CONFIG)
+    return _db_pool
+
+def get_replica_pools():
+    """One pool per configured read replica (empty without DB_REPLICAS)"""
+    global _replica_pools
+    if _replica_pools is None:
+        with _db_pool_lock:
+            if _replica_pools is None:
+                _replica_pools = [_new_pool(dict(DB_CONFIG, **replica)) for replica in app.config['DB_REPLICAS']]
+    return _replica_pools
+
+def reset_db_pool(close=True):
+    """Drop the pools so the next get_db_pool() opens fresh connections.
+
+    Use close=False in a freshly forked worker: the inherited sockets belong
+    to the parent process and must not be used or shut down from the child.
+    """
+    global _db_pool, _db_pool_lock, _replica_pools
+    if not close:
+        # The parent may have held the lock at fork time
+        _db_pool, _replica_pools, _db_pool_lock = None, None, threading.Lock()
+        return
+    with _db_pool_lock:
+        pools = [_db_pool] + (_replica_pools or [])
+        _db_pool, _replica_pools = None, None
+    for pool in pools:
+        if pool is not None:
+            pool.close_all()
+
+def primary_pinned():
+    """True while the current user must read from the primary to see their own recent writes"""
+    return has_request_context() and session.get('_db_primary_until', 0) > time.time()
+
+def _borrow(pool):
+    wrap_cursor = instrumentation.InstrumentedCursor if app.config['QUERY_INSTRUMENTATION'] else None
+    return PooledConnection(pool, pool.acquire(), close_returns=not has_app_context(), wrap_cursor=wrap_cursor)
+
+def _borrow_replica():
+    """A connection to a random healthy replica, or None if none can be reached"""
+    pools = get_replica_pools()
+    for index in random.sample(range(len(pools)), len(pools)):
+        if _replica_down_until.get(index, 0) > time.monotonic():
+            continue
+        try:
+            return _borrow(pools[index])
+        except Error as e:
+            print(f"Replica {index} unavailable, skipping it for a while: {e}")
+            _replica_down_until[index] = time.monotonic() + app.config['DB_REPLICA_RETRY_SECONDS']
+    return None
+
+def get_db_connection(readonly=False):
+    """Borrow a pooled database connection.
+
+    Inside a request the same connection is reused for the whole request and
+    returned to the pool on teardown, so close() in route code is harmless.
+    readonly=True marks work that only reads: with DB_REPLICAS set it goes to
+    a replica, unless this request already uses the primary or the user wrote
+    something in the last DB_REPLICA_PIN_SECONDS. If no replica is reachable
+    the primary serves the read.
+    """
+    in_app = has_app_context()
+    if in_app and 'db_conn' in g:
+        return g.db_conn
+    if readonly and app.config['DB_REPLICAS'] and not primary_pinned():
+        if in_app and 'db_read_conn' in g:
+            return g.db_read_conn
+        conn = _borrow_replica()
+        if conn is not None:
+            if in_app:
+                g.db_read_conn = conn
+            return conn
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        return conn
+        conn = _borrow(get_db_pool())
     except Error as e:
         print(f"Error connecting to MySQL: {e}")
         return None
+    if in_app:
+        g.db_conn = conn
+    return conn
+
+@app.after_request
+def pin_writer_to_primary(response):
+    """After a request that committed, send this user's reads to the primary for a short while"""
+    conn = g.get('db_conn')
+    if conn is not None and conn.committed and app.config['DB_REPLICAS']:
+        session['_db_primary_until'] = time.time() + app.config['DB_REPLICA_PIN_SECONDS']
+    return response
+
+@app.teardown_appcontext
+def release_db_connection(exception=None):
+    """Return the request's connections to their pools, closing any cursors left open"""
+    for name in ('db_conn', 'db_read_conn'):
+        conn = g.pop(name, None)
+        if conn is not None:
+            conn.release()
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def get_user_principal(user_id):
+    """Return the cached {'id', 'role'} for a user, loading it from the database on a miss"""
+    principal = user_principals.get(user_id)
+    if principal is None:
+        conn = get_db_connection()
+        if not conn:
+            return None
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("SELECT id, role FROM users WHERE id = %s", (user_id,))
+        user = cursor.fetchone()
+        cursor.close()
+        conn.close()
+        # Cache missing users too so a deleted account can't force a query per request
+        principal = {'id': user_id, 'role': user['role'] if user else None}
+        user_principals.set(user_id, principal)
+    return principal
+
+def invalidate_user_principal(user_id):
+    """Drop a cached principal after the user is deleted or their role changes"""
+    user_principals.delete(user_id)
+
 def admin_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         if 'user_id' not in session:
             return redirect(url_for('login'))
-        conn = get_db_connection()
-        if conn:
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute("SELECT role FROM users WHERE id = %s", (session['user_id'],))
-            user = cursor.fetchone()
-            cursor.close()
-            conn.close()
-            if user and user['role'] == 'admin':
-                return f(*args, **kwargs)
+        principal = get_user_principal(session['user_id'])
+        if principal and principal['role'] == 'admin':
+            return f(*args, **kwargs)
         flash('Access denied. Admin privileges required.', 'danger')
         return redirect(url_for('home'))
     return decorated_function
 
-def init_db():
-    """Initialize database with schema"""
-    try:
-        # First, connect without database to create it
-        conn = mysql.connector.connect(
-            host=DB_CONFIG['host'],
-            user=DB_CONFIG['user'],
-            password=DB_CONFIG['password']
-        )
+# Per-request query counts and timings, Server-Timing headers and /metrics
+if app.config['QUERY_INSTRUMENTATION']:
+    instrumentation.init_app(app, pool_stats=lambda: get_db_pool().stats(),
+                             gauges={'password_hash': password_hasher.stats, 'rate_limit': rate_limiter.stats,
+                                     'admission': admission.stats})
+
+# Admission control and per-IP/per-user rate limits, checked before any database work
+ratelimit.init_app(app, rate_limiter, admission)
+
+def upgrade_password_hash(user, password):
+    """Rehash a password that just verified if its hash uses outdated parameters"""
+    new_hash = password_hasher.upgrade(user['password'], password)
+    if not new_hash:
+        return
+    conn = get_db_connection()
+    if conn:
         cursor = conn.cursor()
-        
-        # Create database if not exists
-        cursor.execute("CREATE DATABASE IF NOT EXISTS campus_marketplace")
+        # Only replace the hash that was checked, in case the password changed meanwhile
+        cursor.execute("UPDATE users SET password = %s WHERE id = %s AND password = %s",
+                       (new_hash, user['id'], user['password']))
+        conn.commit()
         cursor.close()
         conn.close()
-        
-        # Now connect to the database
+
+# JSON API for mobile clients and load tests, authenticated with JWTs
+api.init_app(app, get_db_connection, release_db_connection, page_cache, password_hasher, upgrade_password_hash)
+
+def init_db():
+    """Create the database if needed and apply any pending schema migrations.
+
+    When the schema is current this is a single primary-key read; see
+    migrations.py for the migrations themselves.
+    """
+    conn = get_db_connection()
+    if not conn:
+        # First run: create the database, then connect to it
+        try:
+            server = mysql.connector.connect(
+                host=DB_CONFIG['host'],
+                user=DB_CONFIG['user'],
+                password=DB_CONFIG['password']
+            )
+            cursor = server.cursor()
+            cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{DB_CONFIG['database']}`")
+            cursor.close()
+            server.close()
+        except Error as e:
+            print(f"Error creating database: {e}")
+            return []
         conn = get_db_connection()
         if not conn:
             print("Error: Could not connect to database")
-            return
-        
-        cursor = conn.cursor()
-        
-        # Create tables one by one
-        tables = [
-            """CREATE TABLE IF NOT EXISTS users (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                name VARCHAR(100) NOT NULL,
-                email VARCHAR(100) UNIQUE NOT NULL,
-                password VARCHAR(255) NOT NULL,
-                phone VARCHAR(20),
-                address TEXT,
-                role ENUM('user', 'admin') DEFAULT 'user',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
-            )""",
-            """CREATE TABLE IF NOT EXISTS products (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                name VARCHAR(200) NOT NULL,
-                description TEXT,
-                price DECIMAL(10, 2) NOT NULL,
-                category VARCHAR(50),
-                stock INT DEFAULT 0,
-                image VARCHAR(255) DEFAULT 'default-product.jpg',
-                seller_id INT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-                FOREIGN KEY (seller_id) REFERENCES users(id) ON DELETE CASCADE
-            )""",
-            """CREATE TABLE IF NOT EXISTS cart (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                user_id INT NOT NULL,
-                product_id INT NOT NULL,
-                quantity INT DEFAULT 1,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
-                FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE,
-                UNIQUE KEY unique_cart_item (user_id, product_id)
-            )""",
-            """CREATE TABLE IF NOT EXISTS orders (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                user_id INT NOT NULL,
-                total_amount DECIMAL(10, 2) NOT NULL,
-                payment_method VARCHAR(50),
-                shipping_address TEXT,
-                status ENUM('pending', 'processing', 'shipped', 'completed', 'cancelled') DEFAULT 'pending',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-            )""",
-            """CREATE TABLE IF NOT EXISTS order_items (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                order_id INT NOT NULL,
-                product_id INT NOT NULL,
-                quantity INT NOT NULL,
-                price DECIMAL(10, 2) NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (order_id) REFERENCES orders(id) ON DELETE CASCADE,
-                FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE
-            )""",
-            """CREATE TABLE IF NOT EXISTS feedbacks (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                user_id INT NOT NULL,
-                product_id INT NOT NULL,
-                rating INT DEFAULT 5,
-                comment TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
-                FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE,
-                CHECK (rating >= 1 AND rating <= 5)
-            )""",
-            """CREATE TABLE IF NOT EXISTS general_feedback (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                user_id INT,
-                name VARCHAR(100) NOT NULL,
-                email VARCHAR(100) NOT NULL,
-                subject VARCHAR(200),
-                message TEXT NOT NULL,
-                rating INT DEFAULT 5,
-                status ENUM('new', 'read', 'replied') DEFAULT 'new',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE SET NULL,
-                CHECK (rating >= 1 AND rating <= 5)
-            )""",
-            """CREATE TABLE IF NOT EXISTS contact_messages (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                user_id INT,
-                name VARCHAR(100) NOT NULL,
-                email VARCHAR(100) NOT NULL,
-                phone VARCHAR(20),
-                subject VARCHAR(200) NOT NULL,
-                message TEXT NOT NULL,
-                status ENUM('new', 'read', 'replied') DEFAULT 'new',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE SET NULL
-            )"""
-        ]
-        
-        # Execute each table creation
-        for table_sql in tables:
-            try:
-                cursor.execute(table_sql)
-                conn.commit()
-            except Error as e:
-                # Ignore errors for existing tables
-                if 'already exists' not in str(e).lower():
-                    print(f"Warning creating table: {e}")
-        
-        # Create admin user if not exists
-        try:
-            cursor.execute("SELECT id FROM users WHERE email = 'admin@campus.com'")
-            if not cursor.fetchone():
-                admin_password = generate_password_hash('admin123')
-                cursor.execute(
-                    "INSERT INTO users (name, email, password, role) VALUES (%s, %s, %s, 'admin')",
-                    ('Admin User', 'admin@campus.com', admin_password)
-                )
-                conn.commit()
-                print("Admin user created: admin@campus.com / admin123")
-        except Error as e:
-            print(f"Warning creating admin user: {e}")
-        
-        cursor.close()
-        conn.close()
-        print("Database initialized successfully!")
+            return []
+    
+    applied = []
+    try:
+        if migrations.current_version(conn) < migrations.LATEST_VERSION:
+            applied = migrations.migrate(conn)
+            print(f"Database migrated to version {migrations.LATEST_VERSION}")
     except Error as e:
-        print(f"Error initializing database: {e}")
+        print(f"Error migrating database: {e}")
         import traceback
         traceback.print_exc()
+    finally:
+        conn.close()
+    return applied
 
 # Routes
 @app.route('/')
+@page_cache.cached('home')
 def home():
-    conn = get_db_connection()
+    conn = get_db_connection(readonly=True)
     featured_products = []
     if conn:
         cursor = conn.cursor(dictionary=True)
@@ -223,6 +411,9 @@ def home():
         featured_products = cursor.fetchall()
         cursor.close()
         conn.close()
+    else:
+        # An empty storefront must not outlive a database outage in the cache
+        page_cache.skip()
     return render_template('home.html', products=featured_products)
 
 @app.route('/login', methods=['GET', 'POST'])
@@ -237,17 +428,22 @@ def login():
             cursor.execute("SELECT * FROM users WHERE email = %s", (email,))
             user = cursor.fetchone()
             cursor.close()
-            conn.close()
+            # Give the connection back while the password is checked
+            release_db_connection()
             
-            if user and check_password_hash(user['password'], password):
+            try:
+                valid = bool(user) and password_hasher.check(user['password'], password)
+            except PasswordBusy as e:
+                flash('Too many people are signing in right now. Please try again in a moment.', 'warning')
+                return render_template('login.html'), 503, {'Retry-After': str(e.retry_after)}
+            
+            if valid:
+                upgrade_password_hash(user, password)
                 session['user_id'] = user['id']
                 session['user_name'] = user['name']
                 session['user_email'] = user['email']
                 session['user_role'] = user['role']
                 
-                # Create JWT token
-                access_token = create_access_token(identity=user['id'])
-                
                 flash('Login successful!', 'success')
                 if user['role'] == 'admin':
                     return redirect(url_for('admin_dashboard'))
@@ -270,23 +466,31 @@ def register():
             flash('Passwords do not match', 'danger')
             return render_template('register.html')
         
+        # Hash before borrowing a connection so none is held during the slow part
+        try:
+            hashed_password = password_hasher.hash(password)
+        except PasswordBusy as e:
+            flash('Too many people are signing up right now. Please try again in a moment.', 'warning')
+            return render_template('register.html'), 503, {'Retry-After': str(e.retry_after)}
+        
         conn = get_db_connection()
         if conn:
             cursor = conn.cursor()
-            # Check if user exists
-            cursor.execute("SELECT id FROM users WHERE email = %s", (email,))
-            if cursor.fetchone():
-                flash('Email already registered', 'danger')
+            # The unique index on email rejects a taken address, no need to look it up first
+            try:
+                cursor.execute(
+                    "INSERT INTO users (name, email, password, phone, role) VALUES (%s, %s, %s, %s, 'user')",
+                    (name, email, hashed_password, phone)
+                )
+            except Error as e:
+                conn.rollback()
                 cursor.close()
                 conn.close()
+                if e.errno != DUPLICATE_ENTRY:
+                    raise
+                flash('Email already registered', 'danger')
                 return render_template('register.html')
-            
-            # Create new user
-            hashed_password = generate_password_hash(password)
-            cursor.execute(
-                "INSERT INTO users (name, email, password, phone, role) VALUES (%s, %s, %s, %s, 'user')",
-                (name, email, hashed_password, phone)
-            )
+            stats.bump(cursor, total_users=1)
             conn.commit()
             cursor.close()
             conn.close()
@@ -306,49 +510,86 @@ def logout():
 def products():
     search = request.args.get('search', '')
     category = request.args.get('category', '')
+    token = request.args.get('cursor')
+    page_size = clamp_page_size(request.args.get('per_page'))
     
-    conn = get_db_connection()
-    products_list = []
+    conn = get_db_connection(readonly=True)
+    page = {'items': [], 'next_cursor': None, 'prev_cursor': None}
+    facets = []
     if conn:
         cursor = conn.cursor(dictionary=True)
-        query = "SELECT p.*, u.name as seller_name FROM products p JOIN users u ON p.seller_id = u.id WHERE 1=1"
-        params = []
-        
+        page = query_products(cursor, search, category, token, page_size)
         if search:
-            query += " AND (p.name LIKE %s OR p.description LIKE %s)"
-            params.extend([f'%{search}%', f'%{search}%'])
-        
-        if category:
-            query += " AND p.category = %s"
-            params.append(category)
-        
-        query += " ORDER BY p.created_at DESC"
-        cursor.execute(query, params)
-        products_list = cursor.fetchall()
+            facets = category_facets(cursor, search)
         cursor.close()
         conn.close()
     
-    return render_template('products.html', products=products_list, search=search, category=category)
+    return render_template('products.html', products=page['items'], page=page, facets=facets, search=search, category=category)
+
+@app.route('/api/products')
+def api_products():
+    """JSON version of the product listing with the same cursor tokens"""
+    search = request.args.get('search', '')
+    category = request.args.get('category', '')
+    token = request.args.get('cursor')
+    page_size = clamp_page_size(request.args.get('per_page'))
+    
+    conn = get_db_connection(readonly=True)
+    if not conn:
+        return jsonify({'success': False, 'message': 'Database error'}), 500
+    cursor = conn.cursor(dictionary=True)
+    page = query_products(cursor, search, category, token, page_size)
+    cursor.close()
+    conn.close()
+    
+    def page_url(cursor_token):
+        if not cursor_token:
+            return None
+        return url_for('api_products', search=search or None, category=category or None,
+                       per_page=page_size, cursor=cursor_token)
+    
+    return jsonify({
+        'success': True,
+        'products': page['items'],
+        'next_cursor': page['next_cursor'],
+        'prev_cursor': page['prev_cursor'],
+        'next': page_url(page['next_cursor']),
+        'prev': page_url(page['prev_cursor'])
+    })
+
+@app.route('/api/products/suggest')
+def api_product_suggestions():
+    """Autocomplete suggestions for the product search box"""
+    prefix = request.args.get('q', '').strip()
+    if not prefix:
+        return jsonify({'success': True, 'suggestions': []})
+    
+    conn = get_db_connection(readonly=True)
+    if not conn:
+        return jsonify({'success': False, 'message': 'Database error'}), 500
+    cursor = conn.cursor(dictionary=True)
+    suggestions = suggest_products(cursor, prefix)
+    cursor.close()
+    conn.close()
+    
+    return jsonify({'success': True, 'suggestions': suggestions})
 
 @app.route('/product/<int:product_id>')
+@page_cache.cached(lambda product_id: f'product:{product_id}')
 def product_details(product_id):
-    conn = get_db_connection()
+    conn = get_db_connection(readonly=True)
     product = None
-    feedbacks = []
+    summary = None
+    reviews = {'items': [], 'next_cursor': None, 'prev_cursor': None}
     if conn:
         cursor = conn.cursor(dictionary=True)
-        cursor.execute(
-            "SELECT p.*, u.name as seller_name, u.email as seller_email FROM products p JOIN users u ON p.seller_id = u.id WHERE p.id = %s",
-            (product_id,)
-        )
+        cursor.execute(PRODUCT_WITH_RATINGS_QUERY, (product_id,))
         product = cursor.fetchone()
         
         if product:
-            cursor.execute(
-                "SELECT f.*, u.name as user_name FROM feedbacks f JOIN users u ON f.user_id = u.id WHERE f.product_id = %s ORDER BY f.created_at DESC",
-                (product_id,)
-            )
-            feedbacks = cursor.fetchall()
+            summary = rating_summary(product)
+            if summary['count']:
+                reviews = reviews_page(cursor, product_id, request.args.get('cursor'))
         
         cursor.close()
         conn.close()
@@ -357,7 +598,8 @@ def product_details(product_id):
         flash('Product not found', 'danger')
         return redirect(url_for('products'))
     
-    return render_template('product_details.html', product=product, feedbacks=feedbacks)
+    return render_template('product_details.html', product=product, feedbacks=reviews['items'],
+                           reviews=reviews, rating_summary=summary)
 
 @app.route('/add_to_cart', methods=['POST'])
 def add_to_cart():
@@ -371,40 +613,52 @@ def add_to_cart():
     data = request.get_json()
     product_id = data.get('product_id')
     quantity = int(data.get('quantity', 1))
+    if quantity < 1:
+        return jsonify({'success': False, 'message': 'Quantity must be at least 1'}), 400
     
     conn = get_db_connection()
     if conn:
-        cursor = conn.cursor()
-        
-        # Check if item already in cart
-        cursor.execute(
-            "SELECT id, quantity FROM cart WHERE user_id = %s AND product_id = %s",
-            (session['user_id'], product_id)
-        )
-        cart_item = cursor.fetchone()
-        
-        if cart_item:
-            # Update quantity
-            new_quantity = cart_item[1] + quantity
-            cursor.execute(
-                "UPDATE cart SET quantity = %s WHERE id = %s",
-                (new_quantity, cart_item[0])
-            )
-        else:
-            # Add new item
-            cursor.execute(
-                "INSERT INTO cart (user_id, product_id, quantity) VALUES (%s, %s, %s)",
-                (session['user_id'], product_id, quantity)
-            )
-        
-        conn.commit()
-        cursor.close()
+        added = add_item(conn, session['user_id'], product_id, quantity)
         conn.close()
         
+        if not added:
+            return jsonify({'success': False, 'message': 'Not enough stock available'}), 409
         return jsonify({'success': True, 'message': 'Item added to cart'})
     
     return jsonify({'success': False, 'message': 'Database error'}), 500
 
+@app.route('/add_to_cart/bulk', methods=['POST'])
+def add_to_cart_bulk():
+    """Add or top up many cart items in one request (reorder / add all)"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Please login first'}), 401
+    
+    if not request.is_json:
+        return jsonify({'success': False, 'message': 'Invalid request format'}), 400
+    
+    data = request.get_json()
+    try:
+        items = [(int(item['product_id']), int(item.get('quantity', 1))) for item in data.get('items', [])]
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'Invalid items'}), 400
+    
+    items = [(product_id, quantity) for product_id, quantity in items if quantity > 0]
+    if not items:
+        return jsonify({'success': False, 'message': 'No items to add'}), 400
+    if len(items) > MAX_BULK_ITEMS:
+        return jsonify({'success': False, 'message': f'At most {MAX_BULK_ITEMS} items per request'}), 400
+    
+    conn = get_db_connection()
+    if conn:
+        changed = add_items(conn, session['user_id'], items)
+        conn.close()
+        
+        if not changed:
+            return jsonify({'success': False, 'message': 'None of these items are in stock'}), 409
+        return jsonify({'success': True, 'message': 'Items added to cart'})
+    
+    return jsonify({'success': False, 'message': 'Database error'}), 500
+
 @app.route('/cart')
 def cart():
     if 'user_id' not in session:
@@ -415,54 +669,11 @@ def cart():
     cart_items = []
     total = 0
     if conn:
-        cursor = conn.cursor(dictionary=True)
-        
-        # Clean up cart items for deleted products
-        cursor.execute(
-            """DELETE FROM cart 
-               WHERE user_id = %s 
-               AND product_id NOT IN (SELECT id FROM products)""",
-            (session['user_id'],)
-        )
-        removed_count = cursor.rowcount
-        if removed_count > 0:
-            conn.commit()
-            flash(f'{removed_count} item(s) were removed from your cart because the products are no longer available.', 'warning')
-        
-        # Get valid cart items (INNER JOIN ensures only existing products)
-        cursor.execute(
-            """SELECT c.*, p.name, p.price, p.image, p.seller_id, p.stock, u.name as seller_name 
-               FROM cart c 
-               INNER JOIN products p ON c.product_id = p.id 
-               INNER JOIN users u ON p.seller_id = u.id 
-               WHERE c.user_id = %s""",
-            (session['user_id'],)
-        )
-        cart_items = cursor.fetchall()
-        
-        # Check stock and adjust quantities if needed
-        for item in cart_items:
-            if item['stock'] < item['quantity']:
-                if item['stock'] > 0:
-                    # Adjust quantity to available stock
-                    cursor.execute(
-                        "UPDATE cart SET quantity = %s WHERE id = %s",
-                        (item['stock'], item['id'])
-                    )
-                    item['quantity'] = item['stock']
-                    flash(f'Quantity adjusted for {item["name"]} due to limited stock.', 'info')
-                else:
-                    # Remove out of stock items
-                    cursor.execute("DELETE FROM cart WHERE id = %s", (item['id'],))
-                    cart_items.remove(item)
-                    flash(f'{item["name"]} is out of stock and removed from cart.', 'warning')
-                    continue
-            
-            item['subtotal'] = item['price'] * item['quantity']
-            total += item['subtotal']
-        
-        conn.commit()
-        cursor.close()
+        result = reconcile_cart(conn, session['user_id'])
+        for message, category in result['messages']:
+            flash(message, category)
+        cart_items = result['items']
+        total = result['total']
         conn.close()
     
     return render_template('cart.html', cart_items=cart_items, total=total)
@@ -515,152 +726,30 @@ def checkout():
         
         conn = get_db_connection()
         if conn:
-            cursor = conn.cursor(dictionary=True)
-            
-            # Get cart items with product validation (only products that still exist)
-            cursor.execute(
-                """SELECT c.id as cart_id, c.product_id, c.quantity, p.price, p.name, p.stock 
-                   FROM cart c 
-                   INNER JOIN products p ON c.product_id = p.id 
-                   WHERE c.user_id = %s""",
-                (session['user_id'],)
-            )
-            cart_items = cursor.fetchall()
-            
-            # Remove cart items for products that no longer exist
-            cursor.execute(
-                """DELETE FROM cart 
-                   WHERE user_id = %s 
-                   AND product_id NOT IN (SELECT id FROM products)""",
-                (session['user_id'],)
-            )
-            removed_items = cursor.rowcount
-            
-            if removed_items > 0:
-                flash(f'{removed_items} item(s) were removed from your cart because the products are no longer available.', 'warning')
-            
-            if not cart_items:
-                flash('Your cart is empty', 'warning')
-                conn.commit()
-                cursor.close()
-                conn.close()
+            try:
+                result = place_order(conn, session['user_id'], payment_method, address)
+            except (Error, StockChanged) as e:
+                print(f"Error placing order: {e!r}")
+                flash('Could not place your order. Please try again.', 'danger')
                 return redirect(url_for('cart'))
             
-            # Validate stock and adjust quantities if needed
-            valid_items = []
-            for item in cart_items:
-                if item['stock'] < item['quantity']:
-                    if item['stock'] > 0:
-                        flash(f'Only {item["stock"]} units available for {item["name"]}. Quantity adjusted.', 'warning')
-                        item['quantity'] = item['stock']
-                        # Update cart with adjusted quantity
-                        cursor.execute(
-                            "UPDATE cart SET quantity = %s WHERE id = %s",
-                            (item['stock'], item['cart_id'])
-                        )
-                        valid_items.append(item)
-                    else:
-                        flash(f'{item["name"]} is out of stock and removed from cart.', 'warning')
-                        cursor.execute("DELETE FROM cart WHERE id = %s", (item['cart_id'],))
-                else:
-                    valid_items.append(item)
-            
-            if not valid_items:
-                flash('No valid items in cart after validation', 'warning')
-                conn.commit()
-                cursor.close()
-                conn.close()
+            for message, category in result['messages']:
+                flash(message, category)
+            if result['order_id'] is None:
                 return redirect(url_for('cart'))
-            
-            # Calculate total
-            total = sum(item['price'] * item['quantity'] for item in valid_items)
-            
-            # Create order
-            cursor.execute(
-                "INSERT INTO orders (user_id, total_amount, payment_method, shipping_address, status) VALUES (%s, %s, %s, %s, 'pending')",
-                (session['user_id'], total, payment_method, address)
-            )
-            order_id = cursor.lastrowid
-            
-            # Create order items with validation
-            for item in valid_items:
-                try:
-                    # Double-check product still exists
-                    cursor.execute("SELECT id FROM products WHERE id = %s", (item['product_id'],))
-                    if cursor.fetchone():
-                        cursor.execute(
-                            "INSERT INTO order_items (order_id, product_id, quantity, price) VALUES (%s, %s, %s, %s)",
-                            (order_id, item['product_id'], item['quantity'], item['price'])
-                        )
-                    else:
-                        flash(f'Product {item["name"]} no longer exists and was skipped.', 'warning')
-                except Error as e:
-                    print(f"Error adding order item: {e}")
-                    flash(f'Error adding {item["name"]} to order. Please try again.', 'danger')
-                    conn.rollback()
-                    cursor.close()
-                    conn.close()
-                    return redirect(url_for('cart'))
-            
-            # Clear cart only after successful order creation
-            cursor.execute("DELETE FROM cart WHERE user_id = %s", (session['user_id'],))
-            
-            conn.commit()
-            cursor.close()
-            conn.close()
-            
-            flash('Order placed successfully!', 'success')
-            return redirect(url_for('order_details', order_id=order_id))
+            page_cache.invalidate(*[f'product:{pid}' for pid in result['product_ids']])
+            return redirect(url_for('order_details', order_id=result['order_id']))
     
     # GET request - show checkout page
     conn = get_db_connection()
     cart_items = []
     total = 0
     if conn:
-        cursor = conn.cursor(dictionary=True)
-        
-        # Clean up cart items for deleted products
-        cursor.execute(
-            """DELETE FROM cart 
-               WHERE user_id = %s 
-               AND product_id NOT IN (SELECT id FROM products)""",
-            (session['user_id'],)
-        )
-        removed_count = cursor.rowcount
-        if removed_count > 0:
-            conn.commit()
-            flash(f'{removed_count} item(s) were removed from your cart because the products are no longer available.', 'warning')
-        
-        # Get valid cart items
-        cursor.execute(
-            """SELECT c.*, p.name, p.price, p.image, p.stock 
-               FROM cart c 
-               INNER JOIN products p ON c.product_id = p.id 
-               WHERE c.user_id = %s""",
-            (session['user_id'],)
-        )
-        cart_items = cursor.fetchall()
-        
-        # Validate and adjust quantities
-        for item in cart_items:
-            if item['stock'] < item['quantity']:
-                if item['stock'] > 0:
-                    item['quantity'] = item['stock']
-                    cursor.execute(
-                        "UPDATE cart SET quantity = %s WHERE id = %s",
-                        (item['stock'], item['id'])
-                    )
-                else:
-                    # Remove out of stock items
-                    cursor.execute("DELETE FROM cart WHERE id = %s", (item['id'],))
-                    cart_items.remove(item)
-                    continue
-            
-            item['subtotal'] = item['price'] * item['quantity']
-            total += item['subtotal']
-        
-        conn.commit()
-        cursor.close()
+        result = reconcile_cart(conn, session['user_id'])
+        for message, category in result['messages']:
+            flash(message, category)
+        cart_items = result['items']
+        total = result['total']
         conn.close()
     
     if not cart_items:
@@ -735,7 +824,8 @@ def order_details(order_id):
         flash('Order not found', 'danger')
         return redirect(url_for('orders'))
     
-    return render_template('order_details.html', order=order, order_items=order_items)
+    return render_template('order_details.html', order=order, order_items=order_items,
+                           next_statuses=ORDER_TRANSITIONS.get(order['status'], ()))
 
 @app.route('/profile')
 def profile():
@@ -805,6 +895,8 @@ def add_feedback():
     product_id = data.get('product_id')
     rating = int(data.get('rating', 5))
     comment = data.get('comment', '')
+    if rating < 1 or rating > 5:
+        return jsonify({'success': False, 'message': 'Rating must be between 1 and 5'}), 400
     
     conn = get_db_connection()
     if conn:
@@ -813,9 +905,11 @@ def add_feedback():
             "INSERT INTO feedbacks (user_id, product_id, rating, comment) VALUES (%s, %s, %s, %s)",
             (session['user_id'], product_id, rating, comment)
         )
+        record_rating(cursor, product_id, rating)
         conn.commit()
         cursor.close()
         conn.close()
+        page_cache.invalidate(f'product:{product_id}')
         
         return jsonify({'success': True, 'message': 'Feedback added successfully'})
     
@@ -886,7 +980,7 @@ def contact():
 @admin_required
 def admin_dashboard():
     conn = get_db_connection()
-    stats = {
+    dashboard_stats = {
         'total_users': 0,
         'total_products': 0,
         'total_orders': 0,
@@ -898,21 +992,9 @@ def admin_dashboard():
     recent_contacts = []
     
     if conn:
+        dashboard_stats = stats.read_stats(conn)
         cursor = conn.cursor(dictionary=True)
         
-        cursor.execute("SELECT COUNT(*) as count FROM users WHERE role = 'user'")
-        stats['total_users'] = cursor.fetchone()['count']
-        
-        cursor.execute("SELECT COUNT(*) as count FROM products")
-        stats['total_products'] = cursor.fetchone()['count']
-        
-        cursor.execute("SELECT COUNT(*) as count FROM orders")
-        stats['total_orders'] = cursor.fetchone()['count']
-        
-        cursor.execute("SELECT SUM(total_amount) as total FROM orders WHERE status = 'completed'")
-        result = cursor.fetchone()
-        stats['total_revenue'] = result['total'] or 0
-        
         cursor.execute(
             "SELECT o.*, u.name as user_name FROM orders o JOIN users u ON o.user_id = u.id ORDER BY o.created_at DESC LIMIT 5"
         )
@@ -944,7 +1026,7 @@ def admin_dashboard():
         cursor.close()
         conn.close()
     
-    return render_template('admin/dashboard.html', stats=stats, recent_orders=recent_orders, recent_feedbacks=recent_feedbacks, recent_general_feedback=recent_general_feedback, recent_contacts=recent_contacts)
+    return render_template('admin/dashboard.html', stats=dashboard_stats, recent_orders=recent_orders, recent_feedbacks=recent_feedbacks, recent_general_feedback=recent_general_feedback, recent_contacts=recent_contacts)
 
 @app.route('/admin/products', methods=['GET', 'POST'])
 @admin_required
@@ -957,17 +1039,12 @@ def admin_products():
         stock = int(request.form.get('stock', 0))
         
         # Handle file upload
-        image = 'default-product.jpg'
+        image = app.config['DEFAULT_PRODUCT_IMAGE']
         if 'image' in request.files:
             file = request.files['image']
             if file and file.filename != '' and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-                filename = f"{timestamp}_{filename}"
-                filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-                file.save(filepath)
-                image = filename
+                image = image_pipeline.store_upload(file)
+                image_pipeline.submit(image)
         
         conn = get_db_connection()
         if conn:
@@ -976,26 +1053,78 @@ def admin_products():
                 "INSERT INTO products (name, description, price, category, stock, image, seller_id) VALUES (%s, %s, %s, %s, %s, %s, %s)",
                 (name, description, price, category, stock, image, session['user_id'])
             )
+            if image != app.config['DEFAULT_PRODUCT_IMAGE']:
+                add_ref(cursor, image)
+            stats.bump(cursor, total_products=1)
             conn.commit()
             cursor.close()
             conn.close()
+            page_cache.invalidate('home')
             
             flash('Product added successfully', 'success')
             return redirect(url_for('admin_products'))
     
     # GET request
     conn = get_db_connection()
-    products_list = []
+    page = {'items': [], 'next_cursor': None, 'prev_cursor': None}
     if conn:
         cursor = conn.cursor(dictionary=True)
-        cursor.execute(
-            "SELECT p.*, u.name as seller_name FROM products p JOIN users u ON p.seller_id = u.id ORDER BY p.created_at DESC"
-        )
-        products_list = cursor.fetchall()
+        page = query_products(cursor, token=request.args.get('cursor'),
+                              page_size=clamp_page_size(request.args.get('per_page'), default=50, maximum=200))
         cursor.close()
         conn.close()
     
-    return render_template('admin/products.html', products=products_list)
+    return render_template('admin/products.html', products=page['items'], page=page)
+
+@app.route('/admin/products/import', methods=['POST'])
+@admin_required
+def admin_import_products():
+    """Import products from a CSV or JSON Lines upload, streaming progress as JSON Lines"""
+    file = request.files.get('file')
+    if not file or not file.filename:
+        return jsonify({'success': False, 'message': 'Choose a CSV or JSON Lines file'}), 400
+    fmt = 'jsonl' if file.filename.lower().endswith(('.jsonl', '.ndjson')) else 'csv'
+    seller_id = session['user_id']
+    
+    def generate():
+        conn = get_db_connection()
+        if not conn:
+            yield json.dumps({'done': True, 'error': 'Database error'}) + '\n'
+            return
+        try:
+            rows = read_rows(file.stream, fmt)
+            for progress in import_products(conn, rows, seller_id, app.config['DEFAULT_PRODUCT_IMAGE'],
+                                            image_exists=storage.exists):
+                yield json.dumps(progress) + '\n'
+        except (ImportFormatError, Error) as e:
+            yield json.dumps({'done': True, 'error': str(e)}) + '\n'
+        finally:
+            conn.close()
+            # Earlier chunks are committed even if a later one failed
+            page_cache.invalidate('home')
+    
+    response = app.response_class(stream_with_context(generate()), mimetype='application/x-ndjson')
+    # Let proxies pass progress lines through as they are written
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/admin/export/<table>.<fmt>')
+@admin_required
+def admin_export(table, fmt):
+    """Download a whole table as CSV or JSON Lines, streamed in chunks"""
+    if table not in EXPORT_COLUMNS or fmt not in FORMATS:
+        flash('Unknown export', 'danger')
+        return redirect(url_for('admin_dashboard'))
+    
+    conn = get_db_connection()
+    if not conn:
+        flash('Database error', 'danger')
+        return redirect(url_for('admin_dashboard'))
+    
+    filename = f"{table}-{datetime.now():%Y%m%d-%H%M%S}.{fmt}"
+    response = app.response_class(stream_with_context(export_rows(conn, table, fmt)), mimetype=FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
 
 @app.route('/admin/product/edit/<int:product_id>', methods=['GET', 'POST'])
 @admin_required
@@ -1015,16 +1144,18 @@ def admin_edit_product(product_id):
             if 'image' in request.files:
                 file = request.files['image']
                 if file and file.filename != '' and allowed_file(file.filename):
-                    filename = secure_filename(file.filename)
-                    timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-                    filename = f"{timestamp}_{filename}"
-                    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-                    file.save(filepath)
+                    filename = image_pipeline.store_upload(file)
+                    image_pipeline.submit(filename)
+                    cursor.execute("SELECT image FROM products WHERE id = %s FOR UPDATE", (product_id,))
+                    row = cursor.fetchone()
                     cursor.execute(
                         "UPDATE products SET name = %s, description = %s, price = %s, category = %s, stock = %s, image = %s WHERE id = %s",
                         (name, description, price, category, stock, filename, product_id)
                     )
+                    # Move the reference from the old image to the new one
+                    if row and row[0] != filename:
+                        add_ref(cursor, filename)
+                        drop_ref(cursor, row[0])
                 else:
                     cursor.execute(
                         "UPDATE products SET name = %s, description = %s, price = %s, category = %s, stock = %s WHERE id = %s",
@@ -1039,6 +1170,7 @@ def admin_edit_product(product_id):
             conn.commit()
             cursor.close()
             conn.close()
+            page_cache.invalidate('home', f'product:{product_id}')
             
             flash('Product updated successfully', 'success')
             return redirect(url_for('admin_products'))
@@ -1064,10 +1196,16 @@ def admin_delete_product(product_id):
     conn = get_db_connection()
     if conn:
         cursor = conn.cursor()
+        cursor.execute("SELECT image FROM products WHERE id = %s FOR UPDATE", (product_id,))
+        row = cursor.fetchone()
         cursor.execute("DELETE FROM products WHERE id = %s", (product_id,))
+        stats.bump(cursor, total_products=-cursor.rowcount)
+        if row:
+            drop_ref(cursor, row[0])
         conn.commit()
         cursor.close()
         conn.close()
+        page_cache.invalidate('home', f'product:{product_id}')
         
         flash('Product deleted successfully', 'success')
     
@@ -1077,15 +1215,14 @@ def admin_delete_product(product_id):
 @admin_required
 def admin_users():
     conn = get_db_connection()
-    users_list = []
+    listing = admin_tables.USERS.empty()
     if conn:
         cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM users ORDER BY created_at DESC")
-        users_list = cursor.fetchall()
+        listing = admin_tables.USERS.list(cursor, request.args)
         cursor.close()
         conn.close()
     
-    return render_template('admin/users.html', users=users_list)
+    return render_template('admin/users.html', users=listing['items'], listing=listing)
 
 @app.route('/admin/user/delete/<int:user_id>', methods=['POST'])
 @admin_required
@@ -1097,173 +1234,261 @@ def admin_delete_user(user_id):
     conn = get_db_connection()
     if conn:
         cursor = conn.cursor()
+        # Deleting a user cascades to their products, orders and feedbacks: lock those rows
+        # and take them out of the dashboard totals and product ratings in the same transaction
+        cursor.execute("SELECT role FROM users WHERE id = %s FOR UPDATE", (user_id,))
+        row = cursor.fetchone()
+        cursor.execute("SELECT COUNT(*) FROM products WHERE seller_id = %s FOR UPDATE", (user_id,))
+        products = cursor.fetchone()[0]
+        cursor.execute(
+            "SELECT COUNT(*), COALESCE(SUM(CASE WHEN status = 'completed' THEN total_amount END), 0) "
+            "FROM orders WHERE user_id = %s FOR UPDATE",
+            (user_id,)
+        )
+        orders, revenue = cursor.fetchone()
+        rated = remove_user_ratings(cursor, user_id)
         cursor.execute("DELETE FROM users WHERE id = %s", (user_id,))
+        if cursor.rowcount:
+            stats.bump(cursor, total_users=-1 if row[0] == 'user' else 0, total_products=-products,
+                       total_orders=-orders, total_revenue=-revenue)
         conn.commit()
         cursor.close()
         conn.close()
+        invalidate_user_principal(user_id)
+        page_cache.invalidate('home', *[f'product:{product_id}' for product_id in rated])
         
         flash('User deleted successfully', 'success')
     
     return redirect(url_for('admin_users'))
 
+@app.route('/admin/user/role/<int:user_id>', methods=['POST'])
+@admin_required
+def admin_update_user_role(user_id):
+    role = request.form.get('role')
+    if role not in ('user', 'admin'):
+        flash('Invalid role', 'danger')
+        return redirect(url_for('admin_users'))
+    
+    if user_id == session['user_id']:
+        flash('Cannot change your own role', 'danger')
+        return redirect(url_for('admin_users'))
+    
+    conn = get_db_connection()
+    if conn:
+        cursor = conn.cursor()
+        cursor.execute("UPDATE users SET role = %s WHERE id = %s AND role != %s", (role, user_id, role))
+        if cursor.rowcount:
+            stats.bump(cursor, total_users=1 if role == 'user' else -1)
+        conn.commit()
+        cursor.close()
+        conn.close()
+        invalidate_user_principal(user_id)
+        
+        flash('User role updated successfully', 'success')
+    
+    return redirect(url_for('admin_users'))
+
 @app.route('/admin/feedbacks')
 @admin_required
 def admin_feedbacks():
     conn = get_db_connection()
-    feedbacks_list = []
+    listing = admin_tables.FEEDBACKS.empty()
     if conn:
         cursor = conn.cursor(dictionary=True)
-        cursor.execute(
-            "SELECT f.*, u.name as user_name, p.name as product_name FROM feedbacks f JOIN users u ON f.user_id = u.id JOIN products p ON f.product_id = p.id ORDER BY f.created_at DESC"
-        )
-        feedbacks_list = cursor.fetchall()
+        listing = admin_tables.FEEDBACKS.list(cursor, request.args)
         cursor.close()
         conn.close()
     
-    return render_template('admin/feedbacks.html', feedbacks=feedbacks_list)
+    return render_template('admin/feedbacks.html', feedbacks=listing['items'], listing=listing)
 
 @app.route('/admin/orders')
 @admin_required
 def admin_orders():
     conn = get_db_connection()
-    orders_list = []
+    listing = admin_tables.ORDERS.empty()
     if conn:
         cursor = conn.cursor(dictionary=True)
-        cursor.execute(
-            "SELECT o.*, u.name as user_name FROM orders o JOIN users u ON o.user_id = u.id ORDER BY o.created_at DESC"
-        )
-        orders_list = cursor.fetchall()
+        listing = admin_tables.ORDERS.list(cursor, request.args)
         cursor.close()
         conn.close()
     
-    return render_template('admin/orders.html', orders=orders_list)
+    return render_template('admin/orders.html', orders=listing['items'], listing=listing)
+
+def _status_change_response(entity, ids, status, single_message=None):
+    """Apply a status change for the admin status endpoints and describe the outcome as JSON"""
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({'success': False, 'message': 'Database error'}), 500
+    try:
+        result = change_status(conn, entity, ids, status, session['user_id'])
+    except StatusChangeError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Error as e:
+        print(f"Error changing {entity} status: {e}")
+        return jsonify({'success': False, 'message': 'Database error'}), 500
+    finally:
+        conn.close()
+    if result.get('product_ids'):
+        page_cache.invalidate(*[f'product:{product_id}' for product_id in result['product_ids']])
+
+    if single_message:
+        if result['missing']:
+            return jsonify({'success': False, 'message': 'Not found'}), 404
+        if result['skipped']:
+            old = result['skipped'][0]['status']
+            message = f"Already {status}" if old == status else f"Cannot change status from {old} to {status}"
+            return jsonify({'success': False, 'message': message}), 409
+        return jsonify({'success': True, 'message': single_message})
+
+    return jsonify({
+        'success': True,
+        'message': f"{len(result['updated'])} updated, {len(result['skipped'])} skipped",
+        **result,
+    })
 
 @app.route('/admin/order/update_status', methods=['POST'])
 @admin_required
 def admin_update_order_status():
-    data = request.get_json()
-    order_id = data.get('order_id')
-    status = data.get('status')
-    
-    conn = get_db_connection()
-    if conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            "UPDATE orders SET status = %s WHERE id = %s",
-            (status, order_id)
-        )
-        conn.commit()
-        cursor.close()
-        conn.close()
-        
-        return jsonify({'success': True, 'message': 'Order status updated'})
-    
-    return jsonify({'success': False, 'message': 'Database error'}), 500
+    data = request.get_json(silent=True) or {}
+    try:
+        ids = parse_ids([data.get('order_id')])
+    except StatusChangeError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return _status_change_response('order', ids, data.get('status'), 'Order status updated')
+
+@app.route('/admin/<any(order, feedback, contact):entity>/bulk_status', methods=['POST'])
+@admin_required
+def admin_bulk_update_status(entity):
+    """Move many orders or messages to one status: {"ids": [...], "status": "..."}"""
+    data = request.get_json(silent=True) or {}
+    try:
+        ids = parse_ids(data.get('ids'))
+    except StatusChangeError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return _status_change_response(entity, ids, data.get('status'))
 
 @app.route('/admin/general-feedback')
 @admin_required
 def admin_general_feedback():
     conn = get_db_connection()
-    feedbacks_list = []
+    listing = admin_tables.GENERAL_FEEDBACK.empty()
     if conn:
         cursor = conn.cursor(dictionary=True)
         try:
-            cursor.execute(
-                """SELECT gf.*, u.name as user_name 
-                   FROM general_feedback gf 
-                   LEFT JOIN users u ON gf.user_id = u.id 
-                   ORDER BY gf.created_at DESC"""
-            )
-            feedbacks_list = cursor.fetchall()
-        except Error:
-            feedbacks_list = []
+            listing = admin_tables.GENERAL_FEEDBACK.list(cursor, request.args)
+        except Error as e:
+            print(f"Error listing general feedback: {e}")
         cursor.close()
         conn.close()
     
-    return render_template('admin/general_feedback.html', feedbacks=feedbacks_list)
+    return render_template('admin/general_feedback.html', feedbacks=listing['items'], listing=listing)
 
 @app.route('/admin/contact-messages')
 @admin_required
 def admin_contact_messages():
     conn = get_db_connection()
-    messages_list = []
+    listing = admin_tables.CONTACT_MESSAGES.empty()
     if conn:
         cursor = conn.cursor(dictionary=True)
         try:
-            cursor.execute(
-                """SELECT cm.*, u.name as user_name 
-                   FROM contact_messages cm 
-                   LEFT JOIN users u ON cm.user_id = u.id 
-                   ORDER BY cm.created_at DESC"""
-            )
-            messages_list = cursor.fetchall()
-        except Error:
-            messages_list = []
+            listing = admin_tables.CONTACT_MESSAGES.list(cursor, request.args)
+        except Error as e:
+            print(f"Error listing contact messages: {e}")
         cursor.close()
         conn.close()
     
-    return render_template('admin/contact_messages.html', messages=messages_list)
+    return render_template('admin/contact_messages.html', messages=listing['items'], listing=listing)
 
 @app.route('/admin/feedback/update_status', methods=['POST'])
 @admin_required
 def admin_update_feedback_status():
-    data = request.get_json()
-    feedback_id = data.get('feedback_id')
-    status = data.get('status')
-    
-    conn = get_db_connection()
-    if conn:
-        cursor = conn.cursor()
-        try:
-            cursor.execute(
-                "UPDATE general_feedback SET status = %s WHERE id = %s",
-                (status, feedback_id)
-            )
-            conn.commit()
-            cursor.close()
-            conn.close()
-            
-            return jsonify({'success': True, 'message': 'Feedback status updated'})
-        except Error:
-            cursor.close()
-            conn.close()
-            return jsonify({'success': False, 'message': 'Database error'}), 500
-    
-    return jsonify({'success': False, 'message': 'Database error'}), 500
+    data = request.get_json(silent=True) or {}
+    try:
+        ids = parse_ids([data.get('feedback_id')])
+    except StatusChangeError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return _status_change_response('feedback', ids, data.get('status'), 'Feedback status updated')
 
 @app.route('/admin/contact/update_status', methods=['POST'])
 @admin_required
 def admin_update_contact_status():
-    data = request.get_json()
-    message_id = data.get('message_id')
-    status = data.get('status')
-    
-    conn = get_db_connection()
-    if conn:
-        cursor = conn.cursor()
-        try:
-            cursor.execute(
-                "UPDATE contact_messages SET status = %s WHERE id = %s",
-                (status, message_id)
-            )
-            conn.commit()
-            cursor.close()
-            conn.close()
-            
-            return jsonify({'success': True, 'message': 'Contact message status updated'})
-        except Error:
-            cursor.close()
-            conn.close()
-            return jsonify({'success': False, 'message': 'Database error'}), 500
-    
-    return jsonify({'success': False, 'message': 'Database error'}), 500
+    data = request.get_json(silent=True) or {}
+    try:
+        ids = parse_ids([data.get('message_id')])
+    except StatusChangeError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return _status_change_response('contact', ids, data.get('status'), 'Contact message status updated')
 
-@app.route('/init-db')
+@app.route('/admin/db-pool')
+@admin_required
+def admin_db_pool():
+    """Connection pool statistics"""
+    return jsonify(dict(get_db_pool().stats(), replicas=[pool.stats() for pool in get_replica_pools()]))
+
+@app.route('/admin/cache-stats')
+@admin_required
+def admin_cache_stats():
+    """Hit/miss counters for the in-process caches"""
+    return jsonify({
+        'principals': user_principals.stats(),
+        'pages': page_cache.stats()
+    })
+
+@app.route('/admin/query-stats')
+@admin_required
+def admin_query_stats():
+    """Statements with the most total database time since this process started"""
+    return jsonify(instrumentation.metrics.slowest())
+
+@app.route('/init-db', methods=['POST'])
+@admin_required
 def init_db_route():
-    """Manual database initialization route"""
-    init_db()
-    flash('Database initialized successfully!', 'success')
-    return redirect(url_for('home'))
+    """Apply pending schema migrations without restarting the app"""
+    applied = init_db()
+    if applied:
+        flash(f'Applied {len(applied)} migration(s)', 'success')
+    else:
+        flash('Database schema is already up to date', 'info')
+    return redirect(url_for('admin_dashboard'))
+
+_jobs_lock_file = None
+
+
+def _claim_background_jobs():
+    """True once this process holds BACKGROUND_JOBS_LOCK"""
+    global _jobs_lock_file
+    if fcntl is None:
+        return True
+    lock_file = open(app.config['BACKGROUND_JOBS_LOCK'], 'a')
+    try:
+        # A POSIX record lock: released when this process exits and not inherited by its children
+        fcntl.lockf(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False
+    _jobs_lock_file = lock_file
+    return True
+
+
+def start_background_jobs():
+    """
+    Start the periodic stats reconciler and unused-upload collector in one
+    process per host. Every worker calls this; the one that gets the lock
+    runs the jobs and the others keep retrying so a replacement takes over
+    when that worker exits.
+    """
+    def run_jobs():
+        stats.start_reconciler(get_db_connection, app.config['STATS_RECONCILE_INTERVAL'], also=[rebuild_ratings])
+        start_collector(get_db_connection, storage, image_pipeline.delete_image,
+                        app.config['STORAGE_GC_INTERVAL'], app.config['STORAGE_GC_GRACE'])
+
+    def wait_for_lock():
+        while not _claim_background_jobs():
+            time.sleep(app.config['BACKGROUND_JOBS_RETRY'])
+        print(f"Background jobs running in process {os.getpid()}")
+        run_jobs()
+
+    threading.Thread(target=wait_for_lock, name='background-jobs', daemon=True).start()
 
 if __name__ == '__main__':
     # Initialize database on first run
@@ -1271,6 +1496,7 @@ if __name__ == '__main__':
     init_db()
     # Create uploads directory
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    start_background_jobs()
     print("Starting Flask application...")
     print("Open your browser at: http://localhost:5000")
     app.run(debug=True, host='0.0.0.0', port=5000)
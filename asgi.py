@@ -0,0 +1,244 @@
+"""
+ASGI entry point for Campus Marketplace
+
+    uvicorn asgi:application --workers 4
+
+The busiest read-only pages (home, product list, product details) are served
+by async handlers that query MySQL through an aiomysql connection pool, so a
+worker keeps many queries in flight instead of one per thread. They render
+the same templates inside a regular Flask request context, which means the
+same signed-cookie session, flash messages, page cache and before/after
+request hooks apply. Those hooks, page-cache lookups (Redis when shared) and
+template rendering block, so they run in a worker thread through
+asyncio.to_thread, which carries the request context along. Every other
+route runs the unchanged Flask app through asgiref's WsgiToAsgi adapter (in
+a thread pool).
+
+Needs the optional aiomysql and asgiref packages plus an ASGI server such as uvicorn.
+"""
+
+import asyncio
+import io
+import random
+import sys
+import time
+
+import aiomysql
+from asgiref.wsgi import WsgiToAsgi
+from flask import flash, redirect, render_template, request, url_for
+from werkzeug.exceptions import HTTPException
+from werkzeug.routing import RequestRedirect
+
+import instrumentation
+from app import DB_CONFIG, app, page_cache, primary_pinned
+from pagination import clamp_page_size, keyset_query, keyset_result
+from ratings import PRODUCT_WITH_RATINGS_QUERY, REVIEW_ORDER, REVIEW_PAGE_SIZE, REVIEWS_QUERY, rating_summary
+from search import category_facets_query, product_list_query
+
+app.config.setdefault('ASYNC_DB_POOL_MIN', 1)
+app.config.setdefault('ASYNC_DB_POOL_MAX', 20)   # connections per worker process
+
+
+def build_environ(scope, body=b''):
+    """WSGI environ for an ASGI HTTP scope, so Flask can build its request from it"""
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf8').decode('latin1'),
+        'PATH_INFO': scope['path'].encode('utf8').decode('latin1'),
+        'QUERY_STRING': scope['query_string'].decode('ascii'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1] or 80),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': scope['client'][0] if scope.get('client') else '',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for raw_name, raw_value in scope['headers']:
+        name = raw_name.decode('latin1').upper().replace('-', '_')
+        value = raw_value.decode('latin1')
+        if name == 'CONTENT_TYPE' or name == 'CONTENT_LENGTH':
+            environ[name] = value
+            continue
+        key = 'HTTP_' + name
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+class AsyncMarketplace:
+    """ASGI application: async handlers for hot pages, the WSGI app for the rest"""
+
+    def __init__(self, flask_app, db_config):
+        self.flask_app = flask_app
+        self.db_config = db_config
+        self.wsgi = WsgiToAsgi(flask_app)
+        self.pools = {}   # 'primary' or 'replica' -> aiomysql pool
+        self._pool_lock = asyncio.Lock()
+        # Each worker reads from one replica; across workers the load spreads over all of them
+        replicas = flask_app.config['DB_REPLICAS']
+        self.replica_config = dict(db_config, **random.choice(replicas)) if replicas else None
+        self.replica_down_until = 0   # time.monotonic() until which the replica is skipped
+        # Flask endpoint -> async handler; routing itself stays in app.url_map
+        self.handlers = {
+            'home': self.home,
+            'products': self.products,
+            'product_details': self.product_details,
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] == 'http' and scope['method'] in ('GET', 'HEAD'):
+            endpoint, view_args = self.match(scope)
+            handler = self.handlers.get(endpoint)
+            if handler is not None:
+                return await self.serve(handler, view_args, scope, send)
+        return await self.wsgi(scope, receive, send)
+
+    def match(self, scope):
+        adapter = self.flask_app.url_map.bind('localhost')
+        try:
+            return adapter.match(scope['path'], method='GET')
+        except (HTTPException, RequestRedirect):
+            return None, {}
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await self.get_pool()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                for pool in self.pools.values():
+                    pool.close()
+                    await pool.wait_closed()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def get_pool(self, replica=False):
+        """An aiomysql pool for the primary or this worker's replica, created inside the running event loop"""
+        name = 'replica' if replica else 'primary'
+        if name not in self.pools:
+            config = self.replica_config if replica else self.db_config
+            async with self._pool_lock:
+                if name not in self.pools:
+                    self.pools[name] = await aiomysql.create_pool(
+                        host=config['host'],
+                        port=config.get('port', 3306),
+                        user=config['user'],
+                        password=config['password'],
+                        db=config['database'],
+                        minsize=self.flask_app.config['ASYNC_DB_POOL_MIN'],
+                        maxsize=self.flask_app.config['ASYNC_DB_POOL_MAX'],
+                        # Reads only: autocommit so every query sees the latest data
+                        autocommit=True,
+                    )
+        return self.pools[name]
+
+    async def fetch(self, query, params, one=False):
+        # Same routing as get_db_connection(readonly=True): the replica unless this user just wrote
+        pool = None
+        if (self.replica_config is not None and not primary_pinned()
+                and self.replica_down_until <= time.monotonic()):
+            try:
+                pool = await self.get_pool(replica=True)
+            except Exception as e:
+                # Like _replica_down_until in app.py: don't pay a connect timeout on every request
+                print(f"Replica unavailable, reading from the primary: {e}")
+                self.replica_down_until = time.monotonic() + self.flask_app.config['DB_REPLICA_RETRY_SECONDS']
+        if pool is None:
+            pool = await self.get_pool()
+        async with pool.acquire() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cursor:
+                started = time.perf_counter()
+                try:
+                    await cursor.execute(query, params)
+                finally:
+                    if self.flask_app.config['QUERY_INSTRUMENTATION']:
+                        instrumentation.record(query, time.perf_counter() - started)
+                return await cursor.fetchone() if one else await cursor.fetchall()
+
+    async def serve(self, handler, view_args, scope, send):
+        """Run one async handler inside a Flask request context and send its response"""
+        environ = build_environ(scope)
+        with self.flask_app.request_context(environ):
+            try:
+                # Admission, rate-limit and session checks may wait on the cache backend
+                response = await asyncio.to_thread(self.flask_app.preprocess_request)
+                if response is None:
+                    response = await handler(**view_args)
+                response = self.flask_app.make_response(response)
+            except HTTPException as e:
+                response = self.flask_app.make_response(self.flask_app.handle_user_exception(e))
+            except Exception as e:
+                response = self.flask_app.make_response(self.flask_app.handle_exception(e))
+            response = await asyncio.to_thread(self.flask_app.process_response, response)
+
+            # The WSGI helpers drop the body and entity headers for HEAD and 304 responses
+            headers = response.get_wsgi_headers(environ)
+            body = b''.join(response.get_app_iter(environ))
+            await send({
+                'type': 'http.response.start',
+                'status': response.status_code,
+                'headers': [(k.lower().encode('latin1'), v.encode('latin1')) for k, v in headers.items()],
+            })
+            await send({'type': 'http.response.body', 'body': body})
+
+    async def cached_page(self, namespace, render):
+        """page_cache.cached() for async handlers: `render` is awaited only on a miss"""
+        key, entry = await asyncio.to_thread(page_cache.lookup, namespace)
+        if key is None:
+            return await render()
+        if entry is None:
+            response = self.flask_app.make_response(await render())
+            entry = await asyncio.to_thread(page_cache.store_response, key, response)
+            if entry is None:
+                return response
+        return page_cache.respond(entry)
+
+    # Handlers mirror the sync views in app.py and render the same templates, off the event loop
+
+    async def home(self):
+        async def render():
+            products = await self.fetch("SELECT * FROM products ORDER BY created_at DESC LIMIT 6", ())
+            return await asyncio.to_thread(render_template, 'home.html', products=products)
+        return await self.cached_page('home', render)
+
+    async def products(self):
+        search = request.args.get('search', '')
+        category = request.args.get('category', '')
+        base_query, params, order_by = product_list_query(search, category)
+        query, params, plan = keyset_query(base_query, params, order_by, request.args.get('cursor'),
+                                           clamp_page_size(request.args.get('per_page')))
+        if search:
+            rows, facets = await asyncio.gather(self.fetch(query, params),
+                                                self.fetch(*category_facets_query(search)))
+        else:
+            rows, facets = await self.fetch(query, params), []
+        page = keyset_result(rows, plan)
+        return await asyncio.to_thread(render_template, 'products.html', products=page['items'], page=page,
+                                       facets=facets, search=search, category=category)
+
+    async def product_details(self, product_id):
+        async def render():
+            product = await self.fetch(PRODUCT_WITH_RATINGS_QUERY, (product_id,), one=True)
+            if not product:
+                flash('Product not found', 'danger')
+                return redirect(url_for('products'))
+            summary = rating_summary(product)
+            reviews = {'items': [], 'next_cursor': None, 'prev_cursor': None}
+            if summary['count']:
+                query, params, plan = keyset_query(REVIEWS_QUERY, [product_id], REVIEW_ORDER,
+                                                   request.args.get('cursor'), REVIEW_PAGE_SIZE)
+                reviews = keyset_result(await self.fetch(query, params), plan)
+            return await asyncio.to_thread(render_template, 'product_details.html', product=product,
+                                           feedbacks=reviews['items'], reviews=reviews, rating_summary=summary)
+        return await self.cached_page(f'product:{product_id}', render)
+
+
+application = AsyncMarketplace(app, DB_CONFIG)
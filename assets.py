@@ -0,0 +1,84 @@
+"""
+Serving the built static bundles
+build_assets.py writes fingerprinted bundles plus .gz/.br copies to
+static/dist and a manifest mapping bundle names to file names. asset_url()
+resolves a bundle through that manifest, and the static route is wrapped so
+dist files are sent precompressed with a one-year immutable Cache-Control.
+"""
+
+import json
+import mimetypes
+import os
+import threading
+
+from flask import request, send_from_directory, url_for
+
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+# Preferred first; only used when the client accepts it and the file was built
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+class AssetManifest:
+    def __init__(self, static_folder):
+        self.dist_folder = os.path.join(static_folder, DIST_DIR)
+        self.path = os.path.join(self.dist_folder, MANIFEST_NAME)
+        self._entries = {}
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def entries(self):
+        """Bundle name -> fingerprinted file name, re-read when the build changes it"""
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            return {}
+        with self._lock:
+            if mtime != self._mtime:
+                try:
+                    with open(self.path) as f:
+                        self._entries = json.load(f)
+                    self._mtime = mtime
+                except (OSError, ValueError) as e:
+                    print(f"Error reading asset manifest: {e}")
+            return self._entries
+
+    def url(self, name):
+        """URL of a built bundle, or None when the assets haven't been built"""
+        filename = self.entries().get(name)
+        if filename is None:
+            return None
+        return url_for('static', filename=f"{DIST_DIR}/{filename}")
+
+
+def init_app(app):
+    """Register asset_url() for templates and serve dist files precompressed"""
+    manifest = AssetManifest(app.static_folder)
+    app.add_template_global(manifest.url, 'asset_url')
+
+    serve_static = app.view_functions['static']
+
+    def static(filename):
+        if not filename.startswith(DIST_DIR + '/') or filename.endswith(MANIFEST_NAME):
+            return serve_static(filename=filename)
+
+        response = None
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        for encoding, suffix in ENCODINGS:
+            if request.accept_encodings[encoding] and os.path.isfile(os.path.join(app.static_folder, filename + suffix)):
+                response = send_from_directory(app.static_folder, filename + suffix, mimetype=mimetype)
+                response.headers['Content-Encoding'] = encoding
+                break
+        if response is None:
+            response = serve_static(filename=filename)
+
+        # Names change whenever the content does, so caches may keep them forever
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = 31536000
+        response.cache_control.immutable = True
+        response.vary.add('Accept-Encoding')
+        return response
+
+    app.view_functions['static'] = static
+    return manifest
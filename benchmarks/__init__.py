@@ -0,0 +1 @@
+"""Benchmark and load-test scripts for Campus Marketplace (run with python -m benchmarks.<name>)"""
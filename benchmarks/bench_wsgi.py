@@ -0,0 +1,16 @@
+"""
+The app pointed at the benchmark database, for load tests
+
+    gunicorn -c gunicorn.conf.py benchmarks.bench_wsgi:application
+"""
+
+import app
+from benchmarks.common import BENCH_DB_CONFIG
+
+# Before the first connection: the pool copies DB_CONFIG when it is created
+app.DB_CONFIG.update(BENCH_DB_CONFIG)
+
+# Every simulated visitor comes from the same address, so per-IP limits would throttle the run
+app.app.config['RATE_LIMIT_ENABLED'] = False
+
+application = app.app
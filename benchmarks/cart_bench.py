@@ -0,0 +1,106 @@
+"""
+Show that cart reconciliation issues a constant number of statements as the
+cart grows, compared with the old per-row UPDATE/DELETE loop
+
+    python -m benchmarks.cart_bench --sizes 1 10 50 200
+"""
+
+import argparse
+
+from benchmarks.common import (BENCH_DB_CONFIG, connect, create_bench_database, ensure_seller,
+                               seed_products, summarize, time_call)
+from cart_service import reconcile_cart
+
+
+class CountingConnection:
+    """Wraps a connection and counts the statements its cursors execute"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.queries = 0
+
+    def cursor(self, *args, **kwargs):
+        cursor = self.conn.cursor(*args, **kwargs)
+        execute = cursor.execute
+
+        def counted(*a, **kw):
+            self.queries += 1
+            return execute(*a, **kw)
+        cursor.execute = counted
+        return cursor
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+
+def legacy_reconcile(conn, user_id):
+    """The per-row loop cart() used before reconcile_cart()"""
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(
+        "DELETE FROM cart WHERE user_id = %s AND product_id NOT IN (SELECT id FROM products)",
+        (user_id,)
+    )
+    cursor.execute(
+        """SELECT c.*, p.name, p.price, p.image, p.seller_id, p.stock, u.name as seller_name
+           FROM cart c INNER JOIN products p ON c.product_id = p.id
+           INNER JOIN users u ON p.seller_id = u.id WHERE c.user_id = %s""",
+        (user_id,)
+    )
+    for item in cursor.fetchall():
+        if item['stock'] < item['quantity']:
+            if item['stock'] > 0:
+                cursor.execute("UPDATE cart SET quantity = %s WHERE id = %s", (item['stock'], item['id']))
+            else:
+                cursor.execute("DELETE FROM cart WHERE id = %s", (item['id'],))
+    conn.commit()
+    cursor.close()
+
+
+def fill_cart(conn, user_id, product_ids):
+    """Put every product in the cart with a quantity above its stock"""
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM cart WHERE user_id = %s", (user_id,))
+    cursor.executemany(
+        "INSERT INTO cart (user_id, product_id, quantity) VALUES (%s, %s, 999)",
+        [(user_id, product_id) for product_id in product_ids]
+    )
+    conn.commit()
+    cursor.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 10, 50, 200])
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"Using database {BENCH_DB_CONFIG['database']}")
+    create_bench_database()
+    conn = connect()
+    user_id = ensure_seller(conn)
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM products")
+    if cursor.fetchone()[0] < max(args.sizes):
+        seed_products(conn, max(args.sizes), user_id)
+    cursor.execute("SELECT id FROM products ORDER BY id LIMIT %s", (max(args.sizes),))
+    all_ids = [row[0] for row in cursor.fetchall()]
+    cursor.close()
+
+    print(f"{'cart size':>9} {'impl':>7} {'queries':>8} {'mean ms':>9} {'p95 ms':>8}")
+    for size in args.sizes:
+        for name, fn in (('legacy', legacy_reconcile), ('set', reconcile_cart)):
+            counting = CountingConnection(conn)
+            samples = []
+            for _ in range(args.repeat):
+                fill_cart(conn, user_id, all_ids[:size])
+                counting.queries = 0
+                samples += time_call(lambda: fn(counting, user_id), 1)
+            stats = summarize(samples)
+            print(f"{size:>9} {name:>7} {counting.queries:>8} {stats['mean_ms']:>9} {stats['p95_ms']:>8}")
+
+    fill_cart(conn, user_id, [])
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Fire many simultaneous checkouts at one low-stock product and verify that
+stock never goes negative and exactly `stock` units get sold
+
+    python -m benchmarks.checkout_concurrency --buyers 300 --stock 7
+
+Each buyer holds its own connection, so MySQL's max_connections must be
+above the number of buyers (the default of 151 allows --buyers 140).
+"""
+
+import argparse
+import sys
+import threading
+import time
+
+from benchmarks.common import BENCH_DB_CONFIG, connect, create_bench_database, ensure_seller
+from order_service import place_order
+
+
+def setup(conn, buyers, stock):
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM users WHERE email LIKE %s", ('bench-buyer-%',))
+    seller_id = ensure_seller(conn)
+    cursor.execute(
+        "INSERT INTO products (name, description, price, category, stock, seller_id) VALUES (%s, %s, %s, %s, %s, %s)",
+        ('Limited Edition Hoodie', 'Concurrency test product', 499.00, 'Clothing', stock, seller_id)
+    )
+    product_id = cursor.lastrowid
+    cursor.executemany(
+        "INSERT INTO users (name, email, password) VALUES (%s, %s, %s)",
+        [(f'Buyer {i}', f'bench-buyer-{i}@campus.com', 'x') for i in range(buyers)]
+    )
+    cursor.execute("SELECT id FROM users WHERE email LIKE %s ORDER BY id", ('bench-buyer-%',))
+    user_ids = [row[0] for row in cursor.fetchall()]
+    cursor.executemany(
+        "INSERT INTO cart (user_id, product_id, quantity) VALUES (%s, %s, 1)",
+        [(user_id, product_id) for user_id in user_ids]
+    )
+    conn.commit()
+    cursor.close()
+    return product_id, user_ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--buyers', type=int, default=140)
+    parser.add_argument('--stock', type=int, default=7)
+    args = parser.parse_args()
+
+    print(f"Using database {BENCH_DB_CONFIG['database']}")
+    create_bench_database()
+    conn = connect()
+    product_id, user_ids = setup(conn, args.buyers, args.stock)
+
+    # One connection per buyer, all released at the same instant
+    connections = [connect() for _ in user_ids]
+    barrier = threading.Barrier(len(user_ids))
+    results = {'ordered': 0, 'empty': 0, 'errors': []}
+    lock = threading.Lock()
+
+    def buy(user_id, buyer_conn):
+        barrier.wait()
+        try:
+            result = place_order(buyer_conn, user_id, 'cash', 'Hostel Block A')
+            with lock:
+                results['ordered' if result['order_id'] else 'empty'] += 1
+        except Exception as e:
+            with lock:
+                results['errors'].append(repr(e))
+
+    threads = [threading.Thread(target=buy, args=(u, c)) for u, c in zip(user_ids, connections)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    for c in connections:
+        c.close()
+
+    cursor = conn.cursor()
+    cursor.execute("SELECT stock FROM products WHERE id = %s", (product_id,))
+    final_stock = cursor.fetchone()[0]
+    cursor.execute("SELECT COALESCE(SUM(quantity), 0) FROM order_items WHERE product_id = %s", (product_id,))
+    sold = int(cursor.fetchone()[0])
+    cursor.close()
+    conn.close()
+
+    print(f"{len(user_ids)} checkouts in {elapsed:.2f}s: {results['ordered']} ordered, "
+          f"{results['empty']} turned away, {len(results['errors'])} errors")
+    print(f"stock {args.stock} -> {final_stock}, units sold {sold}")
+    for error in results['errors'][:5]:
+        print(f"  error: {error}")
+
+    expected_sold = min(args.stock, len(user_ids))
+    ok = (final_stock == args.stock - expected_sold and sold == expected_sold
+          and results['ordered'] == expected_sold and not results['errors'])
+    print("PASS" if ok else "FAIL")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+"""
+Shared helpers for the benchmark scripts
+Benchmarks run against a separate database so they never touch real data
+"""
+
+import random
+import statistics
+import time
+
+import mysql.connector
+
+from app import DB_CONFIG
+
+BENCH_DB_CONFIG = dict(DB_CONFIG, database='campus_marketplace_bench')
+
+CATEGORIES = ['Electronics', 'Books', 'Clothing', 'Furniture', 'Sports', 'Other']
+WORDS = ('laptop phone charger notebook textbook calculus physics chemistry hoodie jacket sneakers '
+         'desk chair lamp bookshelf cricket football racket bicycle helmet headphones keyboard mouse '
+         'monitor backpack bottle calculator guitar poster mattress kettle').split()
+
+
+def connect(config=None):
+    return mysql.connector.connect(**(config or BENCH_DB_CONFIG))
+
+
+def create_bench_database(config=None):
+    """Create the benchmark database and its tables using the app's own init_db()"""
+    import app
+    config = config or BENCH_DB_CONFIG
+    original = dict(app.DB_CONFIG)
+    app.DB_CONFIG.update(config)
+    app._db_pool = None
+    try:
+        app.init_db()
+    finally:
+        app.DB_CONFIG.clear()
+        app.DB_CONFIG.update(original)
+        app._db_pool = None
+
+
+def random_text(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def seed_products(conn, count, seller_id, batch_size=2000, seed=42):
+    """Insert `count` random products with multi-row INSERTs"""
+    rng = random.Random(seed)
+    cursor = conn.cursor()
+    inserted = 0
+    while inserted < count:
+        n = min(batch_size, count - inserted)
+        rows = [
+            (random_text(rng, 3).title(), random_text(rng, 25), round(rng.uniform(10, 5000), 2),
+             rng.choice(CATEGORIES), rng.randint(0, 50), seller_id)
+            for _ in range(n)
+        ]
+        cursor.executemany(
+            "INSERT INTO products (name, description, price, category, stock, seller_id) VALUES (%s, %s, %s, %s, %s, %s)",
+            rows
+        )
+        conn.commit()
+        inserted += n
+    cursor.close()
+
+
+def seed_users(conn, count, password_hash, batch_size=2000, email_prefix='bench-user'):
+    """Insert `count` users sharing one password hash (hashing per user would dominate seeding)"""
+    cursor = conn.cursor()
+    for start in range(0, count, batch_size):
+        cursor.executemany(
+            "INSERT INTO users (name, email, password) VALUES (%s, %s, %s)",
+            [(f'Bench User {i}', f'{email_prefix}-{i}@campus.com', password_hash)
+             for i in range(start, min(count, start + batch_size))]
+        )
+        conn.commit()
+    cursor.close()
+
+
+def seed_feedbacks(conn, count, user_ids, product_ids, batch_size=2000, seed=42):
+    """Insert `count` random product reviews"""
+    rng = random.Random(seed)
+    cursor = conn.cursor()
+    inserted = 0
+    while inserted < count:
+        n = min(batch_size, count - inserted)
+        cursor.executemany(
+            "INSERT INTO feedbacks (user_id, product_id, rating, comment) VALUES (%s, %s, %s, %s)",
+            [(rng.choice(user_ids), rng.choice(product_ids), rng.randint(1, 5), random_text(rng, 12))
+             for _ in range(n)]
+        )
+        conn.commit()
+        inserted += n
+    cursor.close()
+
+
+def seed_orders(conn, count, user_ids, product_ids, max_items=4, batch_size=500, seed=42):
+    """Insert `count` orders of 1..max_items random products each"""
+    rng = random.Random(seed)
+    statuses = ['pending', 'processing', 'shipped', 'completed', 'cancelled']
+    cursor = conn.cursor()
+    inserted = 0
+    while inserted < count:
+        n = min(batch_size, count - inserted)
+        items = []
+        for _ in range(n):
+            lines = [(rng.choice(product_ids), rng.randint(1, 3), round(rng.uniform(10, 5000), 2))
+                     for _ in range(rng.randint(1, max_items))]
+            cursor.execute(
+                "INSERT INTO orders (user_id, total_amount, payment_method, shipping_address, status) "
+                "VALUES (%s, %s, %s, %s, %s)",
+                (rng.choice(user_ids), sum(q * p for _, q, p in lines), 'cash', 'Hostel Block A', rng.choice(statuses))
+            )
+            order_id = cursor.lastrowid
+            items += [(order_id, product_id, quantity, price) for product_id, quantity, price in lines]
+        cursor.executemany(
+            "INSERT INTO order_items (order_id, product_id, quantity, price) VALUES (%s, %s, %s, %s)",
+            items
+        )
+        conn.commit()
+        inserted += n
+    cursor.close()
+
+
+def ensure_seller(conn, email='bench-seller@campus.com'):
+    cursor = conn.cursor()
+    cursor.execute("SELECT id FROM users WHERE email = %s", (email,))
+    row = cursor.fetchone()
+    if row:
+        cursor.close()
+        return row[0]
+    cursor.execute(
+        "INSERT INTO users (name, email, password, role) VALUES (%s, %s, %s, 'admin')",
+        ('Bench Seller', email, 'x')
+    )
+    conn.commit()
+    seller_id = cursor.lastrowid
+    cursor.close()
+    return seller_id
+
+
+def time_call(fn, repeat):
+    """Run fn `repeat` times and return latencies in milliseconds"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(samples):
+    return {
+        'count': len(samples),
+        'mean_ms': round(statistics.mean(samples), 3) if samples else 0.0,
+        'p50_ms': round(percentile(samples, 50), 3),
+        'p95_ms': round(percentile(samples, 95), 3),
+        'p99_ms': round(percentile(samples, 99), 3),
+    }
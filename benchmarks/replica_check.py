@@ -0,0 +1,120 @@
+"""
+Check read/write splitting against two running MySQL servers
+
+    python -m benchmarks.replica_check --replica-port 3307
+    python -m benchmarks.replica_check --primary-host db1 --replica-host db2
+
+Points the app at the primary plus one replica (replication doesn't have to
+be set up; the check only looks at which server answers) and verifies that:
+read-only work goes to the replica, a request that commits pins the same
+session to the primary, the pin expires after DB_REPLICA_PIN_SECONDS, other
+sessions keep reading from the replica meanwhile, pages rendered right after
+a page-cache invalidation are not cached, and reads fall back to the primary
+when the replica is down.
+"""
+
+import argparse
+import sys
+import time
+
+import app as marketplace
+from app import app, get_db_connection, reset_db_pool
+
+
+def server_id(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT @@hostname, @@port")
+    host, port = cursor.fetchone()
+    cursor.close()
+    return f"{host}:{port}"
+
+
+@app.route('/_replica_check/<action>')
+def replica_check_view(action):
+    if action == 'write':
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1")
+        cursor.fetchall()
+        conn.commit()
+        cursor.close()
+        return server_id(conn)
+    return server_id(get_db_connection(readonly=True))
+
+
+cached_renders = []
+
+
+@app.route('/_replica_check/cached')
+@marketplace.page_cache.cached('replica-check')
+def replica_check_cached():
+    cached_renders.append(time.time())
+    return server_id(get_db_connection(readonly=True))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--primary-host', default=marketplace.DB_CONFIG['host'])
+    parser.add_argument('--primary-port', type=int, default=3306)
+    parser.add_argument('--replica-host', default=marketplace.DB_CONFIG['host'])
+    parser.add_argument('--replica-port', type=int, default=3306)
+    parser.add_argument('--pin-seconds', type=float, default=2)
+    args = parser.parse_args()
+
+    marketplace.DB_CONFIG.update(host=args.primary_host, port=args.primary_port)
+    app.config['DB_REPLICAS'] = [{'host': args.replica_host, 'port': args.replica_port}]
+    app.config['DB_REPLICA_PIN_SECONDS'] = args.pin_seconds
+    marketplace.page_cache.settle_seconds = args.pin_seconds
+    reset_db_pool()
+
+    conn = get_db_connection()
+    if not conn:
+        sys.exit("Could not connect to the primary")
+    primary = server_id(conn)
+    conn.close()
+    replica = server_id(get_db_connection(readonly=True))
+    print(f"primary {primary}, replica {replica}")
+    if primary == replica:
+        sys.exit("Both settings reach the same server; start a second instance and pass its host/port")
+
+    failures = []
+
+    def check(label, actual, expected):
+        ok = actual == expected
+        print(f"{'PASS' if ok else 'FAIL'}  {label}: {actual}")
+        if not ok:
+            failures.append(label)
+
+    writer = app.test_client()
+    other = app.test_client()
+    check("read goes to the replica", writer.get('/_replica_check/read').text, replica)
+    check("write goes to the primary", writer.get('/_replica_check/write').text, primary)
+    check("read right after a write is pinned to the primary", writer.get('/_replica_check/read').text, primary)
+    check("another session still reads from the replica", other.get('/_replica_check/read').text, replica)
+    time.sleep(args.pin_seconds + 0.5)
+    check("pin expires after DB_REPLICA_PIN_SECONDS", writer.get('/_replica_check/read').text, replica)
+
+    # Renders count how often the cached page missed: twice while settling, then once
+    marketplace.page_cache.invalidate('replica-check')
+    other.get('/_replica_check/cached')
+    other.get('/_replica_check/cached')
+    check("pages rendered right after an invalidation are not cached", len(cached_renders), 2)
+    time.sleep(args.pin_seconds + 0.5)
+    other.get('/_replica_check/cached')
+    other.get('/_replica_check/cached')
+    check("pages are cached again once the invalidation settles", len(cached_renders), 3)
+
+    # A replica nothing listens on: reads must fall back to the primary
+    app.config['DB_REPLICAS'] = [{'host': '127.0.0.1', 'port': 1}]
+    marketplace._replica_down_until.clear()
+    reset_db_pool()
+    check("read falls back to the primary when the replica is down", other.get('/_replica_check/read').text, primary)
+    reset_db_pool()
+
+    if failures:
+        sys.exit(f"{len(failures)} check(s) failed")
+    print("All checks passed")
+
+
+if __name__ == '__main__':
+    main()
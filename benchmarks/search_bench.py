@@ -0,0 +1,67 @@
+"""
+Compare product search latency: LIKE '%term%' scans vs the FULLTEXT index
+
+    python -m benchmarks.search_bench --sizes 10000 100000 1000000
+"""
+
+import argparse
+
+from benchmarks.common import (BENCH_DB_CONFIG, connect, create_bench_database, ensure_seller,
+                               seed_products, summarize, time_call)
+from search import build_boolean_query
+
+TERMS = ['laptop', 'calculus textbook', 'cricket', 'headph', 'desk lamp']
+
+
+def like_search(cursor, term):
+    cursor.execute(
+        "SELECT p.id FROM products p WHERE (p.name LIKE %s OR p.description LIKE %s) ORDER BY p.created_at DESC LIMIT 24",
+        (f'%{term}%', f'%{term}%')
+    )
+    cursor.fetchall()
+
+
+def fulltext_search(cursor, term):
+    query = build_boolean_query(term)
+    cursor.execute(
+        "SELECT p.id, MATCH(p.name, p.description) AGAINST(%s IN BOOLEAN MODE) AS relevance FROM products p "
+        "WHERE MATCH(p.name, p.description) AGAINST(%s IN BOOLEAN MODE) ORDER BY relevance DESC, p.id DESC LIMIT 24",
+        (query, query)
+    )
+    cursor.fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=20, help='queries per term')
+    args = parser.parse_args()
+
+    print(f"Using database {BENCH_DB_CONFIG['database']}")
+    create_bench_database()
+    conn = connect()
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM products")
+    conn.commit()
+    seller_id = ensure_seller(conn)
+
+    seeded = 0
+    print(f"{'products':>10} {'engine':>9} {'mean ms':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for size in sorted(args.sizes):
+        seed_products(conn, size - seeded, seller_id, seed=size)
+        seeded = size
+        cursor.execute("ANALYZE TABLE products")
+        cursor.fetchall()
+        for name, fn in (('like', like_search), ('fulltext', fulltext_search)):
+            samples = []
+            for term in TERMS:
+                samples += time_call(lambda: fn(cursor, term), args.repeat)
+            stats = summarize(samples)
+            print(f"{size:>10} {name:>9} {stats['mean_ms']:>9} {stats['p50_ms']:>8} {stats['p95_ms']:>8} {stats['p99_ms']:>8}")
+
+    cursor.close()
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
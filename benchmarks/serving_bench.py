@@ -0,0 +1,147 @@
+"""
+Compare the sync (WSGI) and async (ASGI) serving modes under load
+
+    python -m benchmarks.serving_bench --workers 4 --concurrency 64 --duration 30
+
+Starts each server with the same number of worker processes, hammers the
+read-heavy pages with `--concurrency` keep-alive clients for `--duration`
+seconds and reports requests/sec and latency percentiles per mode. Pass
+--sync-url/--async-url to measure servers you started yourself instead.
+Needs gunicorn for the sync mode and uvicorn, aiomysql and asgiref for the
+async one. Point DB_CONFIG at a database with a realistic product count
+first (e.g. seeded by benchmarks.search_bench).
+"""
+
+import argparse
+import http.client
+import json
+import random
+import shlex
+import subprocess
+import threading
+import time
+from urllib.parse import urlsplit
+
+from benchmarks.common import summarize
+
+SYNC_CMD = 'gunicorn -c gunicorn.conf.py --workers {workers} --bind 127.0.0.1:{port} --access-logfile /dev/null'
+ASYNC_CMD = 'uvicorn asgi:application --workers {workers} --host 127.0.0.1 --port {port} --log-level warning'
+
+# Weighted like real browsing: mostly listings and product pages
+PATHS = [
+    ('/', 2),
+    ('/products', 3),
+    ('/products?search=laptop', 2),
+    ('/products?category=Books', 1),
+    ('/product/{product_id}', 4),
+]
+
+
+def start_server(command, workers, port):
+    process = subprocess.Popen(shlex.split(command.format(workers=workers, port=port)))
+    url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/login')
+            conn.getresponse().read()
+            conn.close()
+            return process, url
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"Server did not start: {command}")
+
+
+def run_load(url, concurrency, duration, max_product_id, seed=7):
+    """Closed-loop load: each client sends its next request as soon as the last one returns"""
+    parts = urlsplit(url)
+    weighted = [path for path, weight in PATHS for _ in range(weight)]
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def client(index):
+        rng = random.Random(seed + index)
+        conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=30)
+        samples = []
+        failed = 0
+        while time.monotonic() < stop_at:
+            path = rng.choice(weighted).format(product_id=rng.randint(1, max_product_id))
+            start = time.perf_counter()
+            try:
+                conn.request('GET', path)
+                response = conn.getresponse()
+                response.read()
+                if response.status >= 500:
+                    failed += 1
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                conn.close()
+                conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=30)
+                continue
+            samples.append((time.perf_counter() - start) * 1000)
+        conn.close()
+        with lock:
+            latencies.extend(samples)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    result = summarize(latencies)
+    result['requests_per_sec'] = round(len(latencies) / elapsed, 1)
+    result['errors'] = errors[0]
+    return result
+
+
+def bench_mode(name, url, command, args, port):
+    process = None
+    if url is None:
+        process, url = start_server(command, args.workers, port)
+    try:
+        # Warm caches and pools so both modes are measured in steady state
+        run_load(url, args.concurrency, min(5, args.duration), args.max_product_id)
+        result = run_load(url, args.concurrency, args.duration, args.max_product_id)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+    print(f"{name:>5}: {result['requests_per_sec']} req/s, p50 {result['p50_ms']} ms, "
+          f"p99 {result['p99_ms']} ms, {result['errors']} errors")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4, help='worker processes for both modes')
+    parser.add_argument('--concurrency', type=int, default=64, help='simultaneous clients')
+    parser.add_argument('--duration', type=int, default=30, help='seconds of load per mode')
+    parser.add_argument('--max-product-id', type=int, default=1000, help='product ids are drawn from 1..N')
+    parser.add_argument('--sync-url')
+    parser.add_argument('--async-url')
+    parser.add_argument('--sync-cmd', default=SYNC_CMD)
+    parser.add_argument('--async-cmd', default=ASYNC_CMD)
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    args = parser.parse_args()
+
+    results = {
+        'workers': args.workers,
+        'concurrency': args.concurrency,
+        'sync': bench_mode('sync', args.sync_url, args.sync_cmd, args, 8001),
+        'async': bench_mode('async', args.async_url, args.async_cmd, args, 8002),
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,331 @@
+"""
+Reproducible load test of the storefront user journeys
+
+    python -m benchmarks.storefront_bench --users 2000 --products 20000 --feedbacks 50000 --orders 10000
+    python -m benchmarks.storefront_bench --output baseline.json
+    python -m benchmarks.storefront_bench --compare baseline.json
+
+Reseeds campus_marketplace_bench with the requested volumes (the same data
+for the same arguments), starts the app under gunicorn against it and runs
+--concurrency simulated visitors for --duration seconds. Each visitor keeps
+picking a journey (browsing, searching, buying or working through the admin
+pages) and runs its steps in order with its own session cookies. Requests/sec
+and latency percentiles are reported per route. --output saves them with the
+git commit and settings as JSON; --compare reads such a file and exits with
+status 1 when a route's p95 is more than --tolerance percent slower, so runs
+can be compared between commits. Pass --url to load a server you started
+yourself with benchmarks.bench_wsgi, and --skip-seed to reuse the last seed
+(orders placed by earlier runs are then still there).
+"""
+
+import argparse
+import http.client
+import json
+import random
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import quote, urlencode, urlsplit
+
+from werkzeug.security import generate_password_hash
+
+import stats
+from benchmarks.common import (BENCH_DB_CONFIG, CATEGORIES, WORDS, connect, create_bench_database, seed_feedbacks,
+                               seed_orders, seed_products, seed_users, summarize)
+from benchmarks.serving_bench import start_server
+from ratings import rebuild_ratings
+
+SERVER_CMD = ('gunicorn -c gunicorn.conf.py benchmarks.bench_wsgi:application --workers {workers} '
+              '--bind 127.0.0.1:{port} --access-logfile /dev/null')
+
+BENCH_PASSWORD = 'bench123'
+ADMIN_EMAIL = 'bench-admin@campus.com'
+SEEDED_TABLES = ['order_items', 'orders', 'cart', 'feedbacks', 'product_ratings', 'products', 'users']
+
+
+def seed(conn, args):
+    """Replace the benchmark data with freshly generated rows"""
+    started = time.perf_counter()
+    cursor = conn.cursor()
+    cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+    for table in SEEDED_TABLES:
+        cursor.execute(f"TRUNCATE TABLE {table}")
+    cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
+
+    password_hash = generate_password_hash(BENCH_PASSWORD)
+    cursor.execute(
+        "INSERT INTO users (name, email, password, role) VALUES (%s, %s, %s, 'admin')",
+        ('Bench Admin', ADMIN_EMAIL, password_hash)
+    )
+    admin_id = cursor.lastrowid
+    conn.commit()
+    seed_users(conn, args.users, password_hash)
+    seed_products(conn, args.products, admin_id, seed=args.seed)
+
+    cursor.execute("SELECT id FROM users WHERE role = 'user'")
+    user_ids = [row[0] for row in cursor.fetchall()]
+    cursor.execute("SELECT id FROM products")
+    product_ids = [row[0] for row in cursor.fetchall()]
+    seed_feedbacks(conn, args.feedbacks, user_ids, product_ids, seed=args.seed)
+    seed_orders(conn, args.orders, user_ids, product_ids, seed=args.seed)
+    rebuild_ratings(conn)
+    stats.reconcile(conn)
+    for table in SEEDED_TABLES:
+        cursor.execute(f"ANALYZE TABLE {table}")
+        cursor.fetchall()
+    cursor.close()
+    print(f"Seeded {args.users} users, {args.products} products, {args.feedbacks} feedbacks and "
+          f"{args.orders} orders in {time.perf_counter() - started:.1f}s")
+
+
+class Visitor:
+    """One simulated browser: a keep-alive connection plus a cookie jar per login"""
+
+    def __init__(self, url, index, args, product_range, record):
+        self.parts = urlsplit(url)
+        self.rng = random.Random(args.seed + index)
+        self.email = f'bench-user-{index % max(1, args.users)}@campus.com'
+        self.product_range = product_range
+        self.record = record
+        self.cookies = {'guest': {}, 'shopper': {}, 'admin': {}}
+        self.conn = self._connect()
+
+    def _connect(self):
+        return http.client.HTTPConnection(self.parts.hostname, self.parts.port, timeout=30)
+
+    def product_id(self):
+        return self.rng.randint(*self.product_range)
+
+    def request(self, method, path, route, role='guest', body=None, content_type=None):
+        jar = self.cookies[role]
+        headers = {}
+        if jar:
+            headers['Cookie'] = '; '.join(f'{k}={v}' for k, v in jar.items())
+        if content_type:
+            headers['Content-Type'] = content_type
+        start = time.perf_counter()
+        try:
+            self.conn.request(method, path, body=body, headers=headers)
+            response = self.conn.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            self.conn.close()
+            self.conn = self._connect()
+            self.record(route, None, None)
+            return None
+        self.record(route, (time.perf_counter() - start) * 1000, response.status)
+        for header in response.headers.get_all('Set-Cookie') or []:
+            name, _, value = header.split(';', 1)[0].partition('=')
+            jar[name.strip()] = value
+        return response.status
+
+    def get(self, path, route, role='guest'):
+        return self.request('GET', path, route, role)
+
+    def post_form(self, path, data, route, role='guest'):
+        return self.request('POST', path, route, role, urlencode(data), 'application/x-www-form-urlencoded')
+
+    def post_json(self, path, data, route, role='guest'):
+        return self.request('POST', path, route, role, json.dumps(data), 'application/json')
+
+    def login(self, role, email):
+        if 'session' not in self.cookies[role]:
+            self.post_form('/login', {'email': email, 'password': BENCH_PASSWORD}, 'POST /login', role)
+
+    def close(self):
+        self.conn.close()
+
+
+# Journeys: the steps one visitor takes in order
+
+def browse(v):
+    v.get('/', 'GET /')
+    v.get('/products', 'GET /products')
+    v.get(f'/products?category={quote(v.rng.choice(CATEGORIES))}', 'GET /products?category')
+    for _ in range(2):
+        v.get(f'/product/{v.product_id()}', 'GET /product/<id>')
+
+
+def search(v):
+    term = v.rng.choice(WORDS)
+    v.get(f'/api/products/suggest?q={quote(term[:3])}', 'GET /api/products/suggest')
+    v.get(f'/products?search={quote(term)}', 'GET /products?search')
+    v.get(f'/product/{v.product_id()}', 'GET /product/<id>')
+
+
+def buy(v):
+    v.login('shopper', v.email)
+    product_id = v.product_id()
+    v.get(f'/product/{product_id}', 'GET /product/<id>', 'shopper')
+    v.post_json('/add_to_cart', {'product_id': product_id, 'quantity': 1}, 'POST /add_to_cart', 'shopper')
+    v.get('/cart', 'GET /cart', 'shopper')
+    # A 302 here means the cart is empty (the product was out of stock)
+    if v.get('/checkout', 'GET /checkout', 'shopper') == 200:
+        v.post_form('/checkout', {'payment_method': 'cash', 'address': 'Hostel Block A'}, 'POST /checkout', 'shopper')
+    v.get('/orders', 'GET /orders', 'shopper')
+
+
+def admin(v):
+    v.login('admin', ADMIN_EMAIL)
+    for path in ('/admin', '/admin/products', '/admin/orders', '/admin/users', '/admin/feedbacks'):
+        v.get(path, f'GET {path}', 'admin')
+
+
+JOURNEYS = [(browse, 5), (search, 3), (buy, 2), (admin, 1)]
+
+
+def run_journeys(url, args, product_range, duration):
+    """Closed loop: each visitor starts its next journey as soon as the last one ends"""
+    weighted = [journey for journey, weight in JOURNEYS for _ in range(weight)]
+    samples = {}
+    errors = {}
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def visitor(index):
+        local_samples = {}
+        local_errors = {}
+
+        def record(route, ms, status):
+            if ms is None or status >= 500:
+                local_errors[route] = local_errors.get(route, 0) + 1
+            if ms is not None:
+                local_samples.setdefault(route, []).append(ms)
+
+        v = Visitor(url, index, args, product_range, record)
+        while time.monotonic() < stop_at:
+            v.rng.choice(weighted)(v)
+        v.close()
+        with lock:
+            for route, values in local_samples.items():
+                samples.setdefault(route, []).extend(values)
+            for route, count in local_errors.items():
+                errors[route] = errors.get(route, 0) + count
+
+    threads = [threading.Thread(target=visitor, args=(i,)) for i in range(args.concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    routes = {}
+    for route in sorted(samples):
+        result = summarize(samples[route])
+        result['requests_per_sec'] = round(len(samples[route]) / elapsed, 1)
+        result['errors'] = errors.get(route, 0)
+        routes[route] = result
+    everything = [ms for values in samples.values() for ms in values]
+    total = summarize(everything)
+    total['requests_per_sec'] = round(len(everything) / elapsed, 1)
+    total['errors'] = sum(errors.values())
+    return routes, total
+
+
+def print_results(routes, total):
+    print(f"{'route':<28} {'count':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for route, r in list(routes.items()) + [('TOTAL', total)]:
+        print(f"{route:<28} {r['count']:>7} {r['requests_per_sec']:>8} {r['p50_ms']:>8} "
+              f"{r['p95_ms']:>8} {r['p99_ms']:>8} {r['errors']:>7}")
+
+
+def compare(baseline, routes, tolerance):
+    """Print p95 changes against a saved run; returns the routes that got slower than allowed"""
+    print(f"\nCompared with {baseline.get('commit') or 'baseline'} ({baseline.get('created_at', '?')}):")
+    print(f"{'route':<28} {'p95 before':>11} {'p95 now':>9} {'change':>8}")
+    regressions = []
+    for route, now in routes.items():
+        before = baseline['routes'].get(route)
+        if not before or not before['p95_ms']:
+            continue
+        change = (now['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100
+        flag = ''
+        if change > tolerance:
+            regressions.append(route)
+            flag = '  <- slower'
+        print(f"{route:<28} {before['p95_ms']:>11} {now['p95_ms']:>9} {change:>+7.1f}%{flag}")
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--products', type=int, default=20000)
+    parser.add_argument('--feedbacks', type=int, default=50000)
+    parser.add_argument('--orders', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=42, help='random seed for the data and the visitors')
+    parser.add_argument('--skip-seed', action='store_true', help='reuse the data already in the bench database')
+    parser.add_argument('--workers', type=int, default=4, help='gunicorn worker processes')
+    parser.add_argument('--concurrency', type=int, default=32, help='simultaneous visitors')
+    parser.add_argument('--duration', type=int, default=60, help='seconds of measured load')
+    parser.add_argument('--warmup', type=int, default=10, help='seconds of unmeasured load first')
+    parser.add_argument('--url', help='load this server instead of starting one')
+    parser.add_argument('--cmd', default=SERVER_CMD, help='command that starts the server')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--compare', help='baseline JSON from an earlier --output run')
+    parser.add_argument('--tolerance', type=float, default=10.0, help='allowed p95 slowdown in percent')
+    args = parser.parse_args()
+
+    print(f"Using database {BENCH_DB_CONFIG['database']}")
+    create_bench_database()
+    conn = connect()
+    if not args.skip_seed:
+        seed(conn, args)
+    cursor = conn.cursor()
+    cursor.execute("SELECT MIN(id), MAX(id) FROM products")
+    product_range = cursor.fetchone()
+    cursor.close()
+    conn.close()
+    if product_range[0] is None:
+        sys.exit("The bench database has no products; run without --skip-seed")
+
+    process, url = None, args.url
+    if url is None:
+        process, url = start_server(args.cmd, args.workers, 8003)
+    try:
+        if args.warmup:
+            run_journeys(url, args, product_range, args.warmup)
+        routes, total = run_journeys(url, args, product_range, args.duration)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+
+    print_results(routes, total)
+    results = {
+        'commit': git_commit(),
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'volumes': {'users': args.users, 'products': args.products,
+                    'feedbacks': args.feedbacks, 'orders': args.orders, 'seed': args.seed},
+        'workers': args.workers,
+        'concurrency': args.concurrency,
+        'duration': args.duration,
+        'routes': routes,
+        'total': total,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get('volumes') != results['volumes']:
+            print("Warning: the baseline was seeded with different volumes")
+        if compare(baseline, routes, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
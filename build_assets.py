@@ -0,0 +1,196 @@
+"""
+Build the static asset bundles for Campus Marketplace
+
+    python build_assets.py            # fetch missing vendor files, then build
+    python build_assets.py --offline  # build from static/vendor only
+    python build_assets.py --clean    # drop earlier builds from static/dist first
+
+Vendor libraries (Bootstrap, Font Awesome, jQuery) are downloaded once into
+static/vendor so the site doesn't depend on public CDNs. Each bundle is
+concatenated, minified, named after a hash of its content and written to
+static/dist together with .gz and .br copies (brotli needs the optional
+brotli package; rcssmin/rjsmin give better minification when installed).
+Files referenced from CSS, like the icon fonts, are copied with hashed names
+too. static/dist/manifest.json maps bundle names to the built files and is
+what asset_url() in the templates reads.
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+import urllib.request
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+try:
+    import rcssmin
+except ImportError:  # optional dependency
+    rcssmin = None
+
+try:
+    import rjsmin
+except ImportError:  # optional dependency
+    rjsmin = None
+
+from assets import DIST_DIR, MANIFEST_NAME
+
+STATIC_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+
+FONT_AWESOME = 'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.4.0'
+FONT_AWESOME_FONTS = ['fa-brands-400', 'fa-regular-400', 'fa-solid-900', 'fa-v4compatibility']
+
+# Local path under static/ -> where it is downloaded from
+VENDOR = {
+    'vendor/bootstrap/bootstrap.min.css': 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css',
+    'vendor/bootstrap/bootstrap.bundle.min.js': 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js',
+    'vendor/jquery/jquery.min.js': 'https://code.jquery.com/jquery-3.7.0.min.js',
+    'vendor/fontawesome/css/all.min.css': f'{FONT_AWESOME}/css/all.min.css',
+}
+for font in FONT_AWESOME_FONTS:
+    for ext in ('woff2', 'ttf'):
+        VENDOR[f'vendor/fontawesome/webfonts/{font}.{ext}'] = f'{FONT_AWESOME}/webfonts/{font}.{ext}'
+
+# Bundle name -> source files under static/, in load order
+BUNDLES = {
+    'app.css': [
+        'vendor/bootstrap/bootstrap.min.css',
+        'vendor/fontawesome/css/all.min.css',
+        'css/style.css',
+    ],
+    'app.js': [
+        'vendor/bootstrap/bootstrap.bundle.min.js',
+        'vendor/jquery/jquery.min.js',
+        'js/main.js',
+    ],
+}
+
+CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+SOURCE_MAP = re.compile(r'^\s*(/\*# sourceMappingURL=.*?\*/|//# sourceMappingURL=.*)$', re.MULTILINE)
+
+
+def fetch_vendor(offline=False):
+    for path, url in VENDOR.items():
+        dest = os.path.join(STATIC_FOLDER, path)
+        if os.path.exists(dest):
+            continue
+        if offline:
+            sys.exit(f"Missing {path}; run without --offline once to download it")
+        print(f"Downloading {url}")
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        with urllib.request.urlopen(url, timeout=30) as response, open(dest + '.tmp', 'wb') as out:
+            shutil.copyfileobj(response, out)
+        os.replace(dest + '.tmp', dest)
+
+
+def fingerprint(content):
+    return hashlib.sha256(content).hexdigest()[:12]
+
+
+def hashed_name(name, content):
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{fingerprint(content)}{ext}"
+
+
+def minify_css(text):
+    if rcssmin:
+        return rcssmin.cssmin(text)
+    # Drop comments (keeping /*! license headers) and collapse whitespace
+    text = re.sub(r'/\*(?!!).*?\*/', '', text, flags=re.DOTALL)
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'\s*([{};,>])\s*', r'\1', text)
+    return text.replace(';}', '}').strip()
+
+
+def minify_js(text):
+    if rjsmin:
+        return rjsmin.jsmin(text)
+    return text.strip()
+
+
+def copy_css_references(text, source_path, dist_folder, written):
+    """Copy files a stylesheet points at into dist under hashed names and rewrite the url()s"""
+    source_dir = os.path.dirname(source_path)
+
+    def replace(match):
+        url = match.group(2).strip()
+        if url.startswith(('data:', 'http:', 'https:', '//', '#')):
+            return match.group(0)
+        path, suffix = re.match(r'([^?#]*)(.*)', url).groups()
+        target = os.path.normpath(os.path.join(source_dir, path))
+        if not os.path.isfile(target):
+            print(f"Warning: {os.path.relpath(source_path, STATIC_FOLDER)} references missing file {path}")
+            return match.group(0)
+        with open(target, 'rb') as f:
+            content = f.read()
+        name = hashed_name(os.path.basename(target), content)
+        if name not in written:
+            with open(os.path.join(dist_folder, name), 'wb') as f:
+                f.write(content)
+            written.add(name)
+        return f'url({name}{suffix})'
+
+    return CSS_URL.sub(replace, text)
+
+
+def write_compressed(path, content):
+    """Write .gz and .br next to `path` when they are actually smaller"""
+    variants = [('.gz', gzip.compress(content, compresslevel=9, mtime=0))]
+    if brotli:
+        variants.append(('.br', brotli.compress(content, quality=11)))
+    for suffix, data in variants:
+        if len(data) < len(content):
+            with open(path + suffix, 'wb') as f:
+                f.write(data)
+
+
+def build(clean=False):
+    dist_folder = os.path.join(STATIC_FOLDER, DIST_DIR)
+    if clean and os.path.isdir(dist_folder):
+        shutil.rmtree(dist_folder)
+    os.makedirs(dist_folder, exist_ok=True)
+
+    manifest = {}
+    written = set()
+    for bundle, sources in BUNDLES.items():
+        parts = []
+        for source in sources:
+            source_path = os.path.join(STATIC_FOLDER, source)
+            with open(source_path, encoding='utf-8') as f:
+                text = SOURCE_MAP.sub('', f.read())
+            if bundle.endswith('.css'):
+                parts.append(minify_css(copy_css_references(text, source_path, dist_folder, written)))
+            else:
+                # A trailing semicolon keeps one file's last statement from running into the next
+                parts.append(minify_js(text) + ';')
+        content = '\n'.join(parts).encode('utf-8')
+
+        name = hashed_name(bundle, content)
+        path = os.path.join(dist_folder, name)
+        with open(path, 'wb') as f:
+            f.write(content)
+        write_compressed(path, content)
+        manifest[bundle] = name
+        print(f"{bundle} -> {DIST_DIR}/{name} ({len(content) / 1024:.1f} KB)")
+
+    # Manifest last, so a running app never points at a bundle that isn't written yet
+    manifest_path = os.path.join(dist_folder, MANIFEST_NAME)
+    with open(manifest_path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(manifest_path + '.tmp', manifest_path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--offline', action='store_true', help="don't download missing vendor files")
+    parser.add_argument('--clean', action='store_true', help='remove earlier builds from static/dist')
+    args = parser.parse_args()
+    fetch_vendor(offline=args.offline)
+    build(clean=args.clean)
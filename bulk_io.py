@@ -0,0 +1,252 @@
+"""
+Bulk product import and table export for Campus Marketplace
+Imports read a CSV or JSON Lines upload row by row, validate each row and
+insert valid ones with multi-row INSERTs, committing every few thousand rows
+so a large file never holds one long transaction. Invalid rows are skipped and
+reported with their line number. Exports walk a table in primary-key order a
+chunk at a time and yield CSV or JSON Lines text, so a dump of any size is
+streamed without being loaded into memory.
+"""
+
+import csv
+import io
+import json
+from decimal import Decimal, InvalidOperation
+
+from mysql.connector import Error
+
+import stats
+from storage import UPLOAD_NAME, add_ref
+
+IMPORT_BATCH_SIZE = 500       # rows per multi-row INSERT
+IMPORT_CHUNK_SIZE = 5000      # rows per transaction
+MAX_REPORTED_ERRORS = 1000    # rows listed in the error report; the rest are only counted
+EXPORT_CHUNK_SIZE = 1000
+
+# Deadlock and lock wait timeout abort the whole transaction, not just the failed statement
+TRANSACTION_ABORTED_ERRORS = (1213, 1205)
+
+FORMATS = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+
+# Exportable tables and their columns, in file order
+EXPORT_COLUMNS = {
+    'products': ['id', 'name', 'description', 'price', 'category', 'stock', 'image', 'seller_id',
+                 'created_at', 'updated_at'],
+    'orders': ['id', 'user_id', 'total_amount', 'payment_method', 'shipping_address', 'status',
+               'created_at', 'updated_at'],
+    'order_items': ['id', 'order_id', 'product_id', 'quantity', 'price', 'created_at'],
+}
+
+PRODUCT_COLUMNS = ('name', 'description', 'price', 'category', 'stock', 'image')
+
+
+class ImportFormatError(ValueError):
+    """The upload isn't a readable CSV/JSONL file"""
+
+
+def read_rows(stream, fmt):
+    """Yield (line number, dict) for each record of a binary upload stream, parsed lazily"""
+    if fmt not in FORMATS:
+        raise ImportFormatError(f"Unsupported format {fmt!r}")
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    line_no = 0
+    try:
+        if fmt == 'csv':
+            reader = csv.DictReader(text)
+            if not reader.fieldnames or not {'name', 'price'} <= set(reader.fieldnames):
+                raise ImportFormatError("The CSV needs a header row with at least name and price columns")
+            for row in reader:
+                # line_num is the last physical line read, so quoted newlines don't shift the count
+                line_no = reader.line_num
+                yield line_no, row
+        else:
+            for line_no, line in enumerate(text, 1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    row = None
+                yield line_no, row if isinstance(row, dict) else None
+    except (csv.Error, UnicodeDecodeError) as e:
+        raise ImportFormatError(f"Unreadable file after line {line_no}: {e}")
+
+
+def validate_product(row, default_image):
+    """Return (values tuple in PRODUCT_COLUMNS order, None) or (None, list of problems)"""
+    if row is None:
+        return None, ['not a JSON object']
+    problems = []
+
+    def text(key, limit, required=False):
+        value = row.get(key)
+        value = '' if value is None else str(value).strip()
+        if required and not value:
+            problems.append(f'{key} is required')
+        elif len(value) > limit:
+            problems.append(f'{key} is longer than {limit} characters')
+        return value or None
+
+    name = text('name', 200, required=True)
+    description = text('description', 65535)
+    category = text('category', 50)
+    image = text('image', 255) or default_image
+    if image != default_image and not UPLOAD_NAME.match(image):
+        # Only names the upload pipeline produces; anything else could point outside the uploads
+        problems.append('image must be the name of an uploaded image')
+
+    try:
+        price = Decimal(str(row.get('price', '')).strip())
+    except InvalidOperation:
+        price = None
+        problems.append('price must be a number')
+    if price is not None:
+        if price.is_finite() and 0 <= price < Decimal('100000000'):
+            price = price.quantize(Decimal('0.01'))
+        else:
+            problems.append('price must be between 0 and 99999999.99')
+
+    stock = row.get('stock')
+    try:
+        stock = int(str(stock).strip()) if stock not in (None, '') else 0
+        if stock < 0:
+            problems.append('stock cannot be negative')
+    except ValueError:
+        problems.append('stock must be a whole number')
+
+    if problems:
+        return None, problems
+    return (name, description, price, category, stock, image), None
+
+
+def import_products(conn, rows, seller_id, default_image, image_exists=None,
+                    batch_size=IMPORT_BATCH_SIZE, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Insert products from (line number, dict) pairs. A generator: yields a
+    progress dict after every committed chunk, the last one with done=True.
+    `image_exists(name)` rejects rows naming an image that isn't in storage.
+    """
+    report = {'processed': 0, 'inserted': 0, 'failed': 0, 'errors': [], 'done': False}
+    checked_images = {default_image: True}
+
+    def reject(line_no, problems):
+        report['failed'] += 1
+        if len(report['errors']) < MAX_REPORTED_ERRORS:
+            report['errors'].append({'line': line_no, 'errors': problems})
+
+    cursor = conn.cursor()
+    batch = []
+    in_chunk = 0
+
+    def flush():
+        """INSERT the pending batch; if it fails, insert row by row to find the bad ones"""
+        nonlocal batch
+        if not batch:
+            return
+        inserted = []
+        try:
+            # mysql-connector sends an INSERT ... VALUES executemany as one multi-row statement
+            cursor.executemany(
+                "INSERT INTO products (name, description, price, category, stock, image, seller_id) "
+                "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+                [values + (seller_id,) for _, values in batch]
+            )
+            inserted = batch
+        except Error as e:
+            if e.errno in TRANSACTION_ABORTED_ERRORS:
+                raise
+            # A failed statement is rolled back on its own; the rest of the transaction stands
+            for line_no, values in batch:
+                try:
+                    cursor.execute(
+                        "INSERT INTO products (name, description, price, category, stock, image, seller_id) "
+                        "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+                        values + (seller_id,)
+                    )
+                    inserted.append((line_no, values))
+                except Error as row_error:
+                    if row_error.errno in TRANSACTION_ABORTED_ERRORS:
+                        raise
+                    reject(line_no, [row_error.msg])
+        for _, values in inserted:
+            if values[5] != default_image:
+                add_ref(cursor, values[5])
+        stats.bump(cursor, total_products=len(inserted))
+        report['inserted'] += len(inserted)
+        batch = []
+
+    try:
+        for line_no, row in rows:
+            report['processed'] += 1
+            values, problems = validate_product(row, default_image)
+            if values and image_exists is not None:
+                image = values[5]
+                if image not in checked_images:
+                    checked_images[image] = image_exists(image)
+                if not checked_images[image]:
+                    values, problems = None, [f'image {image} does not exist']
+            if problems:
+                reject(line_no, problems)
+                continue
+
+            batch.append((line_no, values))
+            in_chunk += 1
+            if len(batch) >= batch_size:
+                flush()
+            if in_chunk >= chunk_size:
+                flush()
+                conn.commit()
+                in_chunk = 0
+                yield dict(report, errors=[])
+        flush()
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    report['done'] = True
+    yield report
+
+
+def _csv_line(values):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(values)
+    return buffer.getvalue()
+
+
+def _json_value(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if hasattr(value, 'isoformat'):
+        return value.isoformat(sep=' ')
+    return value
+
+
+def export_rows(conn, table, fmt, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield the whole table as CSV or JSON Lines text, one chunk of rows per string"""
+    columns = EXPORT_COLUMNS[table]
+    if fmt == 'csv':
+        yield _csv_line(columns)
+
+    cursor = conn.cursor()
+    last_id = 0
+    try:
+        while True:
+            # Keyset on the primary key: each chunk is a short index range scan, however far in
+            cursor.execute(
+                f"SELECT {', '.join(columns)} FROM {table} WHERE id > %s ORDER BY id LIMIT %s",
+                (last_id, chunk_size)
+            )
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            if fmt == 'csv':
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(rows)
+                yield buffer.getvalue()
+            else:
+                yield ''.join(json.dumps(dict(zip(columns, map(_json_value, row)))) + '\n' for row in rows)
+            last_id = rows[-1][0]
+    finally:
+        cursor.close()
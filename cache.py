@@ -0,0 +1,215 @@
+"""
+Small caching helpers for Campus Marketplace
+An in-process TTL/LRU cache that can optionally be backed by a shared store
+(Redis) so every worker process sees the same entries and invalidations
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+class LocalCacheBackend:
+    """In-memory stand-in for a shared cache server (same interface as RedisCacheBackend)"""
+
+    shared = False  # lives in one process; other workers never see its entries
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+        self._calls = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires is not None and expires < time.time():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl if ttl else None)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def incr(self, key, amount=1):
+        with self._lock:
+            value, expires = self._data.get(key, (0, None))
+            value = int(value) + amount
+            self._data[key] = (value, expires)
+            return value
+
+    def take_token(self, key, rate, burst):
+        """
+        Token bucket holding up to `burst` tokens, refilled at `rate` per second:
+        take one and return 0, or return the seconds until one is available
+        """
+        now = time.time()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[1] < now:
+                tokens, updated = burst, now
+            else:
+                tokens, updated = item[0]
+            tokens = min(burst, tokens + (now - updated) * rate)
+            wait = 0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate
+            # Once the bucket would be full again it is the same as no bucket, so let it expire
+            self._data[key] = ((tokens, now), now + (burst - tokens) / rate)
+            self._calls += 1
+            if self._calls % 1000 == 0:
+                self._purge(now)
+            return wait
+
+    def _purge(self, now):
+        """Drop expired entries that nobody has read since (caller holds the lock)"""
+        for key in [k for k, (_, expires) in self._data.items() if expires is not None and expires < now]:
+            del self._data[key]
+
+
+# Token bucket for RedisCacheBackend.take_token(), using the server clock so every worker agrees
+TAKE_TOKEN_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + (now - updated) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil((burst - tokens) / rate * 1000) + 1000)
+return tostring(wait)
+"""
+
+
+class RedisCacheBackend:
+    """Shared cache backend on a Redis server (requires the optional redis package)"""
+
+    shared = True
+
+    def __init__(self, url):
+        import redis  # optional dependency, only needed when a Redis URL is configured
+        self.client = redis.Redis.from_url(url)
+        self._take_token = None
+
+    def get(self, key):
+        raw = self.client.get(key)
+        return None if raw is None else json.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(key, json.dumps(value, default=str), ex=ttl)
+
+    def delete(self, key):
+        self.client.delete(key)
+
+    def incr(self, key, amount=1):
+        return self.client.incrby(key, amount)
+
+    def take_token(self, key, rate, burst):
+        """Same as LocalCacheBackend.take_token, atomically on the Redis server"""
+        if self._take_token is None:
+            self._take_token = self.client.register_script(TAKE_TOKEN_SCRIPT)
+        # Lua numbers come back truncated to integers, so the wait is returned as a string
+        return float(self._take_token(keys=[key], args=[rate, burst]))
+
+
+def make_backend(url):
+    """Build a shared backend from a config value: None, 'local' or a redis:// URL"""
+    if not url:
+        return None
+    if url == 'local':
+        return LocalCacheBackend()
+    return RedisCacheBackend(url)
+
+
+class TTLCache:
+    """
+    LRU cache whose entries expire after `ttl` seconds. When a shared backend
+    is given, entries live there instead so invalidations reach every process.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60, backend=None, namespace='cache'):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.backend = backend
+        self.namespace = namespace
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _key(self, key):
+        return f"{self.namespace}:{key}"
+
+    def get(self, key):
+        """Return the cached value or None"""
+        if self.backend is not None:
+            value = self.backend.get(self._key(key))
+        else:
+            with self._lock:
+                value = None
+                item = self._data.get(key)
+                if item is not None:
+                    if item[1] >= time.monotonic():
+                        self._data.move_to_end(key)
+                        value = item[0]
+                    else:
+                        del self._data[key]
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key, value, ttl=None):
+        ttl = ttl or self.ttl
+        if self.backend is not None:
+            self.backend.set(self._key(key), value, ttl)
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        if self.backend is not None:
+            self.backend.delete(self._key(key))
+            return
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        return {
+            'namespace': self.namespace,
+            'shared': self.backend is not None,
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
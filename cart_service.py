@@ -0,0 +1,125 @@
+"""
+Cart reconciliation for Campus Marketplace
+Brings a user's cart in line with current stock using a fixed number of
+set-based statements, however many items the cart holds
+"""
+
+
+def reconcile_cart(conn, user_id):
+    """
+    Drop cart rows for deleted or sold-out products and clamp quantities to
+    the stock that is left. Returns a dict with the remaining `items` (each
+    with a `subtotal`), the cart `total` and `messages`, a list of
+    (text, category) pairs for the caller to flash.
+    """
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(
+        """SELECT c.*, p.id as live_product_id, p.name, p.price, p.image, p.seller_id, p.stock, u.name as seller_name
+           FROM cart c
+           LEFT JOIN products p ON c.product_id = p.id
+           LEFT JOIN users u ON p.seller_id = u.id
+           WHERE c.user_id = %s""",
+        (user_id,)
+    )
+    rows = cursor.fetchall()
+
+    items = []
+    messages = []
+    missing = 0
+    sold_out = False
+    clamped = False
+    for row in rows:
+        if row['live_product_id'] is None:
+            missing += 1
+        elif row['stock'] <= 0:
+            sold_out = True
+            messages.append((f'{row["name"]} is out of stock and removed from cart.', 'warning'))
+        else:
+            if row['stock'] < row['quantity']:
+                clamped = True
+                row['quantity'] = row['stock']
+                messages.append((f'Quantity adjusted for {row["name"]} due to limited stock.', 'info'))
+            row['subtotal'] = row['price'] * row['quantity']
+            items.append(row)
+
+    if missing:
+        messages.insert(0, (f'{missing} item(s) were removed from your cart because the products are no longer available.', 'warning'))
+
+    if missing or sold_out:
+        cursor.execute(
+            """DELETE c FROM cart c LEFT JOIN products p ON c.product_id = p.id
+               WHERE c.user_id = %s AND (p.id IS NULL OR p.stock <= 0)""",
+            (user_id,)
+        )
+    if clamped:
+        cursor.execute(
+            """UPDATE cart c JOIN products p ON c.product_id = p.id
+               SET c.quantity = p.stock
+               WHERE c.user_id = %s AND c.quantity > p.stock AND p.stock > 0""",
+            (user_id,)
+        )
+    if missing or sold_out or clamped:
+        conn.commit()
+    cursor.close()
+
+    return {
+        'items': items,
+        'total': sum(item['subtotal'] for item in items),
+        'messages': messages,
+    }
+
+
+# Cap on how many distinct products one bulk add may touch
+MAX_BULK_ITEMS = 100
+
+
+def add_item(conn, user_id, product_id, quantity):
+    """
+    Add `quantity` of a product to the cart in one atomic upsert, never going
+    above the product's stock. Returns False when nothing could be added
+    (missing product, out of stock, or the cart already holds all of it).
+    """
+    cursor = conn.cursor()
+    cursor.execute(
+        """INSERT INTO cart (user_id, product_id, quantity)
+           SELECT %s, p.id, LEAST(%s, p.stock) FROM products p WHERE p.id = %s AND p.stock > 0
+           ON DUPLICATE KEY UPDATE quantity = LEAST(cart.quantity + %s, p.stock)""",
+        (user_id, quantity, product_id, quantity)
+    )
+    added = cursor.rowcount > 0
+    conn.commit()
+    cursor.close()
+    return added
+
+
+def add_items(conn, user_id, items):
+    """
+    Add many (product_id, quantity) pairs in a single upsert statement.
+    Duplicate product ids are merged. Returns the number of cart rows that
+    were inserted or changed.
+    """
+    merged = {}
+    for product_id, quantity in items:
+        merged[product_id] = merged.get(product_id, 0) + quantity
+    if not merged:
+        return 0
+
+    rows_sql = ' UNION ALL '.join(['SELECT %s AS product_id, %s AS qty'] * len(merged))
+    params = [user_id]
+    for product_id, quantity in merged.items():
+        params.extend([product_id, quantity])
+
+    cursor = conn.cursor()
+    cursor.execute(
+        f"""INSERT INTO cart (user_id, product_id, quantity)
+            SELECT %s, p.id, LEAST(r.qty, p.stock)
+            FROM ({rows_sql}) r JOIN products p ON p.id = r.product_id
+            WHERE p.stock > 0
+            ON DUPLICATE KEY UPDATE quantity = LEAST(cart.quantity + r.qty, p.stock)""",
+        params
+    )
+    # MySQL reports 1 per inserted row and 2 per updated row
+    changed = cursor.rowcount
+    conn.commit()
+    cursor.close()
+    return changed
@@ -0,0 +1,204 @@
+"""
+MySQL connection pool for Campus Marketplace
+Keeps a bounded set of open connections so requests don't pay the
+TCP/auth handshake on every page hit
+"""
+
+import threading
+import time
+from collections import deque
+
+import mysql.connector
+from mysql.connector import errors
+
+
+class ConnectionPool:
+    """Thread-safe pool with a fixed core size plus temporary overflow connections"""
+
+    def __init__(self, db_config, size=5, max_overflow=10, idle_timeout=300, timeout=10):
+        self.db_config = dict(db_config)
+        self.size = size
+        self.max_overflow = max_overflow
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+
+        self._idle = deque()  # (connection, last_used) pairs, most recently used on the right
+        self._in_use = 0
+        self._cond = threading.Condition()
+        self._stats = {
+            'created': 0,
+            'reused': 0,
+            'discarded': 0,
+            'health_check_failures': 0,
+            'waits': 0,
+            'timeouts': 0,
+        }
+
+    def _open_count(self):
+        return len(self._idle) + self._in_use
+
+    def _expire_idle(self, now):
+        """Close connections that have been idle for longer than idle_timeout"""
+        expired = []
+        while self._idle and now - self._idle[0][1] > self.idle_timeout:
+            expired.append(self._idle.popleft()[0])
+        self._stats['discarded'] += len(expired)
+        return expired
+
+    def acquire(self):
+        """Borrow a healthy connection, opening one if the pool has room"""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._cond:
+                expired = self._expire_idle(time.monotonic())
+                while True:
+                    if self._idle:
+                        conn = self._idle.pop()[0]
+                        break
+                    if self._open_count() < self.size + self.max_overflow:
+                        conn = None
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise errors.PoolError("Timed out waiting for a database connection")
+                    self._stats['waits'] += 1
+                    self._cond.wait(remaining)
+                self._in_use += 1
+            for stale in expired:
+                _close_quietly(stale)
+
+            if conn is None:
+                try:
+                    conn = mysql.connector.connect(**self.db_config)
+                except Exception:
+                    self._forget()
+                    raise
+                with self._cond:
+                    self._stats['created'] += 1
+                return conn
+
+            # Health check on checkout: drop dead connections and try again
+            if _is_healthy(conn):
+                with self._cond:
+                    self._stats['reused'] += 1
+                return conn
+            _close_quietly(conn)
+            with self._cond:
+                self._stats['health_check_failures'] += 1
+                self._stats['discarded'] += 1
+            self._forget()
+
+    def release(self, conn):
+        """Return a borrowed connection; overflow connections are closed instead of kept"""
+        try:
+            if conn.unread_result:
+                conn.consume_results()
+            # Never hand the next borrower an open transaction or a stale snapshot
+            if conn.in_transaction:
+                conn.rollback()
+        except Exception:
+            self._forget()
+            _close_quietly(conn)
+            return
+
+        with self._cond:
+            self._in_use -= 1
+            if len(self._idle) < self.size:
+                self._idle.append((conn, time.monotonic()))
+                conn = None
+            else:
+                self._stats['discarded'] += 1
+            self._cond.notify()
+        if conn is not None:
+            _close_quietly(conn)
+
+    def _forget(self):
+        """Give up a slot whose connection was never opened or has been closed"""
+        with self._cond:
+            self._in_use -= 1
+            self._cond.notify()
+
+    def close_all(self):
+        """Close every idle connection (borrowed ones are closed when released)"""
+        with self._cond:
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+        for conn in idle:
+            _close_quietly(conn)
+
+    def stats(self):
+        with self._cond:
+            return dict(
+                self._stats,
+                size=self.size,
+                max_overflow=self.max_overflow,
+                idle=len(self._idle),
+                in_use=self._in_use,
+                overflow=max(0, self._open_count() - self.size),
+            )
+
+
+class PooledConnection:
+    """
+    Proxy handed to route code. Tracks the cursors it creates so they can be
+    closed when the connection goes back to the pool, and turns close() into
+    a return-to-pool instead of a real disconnect. `wrap_cursor`, if given,
+    wraps every cursor it hands out (e.g. to time queries).
+    """
+
+    def __init__(self, pool, conn, close_returns=True, wrap_cursor=None):
+        self._pool = pool
+        self._conn = conn
+        self._wrap_cursor = wrap_cursor
+        self._cursors = []
+        self._close_returns = close_returns
+        self._released = False
+        self.committed = False   # set once anything was committed through this connection
+
+    def cursor(self, *args, **kwargs):
+        cur = self._conn.cursor(*args, **kwargs)
+        if self._wrap_cursor is not None:
+            cur = self._wrap_cursor(cur)
+        self._cursors.append(cur)
+        return cur
+
+    def commit(self):
+        self._conn.commit()
+        self.committed = True
+
+    def close(self):
+        # Inside a request the connection stays borrowed until teardown so
+        # later get_db_connection() calls in the same request reuse it
+        if self._close_returns:
+            self.release()
+
+    def release(self):
+        if self._released:
+            return
+        self._released = True
+        for cur in self._cursors:
+            try:
+                cur.close()
+            except Exception:
+                pass
+        self._cursors = []
+        self._pool.release(self._conn)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def _is_healthy(conn):
+    try:
+        conn.ping(reconnect=False)
+        return True
+    except Exception:
+        return False
+
+
+def _close_quietly(conn):
+    try:
+        conn.close()
+    except Exception:
+        pass
@@ -0,0 +1,89 @@
+"""
+Gunicorn settings for Campus Marketplace
+
+    gunicorn -c gunicorn.conf.py
+
+The app is imported once in the master (preload_app) and forked into
+`workers` processes with `threads` request threads each. The master runs
+init_db() a single time before forking. Each worker drops the inherited
+connection pool and opens its own. `kill -HUP <master pid>` reloads
+gracefully: new workers are started and old ones finish their in-flight
+requests first. Because the app is preloaded, deploying new code needs
+USR2 (start a new master) or a full restart rather than HUP.
+
+The user-role cache, page cache and rate-limit buckets must be shared by
+all workers, so more than one worker needs a Redis CACHE_BACKEND; without
+one the master refuses to start. The stats reconciler and upload collector
+run in a single worker (see app.start_background_jobs).
+
+Every setting can be overridden from the environment, e.g.
+CACHE_BACKEND=redis://localhost:6379/0 WEB_CONCURRENCY=8 GUNICORN_THREADS=2 gunicorn -c gunicorn.conf.py
+"""
+
+import multiprocessing
+import os
+import time
+
+_config_loaded = time.perf_counter()
+
+wsgi_app = 'wsgi:application'
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+worker_class = 'gthread'
+preload_app = True
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 30
+keepalive = 5
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+
+_timings = {}
+
+
+def on_starting(server):
+    """Master only, once per run: create the schema before any worker exists"""
+    import app
+
+    if server.cfg.workers > 1 and not (app.cache_backend and app.cache_backend.shared):
+        # Each worker would keep its own caches: a demoted admin stays admin in the others for
+        # PRINCIPAL_CACHE_TTL, invalidated pages linger and rate limits multiply by the worker count
+        server.log.error(
+            "%d workers need a shared cache: set CACHE_BACKEND=redis://... or WEB_CONCURRENCY=1",
+            server.cfg.workers
+        )
+        raise SystemExit(1)
+
+    started = time.perf_counter()
+    app.init_db()
+    os.makedirs(app.app.config['UPLOAD_FOLDER'], exist_ok=True)
+    # Close the master's connections so forked workers don't inherit them
+    app.reset_db_pool()
+    _timings['init_db'] = time.perf_counter() - started
+
+
+def when_ready(server):
+    import wsgi
+
+    server.log.info(
+        "Ready in %.2fs (app import %.2fs, init_db %.2fs): %d workers x %d threads",
+        time.perf_counter() - _config_loaded, wsgi.IMPORT_SECONDS, _timings.get('init_db', 0),
+        server.cfg.workers, server.cfg.threads
+    )
+
+
+def on_reload(server):
+    server.log.info("SIGHUP: starting fresh workers, old ones stop after their current requests")
+
+
+def post_fork(server, worker):
+    import app
+
+    worker._forked_at = time.perf_counter()
+    app.reset_db_pool(close=False)
+
+
+def post_worker_init(worker):
+    import app
+
+    app.start_background_jobs()
+    worker.log.info("Worker %s booted in %.3fs", worker.pid, time.perf_counter() - worker._forked_at)
@@ -0,0 +1,202 @@
+"""
+Product image upload pipeline
+Uploads are streamed to a local staging folder under a content-hashed name
+and copied to the configured storage backend, then a background worker pool
+strips metadata and writes resized WebP/AVIF variants so listing pages can
+serve small images through srcset instead of the full original.
+Variant generation needs Pillow; without it the original is served as before.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:  # optional dependency
+    Image = None
+
+CHUNK_SIZE = 64 * 1024
+
+
+def save_upload(file_storage, folder, claim=None):
+    """
+    Stream an uploaded file to `folder` as <sha256 prefix>.<ext> and return
+    the filename. `claim(filename)` runs once the name is known and before an
+    existing file is reused (see storage.claim_blob).
+    """
+    ext = file_storage.filename.rsplit('.', 1)[1].lower()
+    os.makedirs(folder, exist_ok=True)
+    digest = hashlib.sha256()
+    tmp_path = os.path.join(folder, f".upload-{os.getpid()}-{threading.get_ident()}.tmp")
+    with open(tmp_path, 'wb') as out:
+        while True:
+            chunk = file_storage.stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            out.write(chunk)
+
+    filename = f"{digest.hexdigest()[:32]}.{ext}"
+    path = os.path.join(folder, filename)
+    if claim is not None:
+        claim(filename)
+    if os.path.exists(path):
+        # Same bytes were uploaded before, reuse that file
+        os.remove(tmp_path)
+    else:
+        os.replace(tmp_path, path)
+    return filename
+
+
+def _manifest_name(filename):
+    return filename.rsplit('.', 1)[0] + '.json'
+
+
+class ImagePipeline:
+    def __init__(self, storage, staging_folder, widths=(320, 640, 1024), max_workers=2, quality=80, claim=None):
+        self.storage = storage
+        self.claim = claim
+        self.staging_folder = staging_folder
+        self.widths = tuple(sorted(widths))
+        self.max_workers = max_workers
+        self.quality = quality
+        self._executor = None
+        self._lock = threading.Lock()
+        self._manifests = {}  # filename -> (manifest or None, checked_at)
+
+    @property
+    def enabled(self):
+        return Image is not None
+
+    def _get_executor(self):
+        # Created lazily so forked server workers each get their own threads
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='image-worker')
+            return self._executor
+
+    def store_upload(self, file_storage):
+        """Save an upload into storage and return its content-hashed name"""
+        filename = save_upload(file_storage, self.staging_folder, claim=self.claim)
+        local_path = os.path.join(self.staging_folder, filename)
+        if not self.storage.is_local and not self.storage.exists(filename):
+            self.storage.put_file(local_path, filename)
+        if not self.enabled:
+            self._discard_staging(filename)
+        return filename
+
+    def submit(self, filename):
+        """Queue variant generation for an uploaded image"""
+        if not self.enabled or not filename:
+            return None
+        return self._get_executor().submit(self._process_safely, filename)
+
+    def _process_safely(self, filename):
+        try:
+            self.process(filename)
+        except Exception as e:
+            print(f"Error processing image {filename}: {e}")
+        finally:
+            self._discard_staging(filename)
+
+    def _discard_staging(self, filename):
+        if not self.storage.is_local:
+            try:
+                os.remove(os.path.join(self.staging_folder, filename))
+            except FileNotFoundError:
+                pass
+
+    def process(self, filename):
+        """Strip metadata from the original and write the resized variants plus a manifest"""
+        if self.storage.exists(_manifest_name(filename)):
+            return  # identical upload, already processed
+        path = os.path.join(self.staging_folder, filename)
+        stem = filename.rsplit('.', 1)[0]
+        formats = ['webp'] + (['avif'] if features.check('avif') else [])
+
+        with Image.open(path) as original:
+            animated = getattr(original, 'is_animated', False)
+            image = ImageOps.exif_transpose(original)
+            original_format = original.format
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+
+        if animated:
+            # Re-encoding or resizing keeps only the first frame, so animations are served as uploaded
+            formats = []
+        else:
+            # Re-encoding without passing exif/icc drops camera and GPS metadata
+            clean_path = path + '.tmp'
+            if original_format == 'JPEG':
+                image.convert('RGB').save(clean_path, 'JPEG', quality=90, optimize=True)
+            else:
+                image.save(clean_path, original_format)
+            os.replace(clean_path, path)
+        self.storage.put_file(path, filename)
+
+        manifest = {'width': image.width, 'variants': {fmt: {} for fmt in formats}}
+        # Never upscale: widths above the original collapse into one full-size variant
+        targets = sorted({min(width, image.width) for width in self.widths}) if formats else []
+        for width in targets:
+            height = max(1, round(image.height * width / image.width))
+            resized = image.resize((width, height), Image.LANCZOS)
+            for fmt in formats:
+                variant = f"{stem}-{width}.{fmt}"
+                variant_path = os.path.join(self.staging_folder, variant)
+                resized.save(variant_path, fmt.upper(), quality=self.quality)
+                self.storage.put_file(variant_path, variant)
+                if not self.storage.is_local:
+                    os.remove(variant_path)
+                manifest['variants'][fmt][width] = variant
+
+        # Manifest is written last so its presence means every variant is ready
+        manifest_path = os.path.join(self.staging_folder, _manifest_name(filename))
+        with open(manifest_path + '.tmp', 'w') as f:
+            json.dump(manifest, f)
+        os.replace(manifest_path + '.tmp', manifest_path)
+        self.storage.put_file(manifest_path, _manifest_name(filename))
+        if not self.storage.is_local:
+            os.remove(manifest_path)
+        with self._lock:
+            self._manifests.pop(filename, None)
+
+    def manifest(self, filename, negative_ttl=30):
+        """Variant manifest for an image, or None if it hasn't been processed (yet)"""
+        now = time.monotonic()
+        with self._lock:
+            cached = self._manifests.get(filename)
+        if cached and (cached[0] is not None or now - cached[1] < negative_ttl):
+            return cached[0]
+
+        try:
+            raw = self.storage.read(_manifest_name(filename))
+            manifest = json.loads(raw) if raw else None
+        except ValueError:
+            manifest = None
+        with self._lock:
+            self._manifests[filename] = (manifest, now)
+        return manifest
+
+    def srcset(self, filename, fmt):
+        """srcset attribute value for one format, e.g. 'a-320.webp 320w, a-640.webp 640w'"""
+        manifest = self.manifest(filename)
+        if not manifest or fmt not in manifest['variants']:
+            return ''
+        return ', '.join(f"{self.storage.url(name)} {width}w"
+                         for width, name in sorted(manifest['variants'][fmt].items(), key=lambda item: int(item[0])))
+
+    def delete_image(self, filename):
+        """Remove an image and everything derived from it from storage"""
+        manifest = self.manifest(filename, negative_ttl=0)
+        if manifest:
+            for variants in manifest['variants'].values():
+                for name in variants.values():
+                    self.storage.delete(name)
+            self.storage.delete(_manifest_name(filename))
+        self.storage.delete(filename)
+        with self._lock:
+            self._manifests.pop(filename, None)
@@ -0,0 +1,310 @@
+"""
+Query instrumentation for Campus Marketplace
+Times every statement run through a pooled connection's cursors and keeps
+per-request totals: query count, database time, the slowest statements
+(normalized, so `WHERE id = 7` and `WHERE id = 9` group together) and
+statements repeated often enough to look like an N+1 loop. Each response gets
+a Server-Timing header, debug mode adds a query panel to HTML pages, and
+/metrics serves process-wide counters in the Prometheus text format.
+
+Counters are per process: scrape every worker (or run one) when serving with
+several gunicorn workers.
+"""
+
+import hmac
+import re
+import threading
+import time
+from bisect import bisect_left
+from functools import lru_cache
+
+from flask import g, has_app_context, has_request_context, render_template, request
+
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+# Statements kept in the process-wide slowest list
+TOP_STATEMENTS = 50
+
+_STRING = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"")
+_NUMBER = re.compile(r'(?<![\w.])-?\d+(?:\.\d+)?\b')
+_PLACEHOLDER_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_VALUES_LIST = re.compile(r'(VALUES\s*\([^()]*\))(?:\s*,\s*\([^()]*\))+', re.IGNORECASE)
+
+
+@lru_cache(maxsize=2048)
+def normalize_sql(sql):
+    """Replace literals and placeholders with ? and collapse lists, so one query shape is one key"""
+    if isinstance(sql, bytes):
+        sql = sql.decode('utf-8', 'replace')
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = _PLACEHOLDER_LIST.sub('(?+)', sql)
+    sql = _VALUES_LIST.sub(r'\1, ...', sql)
+    return ' '.join(sql.split())
+
+
+class RequestQueries:
+    """Queries run while handling one request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = {}   # normalized sql -> [count, total seconds, max seconds]
+
+    def add(self, sql, seconds):
+        self.count += 1
+        self.seconds += seconds
+        entry = self.statements.get(sql)
+        if entry is None:
+            self.statements[sql] = [1, seconds, seconds]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+
+    def repeated(self, threshold):
+        """Statements run at least `threshold` times: likely a query inside a loop"""
+        return {sql: entry[0] for sql, entry in self.statements.items() if entry[0] >= threshold}
+
+    def slowest(self, limit=10):
+        rows = sorted(self.statements.items(), key=lambda item: item[1][1], reverse=True)[:limit]
+        return [{'sql': sql, 'count': e[0], 'total_ms': e[1] * 1000, 'max_ms': e[2] * 1000} for sql, e in rows]
+
+
+class Metrics:
+    """Process-wide counters and histograms, rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}        # (endpoint, method, status) -> count
+        self.durations = {}       # endpoint -> [bucket counts..., sum, count]
+        self.query_counts = {}    # endpoint -> [bucket counts..., sum, count]
+        self.db_seconds = {}      # endpoint -> seconds
+        self.n_plus_one = {}      # endpoint -> requests flagged
+        self.slow_queries = 0
+        self.statements = {}      # normalized sql -> [count, total seconds, max seconds]
+
+    @staticmethod
+    def _observe(histograms, key, buckets, value):
+        hist = histograms.get(key)
+        if hist is None:
+            hist = histograms[key] = [0] * (len(buckets) + 2)
+        index = bisect_left(buckets, value)
+        if index < len(buckets):
+            hist[index] += 1
+        hist[-2] += value
+        hist[-1] += 1
+
+    def record_query(self, sql, seconds, slow):
+        with self._lock:
+            if slow:
+                self.slow_queries += 1
+            entry = self.statements.get(sql)
+            if entry is None:
+                if len(self.statements) >= TOP_STATEMENTS * 4:
+                    self._trim_statements()
+                self.statements[sql] = [1, seconds, seconds]
+            else:
+                entry[0] += 1
+                entry[1] += seconds
+                entry[2] = max(entry[2], seconds)
+
+    def _trim_statements(self):
+        """Keep the statements with the most total time so memory stays bounded"""
+        keep = sorted(self.statements.items(), key=lambda item: item[1][1], reverse=True)[:TOP_STATEMENTS]
+        self.statements = dict(keep)
+
+    def record_request(self, endpoint, method, status, seconds, queries, flagged):
+        with self._lock:
+            key = (endpoint, method, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            self._observe(self.durations, endpoint, REQUEST_BUCKETS, seconds)
+            self._observe(self.query_counts, endpoint, QUERY_COUNT_BUCKETS, queries.count)
+            self.db_seconds[endpoint] = self.db_seconds.get(endpoint, 0.0) + queries.seconds
+            if flagged:
+                self.n_plus_one[endpoint] = self.n_plus_one.get(endpoint, 0) + 1
+
+    def slowest(self, limit=20):
+        with self._lock:
+            rows = sorted(self.statements.items(), key=lambda item: item[1][1], reverse=True)[:limit]
+        return [{'sql': sql, 'count': e[0], 'total_ms': round(e[1] * 1000, 2),
+                 'avg_ms': round(e[1] * 1000 / e[0], 2), 'max_ms': round(e[2] * 1000, 2)}
+                for sql, e in rows]
+
+    def render(self, gauges=None):
+        lines = []
+
+        def header(name, kind, text):
+            lines.append(f"# HELP {name} {text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        def histogram(name, text, data, buckets):
+            header(name, 'histogram', text)
+            for endpoint, hist in sorted(data.items()):
+                cumulative = 0
+                for bound, count in zip(buckets, hist):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{endpoint="{_label(endpoint)}",le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{endpoint="{_label(endpoint)}",le="+Inf"}} {hist[-1]}')
+                lines.append(f'{name}_sum{{endpoint="{_label(endpoint)}"}} {hist[-2]:.6f}')
+                lines.append(f'{name}_count{{endpoint="{_label(endpoint)}"}} {hist[-1]}')
+
+        with self._lock:
+            header('campus_http_requests_total', 'counter', 'Requests handled')
+            for (endpoint, method, status), count in sorted(self.requests.items()):
+                lines.append(f'campus_http_requests_total{{endpoint="{_label(endpoint)}",'
+                             f'method="{method}",status="{status}"}} {count}')
+            histogram('campus_http_request_duration_seconds', 'Time to build a response',
+                      self.durations, REQUEST_BUCKETS)
+            histogram('campus_db_queries_per_request', 'Database queries issued per request',
+                      self.query_counts, QUERY_COUNT_BUCKETS)
+            header('campus_db_query_seconds_total', 'counter', 'Time spent in database queries')
+            for endpoint, seconds in sorted(self.db_seconds.items()):
+                lines.append(f'campus_db_query_seconds_total{{endpoint="{_label(endpoint)}"}} {seconds:.6f}')
+            header('campus_db_n_plus_one_requests_total', 'counter', 'Requests that repeated one query shape')
+            for endpoint, count in sorted(self.n_plus_one.items()):
+                lines.append(f'campus_db_n_plus_one_requests_total{{endpoint="{_label(endpoint)}"}} {count}')
+            header('campus_db_slow_queries_total', 'counter', 'Queries slower than SLOW_QUERY_MS')
+            lines.append(f'campus_db_slow_queries_total {self.slow_queries}')
+
+        for name, value in sorted((gauges or {}).items()):
+            header(f'campus_{name}', 'gauge', name.replace('_', ' '))
+            lines.append(f'campus_{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+metrics = Metrics()
+_settings = {'slow_seconds': 0.2}
+
+
+def current_queries():
+    """The RequestQueries for this request, or None outside one"""
+    if not has_app_context():
+        return None
+    queries = g.get('queries')
+    if queries is None:
+        queries = g.queries = RequestQueries()
+    return queries
+
+
+def record(sql, seconds):
+    """Count one executed statement against the current request and the process totals"""
+    normalized = normalize_sql(sql)
+    slow = seconds >= _settings['slow_seconds']
+    queries = current_queries()
+    if queries is not None:
+        queries.add(normalized, seconds)
+    metrics.record_query(normalized, seconds, slow)
+    if slow:
+        endpoint = request.endpoint if has_request_context() else 'background'
+        print(f"Slow query ({seconds * 1000:.1f} ms) in {endpoint}: {normalized}")
+
+
+class InstrumentedCursor:
+    """Cursor proxy that times execute() and executemany()"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, operation, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._cursor.execute(operation, *args, **kwargs)
+        finally:
+            record(operation, time.perf_counter() - started)
+
+    def executemany(self, operation, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._cursor.executemany(operation, *args, **kwargs)
+        finally:
+            record(operation, time.perf_counter() - started)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+def init_app(app, pool_stats=None, gauges=None):
+    """
+    Install the request hooks and /metrics. `pool_stats` returns the connection
+    pool's counters; `gauges` maps a metric prefix to another function returning
+    counters to export.
+    """
+    sources = dict(gauges or {})
+    if pool_stats:
+        sources['db_pool'] = pool_stats
+    app.config.setdefault('SLOW_QUERY_MS', 200)
+    app.config.setdefault('N_PLUS_ONE_THRESHOLD', 5)
+    app.config.setdefault('QUERY_DEBUG_PANEL', None)
+    app.config.setdefault('METRICS_ALLOWED_IPS', ('127.0.0.1', '::1'))
+    app.config.setdefault('METRICS_TOKEN', None)
+    _settings['slow_seconds'] = app.config['SLOW_QUERY_MS'] / 1000
+
+    @app.before_request
+    def start_request_queries():
+        g.queries = RequestQueries()
+
+    @app.after_request
+    def report_request_queries(response):
+        queries = current_queries()
+        elapsed = time.perf_counter() - queries.started
+        endpoint = request.endpoint or 'unmatched'
+
+        repeated = queries.repeated(app.config['N_PLUS_ONE_THRESHOLD'])
+        for sql, count in repeated.items():
+            print(f"Possible N+1 in {endpoint}: {count} x {sql}")
+        metrics.record_request(endpoint, request.method, response.status_code, elapsed, queries, bool(repeated))
+
+        response.headers.add('Server-Timing', f'db;dur={queries.seconds * 1000:.1f};desc="{queries.count} queries"')
+        response.headers.add('Server-Timing', f'app;dur={elapsed * 1000:.1f}')
+
+        show_panel = app.config['QUERY_DEBUG_PANEL']
+        if show_panel is None:
+            show_panel = app.debug
+        if (show_panel and response.mimetype == 'text/html' and not response.direct_passthrough
+                and not response.is_streamed):
+            _inject_panel(response, queries, elapsed, repeated)
+        return response
+
+    @app.route('/metrics')
+    def metrics_endpoint():
+        if not _metrics_allowed(app.config['METRICS_TOKEN'], app.config['METRICS_ALLOWED_IPS']):
+            return 'Forbidden\n', 403, {'Content-Type': 'text/plain'}
+        values = {f'{prefix}_{k}': v for prefix, source in sources.items() for k, v in source().items()}
+        return metrics.render(values), 200, {'Content-Type': 'text/plain; version=0.0.4'}
+
+
+def _metrics_allowed(token, allowed_ips):
+    """
+    With a token, scrapers must send it as a bearer token. Otherwise the
+    client address must be allowed, and a proxied request only counts when
+    ProxyFix has replaced the proxy's address with the client's.
+    """
+    if token:
+        supplied = request.headers.get('Authorization', '')
+        return hmac.compare_digest(supplied.encode(), f'Bearer {token}'.encode())
+    if allowed_ips is None:
+        return True
+    proxied = 'X-Forwarded-For' in request.headers or 'Forwarded' in request.headers
+    if proxied and 'werkzeug.proxy_fix.orig' not in request.environ:
+        return False
+    return request.remote_addr in allowed_ips
+
+
+def _inject_panel(response, queries, elapsed, repeated):
+    body = response.get_data(as_text=True)
+    index = body.rfind('</body>')
+    if index == -1:
+        return
+    panel = render_template('_query_panel.html', queries=queries, elapsed_ms=elapsed * 1000,
+                            statements=queries.slowest(), repeated=repeated)
+    response.set_data(body[:index] + panel + body[index:])
@@ -0,0 +1,363 @@
+"""
+Versioned schema migrations for Campus Marketplace
+
+    python migrations.py status           # current and latest version
+    python migrations.py plan             # what `migrate` would run
+    python migrations.py migrate          # apply pending migrations
+    python migrations.py migrate --dry-run
+
+Each migration has a number, a description and a list of steps: SQL strings
+or Python functions taking a connection. Applied versions are recorded in
+schema_migrations, so an up-to-date database costs a single primary-key read
+at startup. Index steps are written as online ALTERs (ALGORITHM=INPLACE,
+LOCK=NONE) so they don't block reads or writes on a live table. Steps are
+idempotent: re-running one against a database created by an older init_db()
+skips tables and indexes that already exist. Never edit a migration that has
+shipped; add a new one instead.
+"""
+
+import argparse
+import time
+
+from mysql.connector import Error
+from werkzeug.security import generate_password_hash
+
+import stats
+from ratings import rebuild_ratings
+
+# Table exists, duplicate index name: the step was already applied by hand or an older init_db()
+ALREADY_APPLIED_ERRORS = (1050, 1061)
+# The server can't do this ALTER in place without locking
+ONLINE_DDL_UNSUPPORTED = (1845, 1846)
+LOCK_NAME = 'campus_marketplace_migrations'
+
+
+def online_index(table, name, columns, kind='INDEX'):
+    """ALTER adding an index without blocking concurrent reads or writes"""
+    # InnoDB can only build a FULLTEXT index while blocking writes
+    lock = 'SHARED' if kind == 'FULLTEXT' else 'NONE'
+    return f"ALTER TABLE {table} ADD {kind} {name} ({columns}), ALGORITHM=INPLACE, LOCK={lock}"
+
+
+def create_admin_user(conn):
+    """Create the default admin account (admin@campus.com / admin123) if it doesn't exist"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT id FROM users WHERE email = 'admin@campus.com'")
+    if not cursor.fetchone():
+        cursor.execute(
+            "INSERT INTO users (name, email, password, role) VALUES (%s, %s, %s, 'admin')",
+            ('Admin User', 'admin@campus.com', generate_password_hash('admin123'))
+        )
+        conn.commit()
+        print("Admin user created: admin@campus.com / admin123")
+    cursor.close()
+
+
+def backfill_ratings(conn):
+    """Compute product_ratings from existing feedbacks"""
+    rebuild_ratings(conn)
+
+
+def seed_stats(conn):
+    """Compute the dashboard counters from the live tables"""
+    stats.reconcile(conn)
+
+
+MIGRATIONS = [
+    (1, 'Base tables', [
+        """CREATE TABLE IF NOT EXISTS users (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            email VARCHAR(100) UNIQUE NOT NULL,
+            password VARCHAR(255) NOT NULL,
+            phone VARCHAR(20),
+            address TEXT,
+            role ENUM('user', 'admin') DEFAULT 'user',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        )""",
+        """CREATE TABLE IF NOT EXISTS products (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(200) NOT NULL,
+            description TEXT,
+            price DECIMAL(10, 2) NOT NULL,
+            category VARCHAR(50),
+            stock INT DEFAULT 0,
+            image VARCHAR(255) DEFAULT 'default-product.jpg',
+            seller_id INT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            FOREIGN KEY (seller_id) REFERENCES users(id) ON DELETE CASCADE
+        )""",
+        """CREATE TABLE IF NOT EXISTS cart (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            product_id INT NOT NULL,
+            quantity INT DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+            FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE,
+            UNIQUE KEY unique_cart_item (user_id, product_id)
+        )""",
+        """CREATE TABLE IF NOT EXISTS orders (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            total_amount DECIMAL(10, 2) NOT NULL,
+            payment_method VARCHAR(50),
+            shipping_address TEXT,
+            status ENUM('pending', 'processing', 'shipped', 'completed', 'cancelled') DEFAULT 'pending',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        )""",
+        """CREATE TABLE IF NOT EXISTS order_items (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            order_id INT NOT NULL,
+            product_id INT NOT NULL,
+            quantity INT NOT NULL,
+            price DECIMAL(10, 2) NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (order_id) REFERENCES orders(id) ON DELETE CASCADE,
+            FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE
+        )""",
+        """CREATE TABLE IF NOT EXISTS feedbacks (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            product_id INT NOT NULL,
+            rating INT DEFAULT 5,
+            comment TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+            FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE,
+            CHECK (rating >= 1 AND rating <= 5)
+        )""",
+        """CREATE TABLE IF NOT EXISTS general_feedback (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT,
+            name VARCHAR(100) NOT NULL,
+            email VARCHAR(100) NOT NULL,
+            subject VARCHAR(200),
+            message TEXT NOT NULL,
+            rating INT DEFAULT 5,
+            status ENUM('new', 'read', 'replied') DEFAULT 'new',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE SET NULL,
+            CHECK (rating >= 1 AND rating <= 5)
+        )""",
+        """CREATE TABLE IF NOT EXISTS contact_messages (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT,
+            name VARCHAR(100) NOT NULL,
+            email VARCHAR(100) NOT NULL,
+            phone VARCHAR(20),
+            subject VARCHAR(200) NOT NULL,
+            message TEXT NOT NULL,
+            status ENUM('new', 'read', 'replied') DEFAULT 'new',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE SET NULL
+        )""",
+    ]),
+    (2, 'Default admin account', [create_admin_user]),
+    (3, 'Catalog listing and search indexes', [
+        # Keyset pagination on (created_at, id), optionally filtered by category
+        online_index('products', 'idx_products_created', 'created_at, id'),
+        online_index('products', 'idx_products_category_created', 'category, created_at, id'),
+        # Prefix lookups on name and ranked full-text matching
+        online_index('products', 'idx_products_name', 'name'),
+        online_index('products', 'ft_products_search', 'name, description', kind='FULLTEXT'),
+    ]),
+    (4, 'Review and dashboard indexes', [
+        # Paged reviews on the product page
+        online_index('feedbacks', 'idx_feedbacks_product_created', 'product_id, created_at, id'),
+        # "Recent activity" lists on the admin dashboard
+        online_index('orders', 'idx_orders_created', 'created_at'),
+        online_index('feedbacks', 'idx_feedbacks_created', 'created_at'),
+        online_index('general_feedback', 'idx_general_feedback_created', 'created_at'),
+        online_index('contact_messages', 'idx_contact_messages_created', 'created_at'),
+    ]),
+    (5, 'Product rating aggregates', [
+        """CREATE TABLE IF NOT EXISTS product_ratings (
+            product_id INT PRIMARY KEY,
+            rating_count INT NOT NULL DEFAULT 0,
+            rating_sum INT NOT NULL DEFAULT 0,
+            r1 INT NOT NULL DEFAULT 0,
+            r2 INT NOT NULL DEFAULT 0,
+            r3 INT NOT NULL DEFAULT 0,
+            r4 INT NOT NULL DEFAULT 0,
+            r5 INT NOT NULL DEFAULT 0,
+            FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE
+        )""",
+        backfill_ratings,
+    ]),
+    (6, 'Dashboard counters', [
+        """CREATE TABLE IF NOT EXISTS site_stats (
+            name VARCHAR(50) PRIMARY KEY,
+            value DECIMAL(14, 2) NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        )""",
+        seed_stats,
+    ]),
+    (7, 'Upload reference counts', [
+        """CREATE TABLE IF NOT EXISTS blobs (
+            name VARCHAR(255) PRIMARY KEY,
+            ref_count INT NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            INDEX idx_blobs_unreferenced (ref_count, updated_at)
+        )""",
+        online_index('products', 'idx_products_image', 'image'),
+    ]),
+    (8, 'Admin list filter and sort indexes', [
+        # Each admin list filters on one column and pages on (sort column, id), see admin_tables.py
+        online_index('users', 'idx_users_created', 'created_at, id'),
+        online_index('users', 'idx_users_name', 'name, id'),
+        online_index('users', 'idx_users_role_created', 'role, created_at, id'),
+        online_index('orders', 'idx_orders_status_created', 'status, created_at, id'),
+        online_index('orders', 'idx_orders_user_created', 'user_id, created_at, id'),
+        online_index('orders', 'idx_orders_total', 'total_amount, id'),
+        online_index('feedbacks', 'idx_feedbacks_rating_created', 'rating, created_at, id'),
+        online_index('feedbacks', 'idx_feedbacks_user_created', 'user_id, created_at, id'),
+        online_index('general_feedback', 'idx_general_feedback_status_created', 'status, created_at, id'),
+        online_index('general_feedback', 'idx_general_feedback_rating_created', 'rating, created_at, id'),
+        online_index('contact_messages', 'idx_contact_messages_status_created', 'status, created_at, id'),
+    ]),
+    (9, 'Status change history', [
+        """CREATE TABLE IF NOT EXISTS status_history (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            entity ENUM('order', 'feedback', 'contact') NOT NULL,
+            entity_id INT NOT NULL,
+            old_status ENUM('pending', 'processing', 'shipped', 'completed', 'cancelled', 'new', 'read', 'replied'),
+            new_status ENUM('pending', 'processing', 'shipped', 'completed', 'cancelled', 'new', 'read', 'replied') NOT NULL,
+            changed_by INT,
+            changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            INDEX idx_status_history_entity (entity, entity_id, changed_at)
+        )""",
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(conn):
+    """Highest applied migration, 0 for a database that has never been migrated"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT MAX(version) FROM schema_migrations")
+        row = cursor.fetchone()
+    except Error as e:
+        # 1146 = table doesn't exist
+        if e.errno != 1146:
+            raise
+        row = None
+    finally:
+        cursor.close()
+    return (row[0] or 0) if row else 0
+
+
+def pending_migrations(conn):
+    version = current_version(conn)
+    return [m for m in MIGRATIONS if m[0] > version]
+
+
+def describe_step(step):
+    if callable(step):
+        return f"-- python: {step.__name__}: {step.__doc__}"
+    return ' '.join(step.split()) + ';'
+
+
+def plan(conn):
+    """Lines describing every pending step, without running anything"""
+    lines = []
+    for version, description, steps in pending_migrations(conn):
+        lines.append(f"-- {version:03d} {description}")
+        lines.extend(describe_step(step) for step in steps)
+    return lines
+
+
+def _run_step(conn, step):
+    if callable(step):
+        step(conn)
+        return
+    cursor = conn.cursor()
+    try:
+        cursor.execute(step)
+    except Error as e:
+        if e.errno in ALREADY_APPLIED_ERRORS:
+            pass
+        elif e.errno in ONLINE_DDL_UNSUPPORTED and 'ALGORITHM=INPLACE' in step:
+            print(f"Online DDL not supported here ({e.msg}), running with the default algorithm")
+            cursor.execute(step.split(', ALGORITHM=')[0])
+        else:
+            raise
+    finally:
+        cursor.close()
+
+
+def migrate(conn, dry_run=False):
+    """Apply pending migrations in order; returns the versions applied (or that would be)"""
+    if dry_run:
+        for line in plan(conn):
+            print(line)
+        return [m[0] for m in pending_migrations(conn)]
+
+    cursor = conn.cursor()
+    cursor.execute(
+        """CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            description VARCHAR(200) NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            duration_ms INT NOT NULL DEFAULT 0
+        )"""
+    )
+    # Only one process migrates at a time; the others wait, then find nothing pending
+    cursor.execute("SELECT GET_LOCK(%s, 300)", (LOCK_NAME,))
+    if cursor.fetchone()[0] != 1:
+        cursor.close()
+        raise RuntimeError("Timed out waiting for another process to finish migrating")
+
+    applied = []
+    try:
+        for version, description, steps in pending_migrations(conn):
+            print(f"Applying migration {version:03d}: {description}")
+            started = time.perf_counter()
+            for step in steps:
+                _run_step(conn, step)
+            # DDL commits implicitly in MySQL, so the version row is written once every step succeeded
+            cursor.execute(
+                "INSERT INTO schema_migrations (version, description, duration_ms) VALUES (%s, %s, %s)",
+                (version, description, int((time.perf_counter() - started) * 1000))
+            )
+            conn.commit()
+            applied.append(version)
+    finally:
+        cursor.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+        cursor.fetchall()
+        cursor.close()
+    return applied
+
+
+def main():
+    from app import get_db_connection, init_db
+
+    parser = argparse.ArgumentParser(description='Campus Marketplace schema migrations')
+    parser.add_argument('command', choices=['status', 'plan', 'migrate'])
+    parser.add_argument('--dry-run', action='store_true', help='print the pending steps instead of running them')
+    args = parser.parse_args()
+
+    if args.command == 'migrate' and not args.dry_run:
+        init_db()
+        return
+
+    conn = get_db_connection()
+    if not conn:
+        raise SystemExit("Could not connect to the database")
+    if args.command == 'status':
+        print(f"Schema version {current_version(conn)} of {LATEST_VERSION}")
+    else:
+        lines = plan(conn)
+        print('\n'.join(lines) if lines else 'Schema is up to date')
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
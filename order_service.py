@@ -0,0 +1,130 @@
+"""
+Order placement for Campus Marketplace
+Checkout runs as one transaction: lock the products being bought in id order,
+decrement stock with a single guarded UPDATE and write all order items at once
+"""
+
+import random
+import time
+
+from mysql.connector import Error
+
+import stats
+
+# InnoDB deadlock / lock wait timeout: safe to retry the whole transaction
+RETRYABLE_ERRORS = (1213, 1205)
+
+
+class StockChanged(Exception):
+    """Raised when the guarded stock decrement did not cover every item"""
+
+
+def place_order(conn, user_id, payment_method, address, max_retries=3):
+    """
+    Turn the user's cart into an order. Returns a dict with `order_id` (None
+    when nothing was ordered), the `product_ids` whose stock changed and
+    `messages`, a list of (text, category) pairs for the caller to flash.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return _place_order_once(conn, user_id, payment_method, address)
+        except (Error, StockChanged) as e:
+            conn.rollback()
+            retryable = isinstance(e, StockChanged) or getattr(e, 'errno', None) in RETRYABLE_ERRORS
+            if not retryable or attempt == max_retries:
+                raise
+            # Small jittered backoff so competing checkouts don't collide again
+            time.sleep(random.uniform(0.01, 0.05) * (attempt + 1))
+
+
+def _place_order_once(conn, user_id, payment_method, address):
+    messages = []
+    if conn.in_transaction:
+        # End the implicit read transaction left by earlier queries in this request
+        conn.commit()
+    conn.start_transaction()
+    cursor = conn.cursor(dictionary=True)
+
+    # Lock the cart first so a double-submitted checkout waits for this one
+    cursor.execute(
+        "SELECT id, product_id, quantity FROM cart WHERE user_id = %s ORDER BY product_id FOR UPDATE",
+        (user_id,)
+    )
+    cart_rows = cursor.fetchall()
+    if not cart_rows:
+        conn.rollback()
+        cursor.close()
+        return {'order_id': None, 'messages': [('Your cart is empty', 'warning')]}
+
+    # Lock every product row in ascending id order so concurrent checkouts can't deadlock on each other
+    product_ids = sorted({row['product_id'] for row in cart_rows})
+    placeholders = ', '.join(['%s'] * len(product_ids))
+    cursor.execute(
+        f"SELECT id, name, price, stock FROM products WHERE id IN ({placeholders}) ORDER BY id FOR UPDATE",
+        product_ids
+    )
+    products = {row['id']: row for row in cursor.fetchall()}
+
+    missing = [row for row in cart_rows if row['product_id'] not in products]
+    if missing:
+        messages.append((f'{len(missing)} item(s) were removed from your cart because the products are no longer available.', 'warning'))
+
+    items = []
+    for row in cart_rows:
+        product = products.get(row['product_id'])
+        if product is None:
+            continue
+        quantity = row['quantity']
+        if product['stock'] <= 0:
+            messages.append((f'{product["name"]} is out of stock and removed from cart.', 'warning'))
+            continue
+        if product['stock'] < quantity:
+            messages.append((f'Only {product["stock"]} units available for {product["name"]}. Quantity adjusted.', 'warning'))
+            quantity = product['stock']
+        items.append({'product_id': product['id'], 'quantity': quantity, 'price': product['price']})
+
+    if not items:
+        # Nothing orderable: drop the dead rows and keep the rest of the cart as is
+        cursor.execute(
+            """DELETE c FROM cart c LEFT JOIN products p ON c.product_id = p.id
+               WHERE c.user_id = %s AND (p.id IS NULL OR p.stock <= 0)""",
+            (user_id,)
+        )
+        conn.commit()
+        cursor.close()
+        messages.append(('No valid items in cart after validation', 'warning'))
+        return {'order_id': None, 'messages': messages}
+
+    # One conditional decrement for all items; the stock guard makes overselling impossible
+    case_sql = 'CASE id ' + ' '.join(['WHEN %s THEN %s'] * len(items)) + ' END'
+    case_params = [v for item in items for v in (item['product_id'], item['quantity'])]
+    item_ids = [item['product_id'] for item in items]
+    id_placeholders = ', '.join(['%s'] * len(items))
+    cursor.execute(
+        f"UPDATE products SET stock = stock - {case_sql} WHERE id IN ({id_placeholders}) AND stock >= {case_sql}",
+        case_params + item_ids + case_params
+    )
+    if cursor.rowcount != len(items):
+        cursor.close()
+        raise StockChanged()
+
+    total = sum(item['price'] * item['quantity'] for item in items)
+    cursor.execute(
+        "INSERT INTO orders (user_id, total_amount, payment_method, shipping_address, status) VALUES (%s, %s, %s, %s, 'pending')",
+        (user_id, total, payment_method, address)
+    )
+    order_id = cursor.lastrowid
+    stats.bump(cursor, total_orders=1)
+
+    # executemany batches this into a single multi-row INSERT
+    cursor.executemany(
+        "INSERT INTO order_items (order_id, product_id, quantity, price) VALUES (%s, %s, %s, %s)",
+        [(order_id, item['product_id'], item['quantity'], item['price']) for item in items]
+    )
+
+    cursor.execute("DELETE FROM cart WHERE user_id = %s", (user_id,))
+    conn.commit()
+    cursor.close()
+
+    messages.append(('Order placed successfully!', 'success'))
+    return {'order_id': order_id, 'product_ids': item_ids, 'messages': messages}
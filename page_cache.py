@@ -0,0 +1,149 @@
+"""
+Rendered-page cache for Campus Marketplace
+Caches full GET responses per URL and viewer, serves ETag/Last-Modified so
+browsers can revalidate with a 304, and invalidates by bumping a generation
+number per namespace (e.g. "home" or "product:12") whenever the data behind
+those pages is written
+"""
+
+import hashlib
+import math
+import threading
+import time
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import Response, g, make_response, request, session
+
+from cache import TTLCache
+
+
+class PageCache:
+    """
+    `settle_seconds` is how long after an invalidation pages of that
+    namespace are rendered without being cached, so a read replica that
+    hasn't caught up with the write yet can't get its stale page cached for
+    the whole ttl (set it to DB_REPLICA_PIN_SECONDS when replicas are used).
+    """
+
+    def __init__(self, ttl=60, maxsize=512, backend=None, settle_seconds=0):
+        self.store = TTLCache(maxsize=maxsize, ttl=ttl, backend=backend, namespace='page')
+        self.backend = backend
+        self.settle_seconds = settle_seconds
+        self._generations = {}
+        self._invalidated_at = {}
+        self._lock = threading.Lock()
+        self.not_modified = 0
+        self.bypassed = 0
+        self.settling = 0
+
+    def generation(self, namespace):
+        if self.backend is not None:
+            return self.backend.get(f"page-gen:{namespace}") or 0
+        with self._lock:
+            return self._generations.get(namespace, 0)
+
+    def invalidate(self, *namespaces):
+        """Make every cached page in these namespaces stale"""
+        now = time.time()
+        for namespace in namespaces:
+            if self.backend is not None:
+                self.backend.incr(f"page-gen:{namespace}")
+                if self.settle_seconds:
+                    self.backend.set(f"page-gen-at:{namespace}", now, ttl=math.ceil(self.settle_seconds))
+            else:
+                with self._lock:
+                    self._generations[namespace] = self._generations.get(namespace, 0) + 1
+                    self._invalidated_at[namespace] = now
+
+    def is_settling(self, namespace):
+        """True within settle_seconds of the namespace's last invalidation"""
+        if not self.settle_seconds:
+            return False
+        if self.backend is not None:
+            invalidated_at = self.backend.get(f"page-gen-at:{namespace}")
+        else:
+            with self._lock:
+                invalidated_at = self._invalidated_at.get(namespace)
+        return invalidated_at is not None and time.time() - invalidated_at < self.settle_seconds
+
+    def cached(self, namespace):
+        """
+        Decorator for GET views. `namespace` is a string or a function of the
+        view's keyword arguments returning one, e.g. lambda product_id: f'product:{product_id}'.
+        """
+        def decorator(f):
+            @wraps(f)
+            def wrapper(*args, **kwargs):
+                ns = namespace(**kwargs) if callable(namespace) else namespace
+                key, entry = self.lookup(ns)
+                if key is None:
+                    return f(*args, **kwargs)
+                if entry is None:
+                    response = make_response(f(*args, **kwargs))
+                    entry = self.store_response(key, response)
+                    if entry is None:
+                        return response
+                return self.respond(entry)
+            return wrapper
+        return decorator
+
+    def lookup(self, namespace):
+        """
+        (key, entry) for the current request. key is None when the page must
+        not be cached; entry is None on a miss, in which case render the page
+        and pass it to store_response().
+        """
+        # Pages with pending flash messages are one-off, never cache them
+        if request.method != 'GET' or session.get('_flashes'):
+            self.bypassed += 1
+            return None, None
+        if self.is_settling(namespace):
+            self.settling += 1
+            return None, None
+        key = f"{namespace}:{self.generation(namespace)}:{request.full_path}:{_viewer_key()}"
+        return key, self.store.get(key)
+
+    def skip(self):
+        """Don't cache the page being rendered, e.g. because the database was unavailable"""
+        g.page_cache_skip = True
+
+    def store_response(self, key, response):
+        """Cache a freshly rendered response; returns its entry, or None if it isn't cacheable"""
+        if (response.status_code != 200 or response.direct_passthrough or session.get('_flashes')
+                or g.get('page_cache_skip')):
+            return None
+        body = response.get_data(as_text=True)
+        entry = {
+            'body': body,
+            'etag': hashlib.md5(body.encode()).hexdigest(),
+            'last_modified': int(time.time()),
+            'mimetype': response.mimetype,
+        }
+        self.store.set(key, entry)
+        return entry
+
+    def respond(self, entry):
+        """Response for a cache entry, a 304 when the browser's copy is current"""
+        response = Response(entry['body'], mimetype=entry['mimetype'])
+        response.set_etag(entry['etag'])
+        response.last_modified = datetime.fromtimestamp(entry['last_modified'], tz=timezone.utc)
+        # Pages differ per logged-in user, so only the browser may keep a copy
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        response.vary.add('Cookie')
+        response.make_conditional(request)
+        if response.status_code == 304:
+            self.not_modified += 1
+        return response
+
+    def stats(self):
+        return dict(self.store.stats(), not_modified=self.not_modified, bypassed=self.bypassed,
+                    settling=self.settling)
+
+
+def _viewer_key():
+    """Login state that changes what a page shows (navbar name, admin links, review form)"""
+    if 'user_id' not in session:
+        return 'anon'
+    return f"user:{session['user_id']}:{session.get('user_role')}:{session.get('user_name')}"
@@ -0,0 +1,147 @@
+"""
+Keyset (cursor) pagination helpers
+Pages are addressed by the sort key of the last/first row seen instead of an
+OFFSET, so every page costs the same index range scan no matter how deep it is
+"""
+
+import base64
+import json
+from datetime import datetime
+
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 60
+
+
+def clamp_page_size(value, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(size, maximum))
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    if isinstance(value, (int, float, str)) or value is None:
+        return value
+    return str(value)
+
+
+def _decode_value(value):
+    """The sort-key value from a token; anything _encode_value() can't produce is rejected"""
+    if isinstance(value, dict):
+        if list(value) != ['dt'] or not isinstance(value['dt'], str):
+            raise ValueError('invalid cursor value')
+        return datetime.fromisoformat(value['dt'])
+    if isinstance(value, bool) or not isinstance(value, (int, float, str, type(None))):
+        raise ValueError('invalid cursor value')
+    return value
+
+
+def encode_cursor(values, direction):
+    """Turn sort-key values into an opaque URL-safe token"""
+    payload = json.dumps({'v': [_encode_value(v) for v in values], 'd': direction}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Return (values, direction) for a token, or (None, 'next') if it is missing or invalid"""
+    if not token:
+        return None, 'next'
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        direction = payload['d'] if payload['d'] in ('next', 'prev') else 'next'
+        if not isinstance(payload['v'], list):
+            raise ValueError('invalid cursor values')
+        return [_decode_value(v) for v in payload['v']], direction
+    except (ValueError, KeyError, TypeError):
+        return None, 'next'
+
+
+def _keyset_condition(columns, op):
+    """Build (a op %s OR (a = %s AND b op %s) ...) for a multi-column key"""
+    clauses = []
+    params_order = []
+    for i, column in enumerate(columns):
+        parts = [f"{c} = %s" for c in columns[:i]] + [f"{column} {op} %s"]
+        clauses.append('(' + ' AND '.join(parts) + ')')
+        params_order.append(list(range(i + 1)))
+    return '(' + ' OR '.join(clauses) + ')', params_order
+
+
+def keyset_query(base_query, params, order_by, token=None, page_size=DEFAULT_PAGE_SIZE, descending=True):
+    """
+    Build the SQL for one page of `base_query` (which must already contain a
+    WHERE clause) ordered by `order_by`, a list of (sql_expression, row_key)
+    pairs ending in a unique column, newest-first unless descending=False.
+    Returns (query, params, plan); pass the fetched rows and the plan to
+    keyset_result().
+    """
+    columns = [expr for expr, _ in order_by]
+    values, direction = decode_cursor(token)
+    if values is not None and len(values) != len(columns):
+        values, direction = None, 'next'
+
+    query = base_query
+    params = list(params)
+    # Walking forward follows the requested order; walking back runs it in reverse
+    forward = direction == 'next'
+    if not descending:
+        forward = not forward
+    if values is not None:
+        condition, params_order = _keyset_condition(columns, '<' if forward else '>')
+        query += " AND " + condition
+        for indexes in params_order:
+            params.extend(values[i] for i in indexes)
+
+    sort = 'DESC' if forward else 'ASC'
+    query += " ORDER BY " + ', '.join(f"{c} {sort}" for c in columns)
+    query += " LIMIT %s"
+    params.append(page_size + 1)
+
+    plan = {'keys': [key for _, key in order_by], 'direction': direction,
+            'from_cursor': values is not None, 'page_size': page_size}
+    return query, params, plan
+
+
+def keyset_result(rows, plan):
+    """Turn the rows fetched for a keyset_query() into a page dict"""
+    page_size = plan['page_size']
+    keys = plan['keys']
+    direction = plan['direction']
+    rows = list(rows)
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if direction == 'prev':
+        rows.reverse()
+
+    next_token = prev_token = None
+    if rows:
+        first = [rows[0][k] for k in keys]
+        last = [rows[-1][k] for k in keys]
+        if direction == 'next':
+            next_token = encode_cursor(last, 'next') if has_more else None
+            prev_token = encode_cursor(first, 'prev') if plan['from_cursor'] else None
+        else:
+            next_token = encode_cursor(last, 'next')
+            prev_token = encode_cursor(first, 'prev') if has_more else None
+
+    return {
+        'items': rows,
+        'next_cursor': next_token,
+        'prev_cursor': prev_token,
+        'page_size': page_size,
+    }
+
+
+def keyset_page(cursor, base_query, params, order_by, token=None, page_size=DEFAULT_PAGE_SIZE, descending=True):
+    """
+    Fetch one page of `base_query` with a DB-API cursor (see keyset_query).
+    Returns a dict with items and the next/prev cursor tokens (None when
+    there is no such page).
+    """
+    query, params, plan = keyset_query(base_query, params, order_by, token, page_size, descending)
+    cursor.execute(query, params)
+    return keyset_result(cursor.fetchall(), plan)
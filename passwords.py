@@ -0,0 +1,151 @@
+"""
+Password hashing off the request threads
+Werkzeug's password hashes are deliberately slow, so a burst of logins used
+to keep every request thread busy hashing. PasswordHasher runs hashing and
+checking in a small process pool instead. At most `max_pending` calls may be
+waiting on the pool; past that it raises PasswordBusy straight away so the
+route can answer 503 with Retry-After rather than letting requests pile up.
+A call that timed out stays counted until its job really ends, and a pool
+whose worker process died is replaced on the next call.
+Hashes made with older parameters are detected by needs_rehash() so login
+can upgrade them.
+"""
+
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class PasswordBusy(Exception):
+    """Too many password operations are already queued; retry after `retry_after` seconds"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Password hashing is busy, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+def _check(pwhash, password):
+    return check_password_hash(pwhash, password)
+
+
+def _hash(password, method):
+    return generate_password_hash(password, method=method)
+
+
+class PasswordHasher:
+    """
+    `method` is a full Werkzeug method string such as 'scrypt:32768:8:1' or
+    'pbkdf2:sha256:600000'; stored hashes with any other prefix need a rehash.
+    workers=0 hashes in the calling thread (still bounded by max_pending).
+    """
+
+    def __init__(self, method, workers=2, max_pending=32, timeout=10, retry_after=2):
+        self.method = method
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._stats = {'submitted': 0, 'completed': 0, 'rejected': 0, 'timed_out': 0,
+                       'pending_peak': 0, 'seconds_total': 0.0}
+
+    def _get_executor(self):
+        # Created lazily so forked server workers each start their own processes
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self._executor
+
+    def _drop_executor(self, executor):
+        """Forget a pool whose worker died (e.g. OOM-killed); the next call starts a fresh one"""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False)
+        print("Password hashing pool broke, starting a new one")
+
+    def _finished(self):
+        with self._lock:
+            self._pending -= 1
+
+    def _completed(self, started):
+        with self._lock:
+            self._stats['completed'] += 1
+            self._stats['seconds_total'] += time.perf_counter() - started
+
+    def _run(self, fn, *args, wait=True):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._stats['rejected'] += 1
+                raise PasswordBusy(self.retry_after)
+            if not wait and self._pending >= max(self.workers, 1):
+                # Optional work (rehashing) only runs when a worker is free right now
+                return None
+            self._pending += 1
+            self._stats['submitted'] += 1
+            self._stats['pending_peak'] = max(self._stats['pending_peak'], self._pending)
+
+        started = time.perf_counter()
+        if not self.workers:
+            try:
+                result = fn(*args)
+            finally:
+                self._finished()
+            self._completed(started)
+            return result
+
+        executor = self._get_executor()
+        try:
+            future = executor.submit(fn, *args)
+        except BrokenProcessPool:
+            self._finished()
+            self._drop_executor(executor)
+            raise PasswordBusy(self.retry_after)
+        # A job that times out keeps its worker busy, so it stays pending until it really ends
+        future.add_done_callback(lambda done: self._finished())
+        try:
+            result = future.result(timeout=self.timeout)
+            self._completed(started)
+            return result
+        except FutureTimeout:
+            with self._lock:
+                self._stats['timed_out'] += 1
+            raise PasswordBusy(self.retry_after)
+        except BrokenProcessPool:
+            self._drop_executor(executor)
+            raise PasswordBusy(self.retry_after)
+
+    def check(self, pwhash, password):
+        """True if `password` matches the stored hash; raises PasswordBusy under overload"""
+        if not pwhash or password is None:
+            return False
+        return self._run(_check, pwhash, password)
+
+    def hash(self, password):
+        """A new hash of `password` with the current parameters; raises PasswordBusy under overload"""
+        return self._run(_hash, password, self.method)
+
+    def needs_rehash(self, pwhash):
+        return pwhash.split('$', 1)[0] != self.method
+
+    def upgrade(self, pwhash, password):
+        """
+        A replacement hash for a password that just verified against an
+        outdated `pwhash`, or None if it is current or the pool has no free
+        worker (the upgrade then happens at a later login)
+        """
+        if not self.needs_rehash(pwhash):
+            return None
+        try:
+            return self._run(_hash, password, self.method, wait=False)
+        except PasswordBusy:
+            return None
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, pending=self._pending, workers=self.workers, max_pending=self.max_pending)
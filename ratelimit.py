@@ -0,0 +1,140 @@
+"""
+Rate limiting and admission control for Campus Marketplace
+Write endpoints get token buckets per client IP and per signed-in user: a
+bucket holds up to `requests` tokens and refills at requests/seconds, so short
+bursts pass while a script hammering /login gets 429 with Retry-After before
+it ever borrows a database connection. Buckets live in this process, or in
+the shared cache backend when one is configured so the limits hold across
+workers. Separately, AdmissionControl caps the requests in progress per
+process and answers 503 at once when the database pool would otherwise have
+to queue them.
+"""
+
+import threading
+
+from flask import g, jsonify, render_template, request, session
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+
+from cache import LocalCacheBackend
+
+# Endpoints that keep working when the process is at capacity
+ADMISSION_EXEMPT = ('static', 'metrics_endpoint')
+WRITE_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+
+
+class RateLimiter:
+    """
+    `limits` maps an endpoint to {scope: (requests, seconds)} where scope is
+    'ip' or 'user'. `backend` is a cache backend with take_token(); without
+    one the buckets are kept in this process.
+    """
+
+    def __init__(self, limits, backend=None):
+        self.limits = limits
+        self.backend = backend or LocalCacheBackend()
+        self.shared = backend is not None and backend.shared
+        self._lock = threading.Lock()
+        self._stats = {'allowed': 0, 'limited': 0, 'backend_errors': 0}
+
+    def check(self, endpoint, identities):
+        """
+        Take a token from each of the endpoint's buckets. Returns 0 if the
+        request may go ahead, otherwise the seconds until it could.
+        """
+        wait = 0
+        for scope, (requests_allowed, seconds) in self.limits.get(endpoint, {}).items():
+            identity = identities.get(scope)
+            if identity is None:
+                continue
+            try:
+                wait = max(wait, self.backend.take_token(f"ratelimit:{endpoint}:{scope}:{identity}",
+                                                         requests_allowed / seconds, requests_allowed))
+            except Exception as e:
+                # A broken shared store must not take the site down with it
+                print(f"Rate limit backend error: {e}")
+                with self._lock:
+                    self._stats['backend_errors'] += 1
+        with self._lock:
+            self._stats['limited' if wait else 'allowed'] += 1
+        return wait
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, shared=int(self.shared))
+
+
+class AdmissionControl:
+    """At most `limit` requests in progress in this process (0 or None = no cap)"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._stats = {'admitted': 0, 'shed': 0, 'in_flight_peak': 0}
+
+    def enter(self):
+        """Claim a slot; False means the process is full and the request should be shed"""
+        with self._lock:
+            if self.limit and self._in_flight >= self.limit:
+                self._stats['shed'] += 1
+                return False
+            self._in_flight += 1
+            self._stats['admitted'] += 1
+            self._stats['in_flight_peak'] = max(self._stats['in_flight_peak'], self._in_flight)
+            return True
+
+    def leave(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, in_flight=self._in_flight, limit=self.limit or 0)
+
+
+def _current_user():
+    """The signed-in user id from the session, or from a valid JWT on API requests"""
+    if session.get('user_id'):
+        return session['user_id']
+    if request.blueprint == 'api_v1':
+        try:
+            verify_jwt_in_request(optional=True)
+            return get_jwt_identity()
+        except Exception:
+            return None
+    return None
+
+
+def _refuse(status, message, retry_after):
+    """A 429/503 response in the form the caller expects, with Retry-After"""
+    retry_after = max(1, int(retry_after + 0.999))
+    if request.is_json or request.blueprint == 'api_v1' or request.accept_mimetypes.best == 'application/json':
+        response = jsonify({'success': False, 'message': message})
+    else:
+        response = render_template('too_busy.html', message=message, retry_after=retry_after)
+    return response, status, {'Retry-After': str(retry_after)}
+
+
+def init_app(app, limiter, admission):
+    """Check admission and rate limits before every request"""
+    app.config.setdefault('RATE_LIMIT_ENABLED', True)
+    app.config.setdefault('OVERLOAD_RETRY_AFTER', 1)
+
+    @app.before_request
+    def admit_request():
+        if request.endpoint not in ADMISSION_EXEMPT:
+            if not admission.enter():
+                return _refuse(503, 'The site is very busy right now. Please try again in a moment.',
+                               app.config['OVERLOAD_RETRY_AFTER'])
+            g.admitted = True
+
+        if (app.config['RATE_LIMIT_ENABLED'] and request.method in WRITE_METHODS
+                and request.endpoint in limiter.limits):
+            wait = limiter.check(request.endpoint, {'ip': request.remote_addr, 'user': _current_user()})
+            if wait:
+                return _refuse(429, 'Too many requests. Please slow down and try again shortly.', wait)
+
+    @app.teardown_request
+    def release_admission(exception=None):
+        if g.pop('admitted', False):
+            admission.leave()
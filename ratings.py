@@ -0,0 +1,101 @@
+"""
+Product rating aggregates and review pages
+product_ratings keeps a running count, sum and 1-5 histogram per product so
+the summary on a product page is a single primary-key lookup
+"""
+
+from pagination import keyset_page
+
+REVIEW_PAGE_SIZE = 10
+BUCKETS = ('r1', 'r2', 'r3', 'r4', 'r5')
+
+# One product with its seller and rating aggregate columns, for rating_summary()
+PRODUCT_WITH_RATINGS_QUERY = """SELECT p.*, u.name as seller_name, u.email as seller_email,
+                                      r.rating_count, r.rating_sum, r.r1, r.r2, r.r3, r.r4, r.r5
+                               FROM products p
+                               JOIN users u ON p.seller_id = u.id
+                               LEFT JOIN product_ratings r ON r.product_id = p.id
+                               WHERE p.id = %s"""
+REVIEW_ORDER = [('f.created_at', 'created_at'), ('f.id', 'id')]
+REVIEWS_QUERY = "SELECT f.*, u.name as user_name FROM feedbacks f JOIN users u ON f.user_id = u.id WHERE f.product_id = %s"
+
+
+def record_rating(cursor, product_id, rating):
+    """Fold one new rating into the product's aggregate (call in the same transaction as the INSERT)"""
+    buckets = [1 if rating == i else 0 for i in range(1, 6)]
+    cursor.execute(
+        """INSERT INTO product_ratings (product_id, rating_count, rating_sum, r1, r2, r3, r4, r5)
+           VALUES (%s, 1, %s, %s, %s, %s, %s, %s)
+           ON DUPLICATE KEY UPDATE
+               rating_count = rating_count + 1,
+               rating_sum = rating_sum + VALUES(rating_sum),
+               r1 = r1 + VALUES(r1), r2 = r2 + VALUES(r2), r3 = r3 + VALUES(r3),
+               r4 = r4 + VALUES(r4), r5 = r5 + VALUES(r5)""",
+        [product_id, rating] + buckets
+    )
+
+
+def remove_user_ratings(cursor, user_id):
+    """
+    Take all of a user's ratings out of the aggregates before deleting the
+    user cascades to their feedbacks (call in the same transaction as the
+    DELETE). Returns the ids of the products whose aggregate changed.
+    """
+    cursor.execute("SELECT product_id, rating FROM feedbacks WHERE user_id = %s FOR UPDATE", (user_id,))
+    removed = {}
+    for product_id, rating in cursor.fetchall():
+        totals = removed.setdefault(product_id, [0, 0, 0, 0, 0, 0, 0])
+        totals[0] += 1
+        totals[1] += rating
+        totals[1 + rating] += 1
+    if removed:
+        cursor.executemany(
+            """UPDATE product_ratings SET
+                   rating_count = rating_count - %s, rating_sum = rating_sum - %s,
+                   r1 = r1 - %s, r2 = r2 - %s, r3 = r3 - %s, r4 = r4 - %s, r5 = r5 - %s
+               WHERE product_id = %s""",
+            [totals + [product_id] for product_id, totals in removed.items()]
+        )
+    return list(removed)
+
+
+def rebuild_ratings(conn):
+    """Recompute every aggregate from the feedbacks table"""
+    cursor = conn.cursor()
+    # Products whose last rating was deleted have no feedbacks row to rebuild from
+    cursor.execute(
+        """UPDATE product_ratings r
+           LEFT JOIN feedbacks f ON f.product_id = r.product_id
+           SET r.rating_count = 0, r.rating_sum = 0, r.r1 = 0, r.r2 = 0, r.r3 = 0, r.r4 = 0, r.r5 = 0
+           WHERE f.id IS NULL AND r.rating_count != 0"""
+    )
+    cursor.execute(
+        """INSERT INTO product_ratings (product_id, rating_count, rating_sum, r1, r2, r3, r4, r5)
+           SELECT product_id, COUNT(*), SUM(rating),
+                  SUM(rating = 1), SUM(rating = 2), SUM(rating = 3), SUM(rating = 4), SUM(rating = 5)
+           FROM feedbacks GROUP BY product_id
+           ON DUPLICATE KEY UPDATE
+               rating_count = VALUES(rating_count), rating_sum = VALUES(rating_sum),
+               r1 = VALUES(r1), r2 = VALUES(r2), r3 = VALUES(r3), r4 = VALUES(r4), r5 = VALUES(r5)"""
+    )
+    conn.commit()
+    cursor.close()
+
+
+def rating_summary(row):
+    """Build {'count', 'average', 'histogram'} from a row carrying the product_ratings columns"""
+    count = int(row.get('rating_count') or 0)
+    histogram = []
+    for stars in range(5, 0, -1):
+        n = int(row.get(BUCKETS[stars - 1]) or 0)
+        histogram.append({'stars': stars, 'count': n, 'percent': round(100 * n / count) if count else 0})
+    return {
+        'count': count,
+        'average': round(float(row.get('rating_sum') or 0) / count, 1) if count else None,
+        'histogram': histogram,
+    }
+
+
+def reviews_page(cursor, product_id, token=None, page_size=REVIEW_PAGE_SIZE):
+    """One page of a product's reviews, newest first"""
+    return keyset_page(cursor, REVIEWS_QUERY, [product_id], REVIEW_ORDER, token, page_size)
@@ -1,4 +1,7 @@
 -- Campus Marketplace Database Schema
+-- Reference snapshot of the schema after every migration in migrations.py.
+-- The application creates and upgrades the database itself (python migrations.py migrate);
+-- when changing the schema add a migration there and update this file to match.
 
 USE campus_marketplace;
 
@@ -12,7 +15,11 @@ CREATE TABLE IF NOT EXISTS users (
     address TEXT,
     role ENUM('user', 'admin') DEFAULT 'user',
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    -- Admin user list: sorted by join date or name, filtered by role (see admin_tables.py)
+    INDEX idx_users_created (created_at, id),
+    INDEX idx_users_name (name, id),
+    INDEX idx_users_role_created (role, created_at, id)
 );
 
 -- Products table
@@ -27,7 +34,15 @@ CREATE TABLE IF NOT EXISTS products (
     seller_id INT NOT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-    FOREIGN KEY (seller_id) REFERENCES users(id) ON DELETE CASCADE
+    FOREIGN KEY (seller_id) REFERENCES users(id) ON DELETE CASCADE,
+    -- Keyset pagination on (created_at, id), optionally filtered by category
+    INDEX idx_products_created (created_at, id),
+    INDEX idx_products_category_created (category, created_at, id),
+    -- Product search: prefix lookups on name and ranked full-text matching
+    INDEX idx_products_name (name),
+    -- Counting references to an uploaded image (see storage.py)
+    INDEX idx_products_image (image),
+    FULLTEXT INDEX ft_products_search (name, description)
 );
 
 -- Cart table
@@ -52,7 +67,13 @@ CREATE TABLE IF NOT EXISTS orders (
     status ENUM('pending', 'processing', 'shipped', 'completed', 'cancelled') DEFAULT 'pending',
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    -- Admin order list: filtered by status or customer, sorted by date or total
+    INDEX idx_orders_status_created (status, created_at, id),
+    INDEX idx_orders_user_created (user_id, created_at, id),
+    INDEX idx_orders_total (total_amount, id),
+    -- "Recent activity" list on the admin dashboard
+    INDEX idx_orders_created (created_at)
 );
 
 -- Order items table
@@ -76,9 +97,99 @@ CREATE TABLE IF NOT EXISTS feedbacks (
     comment TEXT,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE,
+    -- Paged reviews on the product page
+    INDEX idx_feedbacks_product_created (product_id, created_at, id),
+    -- Admin feedback list: filtered by rating or reviewer
+    INDEX idx_feedbacks_rating_created (rating, created_at, id),
+    INDEX idx_feedbacks_user_created (user_id, created_at, id),
+    -- "Recent activity" list on the admin dashboard
+    INDEX idx_feedbacks_created (created_at)
+);
+
+-- Site feedback from the feedback page
+CREATE TABLE IF NOT EXISTS general_feedback (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    user_id INT,
+    name VARCHAR(100) NOT NULL,
+    email VARCHAR(100) NOT NULL,
+    subject VARCHAR(200),
+    message TEXT NOT NULL,
+    rating INT DEFAULT 5 CHECK (rating >= 1 AND rating <= 5),
+    status ENUM('new', 'read', 'replied') DEFAULT 'new',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE SET NULL,
+    INDEX idx_general_feedback_created (created_at),
+    INDEX idx_general_feedback_status_created (status, created_at, id),
+    INDEX idx_general_feedback_rating_created (rating, created_at, id)
+);
+
+-- Messages from the contact page
+CREATE TABLE IF NOT EXISTS contact_messages (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    user_id INT,
+    name VARCHAR(100) NOT NULL,
+    email VARCHAR(100) NOT NULL,
+    phone VARCHAR(20),
+    subject VARCHAR(200) NOT NULL,
+    message TEXT NOT NULL,
+    status ENUM('new', 'read', 'replied') DEFAULT 'new',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE SET NULL,
+    INDEX idx_contact_messages_created (created_at),
+    INDEX idx_contact_messages_status_created (status, created_at, id)
+);
+
+-- Per-product rating aggregates, updated with every new feedback (see ratings.py)
+CREATE TABLE IF NOT EXISTS product_ratings (
+    product_id INT PRIMARY KEY,
+    rating_count INT NOT NULL DEFAULT 0,
+    rating_sum INT NOT NULL DEFAULT 0,
+    r1 INT NOT NULL DEFAULT 0,
+    r2 INT NOT NULL DEFAULT 0,
+    r3 INT NOT NULL DEFAULT 0,
+    r4 INT NOT NULL DEFAULT 0,
+    r5 INT NOT NULL DEFAULT 0,
     FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE
 );
 
+-- Dashboard totals, kept up to date by the application (see stats.py)
+CREATE TABLE IF NOT EXISTS site_stats (
+    name VARCHAR(50) PRIMARY KEY,
+    value DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+-- Uploaded files and how many rows point at them (see storage.py)
+CREATE TABLE IF NOT EXISTS blobs (
+    name VARCHAR(255) PRIMARY KEY,
+    ref_count INT NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    INDEX idx_blobs_unreferenced (ref_count, updated_at)
+);
+
+-- Who moved which order or message to which status, and when (see status_changes.py).
+-- No foreign keys: the history outlives deleted users and rows.
+CREATE TABLE IF NOT EXISTS status_history (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    entity ENUM('order', 'feedback', 'contact') NOT NULL,
+    entity_id INT NOT NULL,
+    old_status ENUM('pending', 'processing', 'shipped', 'completed', 'cancelled', 'new', 'read', 'replied'),
+    new_status ENUM('pending', 'processing', 'shipped', 'completed', 'cancelled', 'new', 'read', 'replied') NOT NULL,
+    changed_by INT,
+    changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_status_history_entity (entity, entity_id, changed_at)
+);
+
+-- Applied schema migrations (see migrations.py)
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INT PRIMARY KEY,
+    description VARCHAR(200) NOT NULL,
+    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    duration_ms INT NOT NULL DEFAULT 0
+);
+
 -- Insert default admin user (password: admin123)
 -- Note: The password hash will be generated by the application
 -- Default password is 'admin123' - change it after first login
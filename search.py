@@ -0,0 +1,103 @@
+"""
+Product search backed by a MySQL FULLTEXT index on products(name, description)
+Replaces LIKE '%term%' scans with ranked, index-driven matching, plus prefix
+suggestions for autocomplete and category facet counts
+"""
+
+import re
+
+from pagination import keyset_page
+
+# InnoDB ignores tokens shorter than innodb_ft_min_token_size (3 by default)
+MIN_TOKEN_LENGTH = 3
+MATCH_EXPR = "MATCH(p.name, p.description) AGAINST(%s IN BOOLEAN MODE)"
+RELEVANCE_SCALE = 1000000  # relevance_rank keeps six decimal places of the score
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def build_boolean_query(text):
+    """Turn free text into a boolean-mode query where every word must match as a prefix"""
+    words = [w for w in _WORD_RE.findall(text or '') if len(w) >= MIN_TOKEN_LENGTH]
+    if not words:
+        return None
+    return ' '.join(f"+{w}*" for w in words[:10])
+
+
+PRODUCT_LIST_ORDER = [('p.created_at', 'created_at'), ('p.id', 'id')]
+
+
+def product_list_query(search='', category=''):
+    """(base_query, params, order_by) for one catalog listing, for keyset_page()/keyset_query()"""
+    if not search:
+        query = "SELECT p.*, u.name as seller_name FROM products p JOIN users u ON p.seller_id = u.id WHERE 1=1"
+        params = []
+        if category:
+            query += " AND p.category = %s"
+            params.append(category)
+        return query, params, PRODUCT_LIST_ORDER
+
+    boolean_query = build_boolean_query(search)
+    if boolean_query is None:
+        # Too short for the full-text index: prefix match on the product name instead
+        query = "SELECT p.*, u.name as seller_name FROM products p JOIN users u ON p.seller_id = u.id WHERE p.name LIKE %s"
+        params = [_like_prefix(search)]
+        if category:
+            query += " AND p.category = %s"
+            params.append(category)
+        return query, params, PRODUCT_LIST_ORDER
+
+    # Pages are keyed on the score scaled to an integer: a float doesn't survive the round
+    # trip through a cursor token exactly, so equality on it would skip or repeat rows
+    inner = (f"SELECT p.*, u.name as seller_name, {MATCH_EXPR} AS relevance, "
+             f"CAST(ROUND({MATCH_EXPR} * {RELEVANCE_SCALE}) AS SIGNED) AS relevance_rank "
+             f"FROM products p JOIN users u ON p.seller_id = u.id WHERE {MATCH_EXPR}")
+    params = [boolean_query, boolean_query, boolean_query]
+    if category:
+        inner += " AND p.category = %s"
+        params.append(category)
+    query = f"SELECT * FROM ({inner}) ranked WHERE 1=1"
+    return query, params, [('ranked.relevance_rank', 'relevance_rank'), ('ranked.id', 'id')]
+
+
+def query_products(cursor, search='', category='', token=None, page_size=24):
+    """Return one keyset page of the product catalog, newest first (best match first when searching)"""
+    query, params, order_by = product_list_query(search, category)
+    return keyset_page(cursor, query, params, order_by, token, page_size)
+
+
+def suggest_products(cursor, prefix, limit=8):
+    """Product names for autocomplete"""
+    boolean_query = build_boolean_query(prefix)
+    if boolean_query is None:
+        cursor.execute(
+            "SELECT id, name FROM products WHERE name LIKE %s ORDER BY name LIMIT %s",
+            (_like_prefix(prefix), limit)
+        )
+    else:
+        cursor.execute(
+            "SELECT id, name FROM products p WHERE MATCH(p.name, p.description) AGAINST(%s IN BOOLEAN MODE) LIMIT %s",
+            (boolean_query, limit)
+        )
+    return cursor.fetchall()
+
+
+def category_facets_query(search):
+    """(query, params) counting matching products per category"""
+    boolean_query = build_boolean_query(search)
+    if boolean_query is None:
+        return ("SELECT category, COUNT(*) as count FROM products WHERE name LIKE %s GROUP BY category ORDER BY count DESC",
+                (_like_prefix(search),))
+    return (f"SELECT p.category, COUNT(*) as count FROM products p WHERE {MATCH_EXPR} GROUP BY p.category ORDER BY count DESC",
+            (boolean_query,))
+
+
+def category_facets(cursor, search):
+    """Number of matching products per category"""
+    cursor.execute(*category_facets_query(search))
+    return cursor.fetchall()
+
+
+def _like_prefix(text):
+    escaped = (text or '').replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return escaped + '%'
@@ -62,6 +62,40 @@ function addToCart(productId, quantity = 1) {
     });
 }
 
+// Add several items in one request, e.g. "Reorder" or "Add all"
+// items: [{product_id: 1, quantity: 2}, ...]
+function addAllToCart(items) {
+    return fetch('/add_to_cart/bulk', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        credentials: 'same-origin',
+        body: JSON.stringify({ items: items })
+    })
+    .then(response => {
+        if (response.status === 401) {
+            alert('Please login to add items to cart');
+            window.location.href = '/login';
+            return;
+        }
+        return response.json();
+    })
+    .then(data => {
+        if (data && data.success) {
+            showNotification(data.message || 'Items added to cart!', 'success');
+            updateCartCount();
+        } else if (data) {
+            showNotification(data.message || 'Error adding to cart', 'error');
+        }
+        return data;
+    })
+    .catch(error => {
+        console.error('Error:', error);
+        showNotification('Error adding to cart', 'error');
+    });
+}
+
 // Update Cart Count
 function updateCartCount() {
     // This would typically fetch the cart count from the server
@@ -163,3 +197,30 @@ if (searchInput) {
     searchInput.addEventListener('input', debouncedSearch);
 }
 
+
+
+// Product search autocomplete
+const productSearch = document.getElementById('productSearch');
+const productSuggestions = document.getElementById('productSuggestions');
+if (productSearch && productSuggestions) {
+    const loadSuggestions = debounce(function() {
+        const q = productSearch.value.trim();
+        if (q.length < 2) {
+            productSuggestions.innerHTML = '';
+            return;
+        }
+        fetch('/api/products/suggest?q=' + encodeURIComponent(q), { credentials: 'same-origin' })
+            .then(response => response.json())
+            .then(data => {
+                productSuggestions.innerHTML = '';
+                (data.suggestions || []).forEach(function(item) {
+                    const option = document.createElement('option');
+                    option.value = item.name;
+                    productSuggestions.appendChild(option);
+                });
+            })
+            .catch(error => console.error('Error:', error));
+    }, 250);
+    
+    productSearch.addEventListener('input', loadSuggestions);
+}
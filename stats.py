@@ -0,0 +1,114 @@
+"""
+Admin dashboard statistics for Campus Marketplace
+Totals live in the site_stats summary table and are adjusted in the same
+transaction as the writes that change them; a periodic reconciliation
+recomputes them from the source tables to correct any drift
+"""
+
+import threading
+import time
+
+COUNTERS = ('total_users', 'total_products', 'total_orders', 'total_revenue')
+
+RECONCILE_QUERIES = {
+    'total_users': "SELECT COUNT(*) FROM users WHERE role = 'user'",
+    'total_products': "SELECT COUNT(*) FROM products",
+    'total_orders': "SELECT COUNT(*) FROM orders",
+    'total_revenue': "SELECT COALESCE(SUM(total_amount), 0) FROM orders WHERE status = 'completed'",
+}
+
+
+def bump(cursor, **deltas):
+    """Adjust counters by the given amounts, e.g. bump(cursor, total_orders=1).
+    Runs on the caller's cursor so it commits or rolls back with their write."""
+    deltas = {name: amount for name, amount in deltas.items() if amount}
+    if not deltas:
+        return
+    case_sql = 'CASE name ' + ' '.join(['WHEN %s THEN %s'] * len(deltas)) + ' END'
+    params = [v for item in deltas.items() for v in item]
+    placeholders = ', '.join(['%s'] * len(deltas))
+    cursor.execute(
+        f"UPDATE site_stats SET value = value + {case_sql} WHERE name IN ({placeholders})",
+        params + list(deltas)
+    )
+
+
+def revenue_delta(old_status, new_status, amount):
+    """Change in completed-order revenue when an order moves between statuses"""
+    if old_status == new_status:
+        return 0
+    if new_status == 'completed':
+        return amount
+    if old_status == 'completed':
+        return -amount
+    return 0
+
+
+def reconcile(conn):
+    """
+    Recompute every counter from the source tables and return how far each
+    one had drifted. The counters are locked before the source tables are
+    read, so a concurrent bump() either committed before the counts were
+    taken or waits and is added on top of them.
+    """
+    conn.commit()  # a fresh transaction, so the counts below see every committed row
+    cursor = conn.cursor()
+    cursor.execute("SELECT name, value FROM site_stats FOR UPDATE")
+    stored = dict(cursor.fetchall())
+
+    actual = {}
+    for name, query in RECONCILE_QUERIES.items():
+        cursor.execute(query)
+        actual[name] = cursor.fetchone()[0]
+
+    cursor.executemany(
+        "INSERT INTO site_stats (name, value) VALUES (%s, %s) ON DUPLICATE KEY UPDATE value = VALUES(value)",
+        list(actual.items())
+    )
+    conn.commit()
+    cursor.close()
+    return {name: actual[name] - stored.get(name, 0) for name in COUNTERS}
+
+
+def read_stats(conn):
+    """Current dashboard totals, seeding the summary table on first use"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT name, value FROM site_stats")
+    stored = dict(cursor.fetchall())
+    cursor.close()
+    if any(name not in stored for name in COUNTERS):
+        reconcile(conn)
+        return read_stats(conn)
+    return {
+        'total_users': int(stored['total_users']),
+        'total_products': int(stored['total_products']),
+        'total_orders': int(stored['total_orders']),
+        'total_revenue': stored['total_revenue'],
+    }
+
+
+def start_reconciler(get_connection, interval, also=()):
+    """
+    Run reconcile() every `interval` seconds in a daemon thread, followed by
+    each `also(conn)` for other summary tables (e.g. ratings.rebuild_ratings)
+    """
+    def loop():
+        while True:
+            time.sleep(interval)
+            conn = get_connection()
+            if not conn:
+                continue
+            try:
+                drift = reconcile(conn)
+                if any(drift.values()):
+                    print(f"Dashboard stats corrected: {drift}")
+                for job in also:
+                    job(conn)
+            except Exception as e:
+                print(f"Error reconciling dashboard stats: {e}")
+            finally:
+                conn.close()
+
+    thread = threading.Thread(target=loop, name='stats-reconciler', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,139 @@
+"""
+Status changes for orders and inbox messages
+Admins move many rows at once: a change locks the selected rows with one
+SELECT, moves every row the transition is allowed from with one UPDATE and
+records them all in status_history with one multi-row INSERT, in a single
+transaction. Cancelling orders returns their items to stock in that
+transaction too. Orders follow a state machine; site feedback and contact
+messages can move between any of their statuses.
+"""
+
+import stats
+
+MAX_BULK_IDS = 500
+
+# Order status -> statuses it can move to
+ORDER_TRANSITIONS = {
+    'pending': ('processing', 'cancelled'),
+    'processing': ('shipped', 'cancelled'),
+    'shipped': ('completed',),
+    'completed': (),
+    'cancelled': (),
+}
+
+MESSAGE_STATUSES = ('new', 'read', 'replied')
+MESSAGE_TRANSITIONS = {status: tuple(s for s in MESSAGE_STATUSES if s != status) for status in MESSAGE_STATUSES}
+
+# Entity name (as stored in status_history) -> (table, transitions)
+ENTITIES = {
+    'order': ('orders', ORDER_TRANSITIONS),
+    'feedback': ('general_feedback', MESSAGE_TRANSITIONS),
+    'contact': ('contact_messages', MESSAGE_TRANSITIONS),
+}
+
+
+class StatusChangeError(ValueError):
+    """The request itself is invalid (unknown status, bad or too many ids)"""
+
+
+def parse_ids(values):
+    """Distinct positive integer ids from a JSON list, in the order given"""
+    if not isinstance(values, list) or not values:
+        raise StatusChangeError('Select at least one row')
+    ids = []
+    for value in values:
+        if isinstance(value, bool):
+            raise StatusChangeError(f'Invalid id {value!r}')
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            raise StatusChangeError(f'Invalid id {value!r}')
+        if value > 0 and value not in ids:
+            ids.append(value)
+    if not ids:
+        raise StatusChangeError('No valid ids')
+    if len(ids) > MAX_BULK_IDS:
+        raise StatusChangeError(f'At most {MAX_BULK_IDS} rows can be changed at once')
+    return ids
+
+
+def allowed(entity, old_status, new_status):
+    return new_status in ENTITIES[entity][1].get(old_status, ())
+
+
+def restock(cursor, order_ids):
+    """Return the stock reserved by these orders' items; returns the product ids changed"""
+    placeholders = ', '.join(['%s'] * len(order_ids))
+    cursor.execute(
+        f"SELECT product_id, SUM(quantity) FROM order_items WHERE order_id IN ({placeholders}) "
+        "GROUP BY product_id ORDER BY product_id",
+        order_ids
+    )
+    quantities = cursor.fetchall()
+    if not quantities:
+        return []
+    case_sql = 'CASE id ' + ' '.join(['WHEN %s THEN %s'] * len(quantities)) + ' END'
+    product_ids = [product_id for product_id, _ in quantities]
+    cursor.execute(
+        f"UPDATE products SET stock = stock + {case_sql} WHERE id IN ({', '.join(['%s'] * len(product_ids))})",
+        [v for row in quantities for v in row] + product_ids
+    )
+    return product_ids
+
+
+def change_status(conn, entity, ids, new_status, changed_by):
+    """
+    Move the rows `ids` of `entity` to `new_status` where the transition is
+    allowed. Returns {'updated': [ids], 'skipped': [{'id', 'status'}],
+    'missing': [ids]}; rows already in `new_status` count as skipped.
+    Cancelled orders put their items back in stock, and the result then also
+    has 'product_ids', the products whose stock changed.
+    """
+    table, transitions = ENTITIES[entity]
+    if new_status not in transitions:
+        raise StatusChangeError(f'Unknown status {new_status!r}')
+
+    placeholders = ', '.join(['%s'] * len(ids))
+    cursor = conn.cursor()
+    try:
+        # Lock the rows so the history records the status each one really moved from
+        columns = 'id, status, total_amount' if entity == 'order' else 'id, status, NULL'
+        cursor.execute(f"SELECT {columns} FROM {table} WHERE id IN ({placeholders}) FOR UPDATE", ids)
+        current = {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+
+        result = {'updated': [], 'skipped': [], 'missing': []}
+        for row_id in ids:
+            if row_id not in current:
+                result['missing'].append(row_id)
+            elif allowed(entity, current[row_id][0], new_status):
+                result['updated'].append(row_id)
+            else:
+                result['skipped'].append({'id': row_id, 'status': current[row_id][0]})
+
+        if not result['updated']:
+            conn.rollback()
+            return result
+
+        moved = result['updated']
+        cursor.execute(
+            f"UPDATE {table} SET status = %s WHERE id IN ({', '.join(['%s'] * len(moved))})",
+            [new_status] + moved
+        )
+        cursor.executemany(
+            "INSERT INTO status_history (entity, entity_id, old_status, new_status, changed_by) "
+            "VALUES (%s, %s, %s, %s, %s)",
+            [(entity, row_id, current[row_id][0], new_status, changed_by) for row_id in moved]
+        )
+        if entity == 'order':
+            stats.bump(cursor, total_revenue=sum(
+                stats.revenue_delta(current[row_id][0], new_status, current[row_id][1]) for row_id in moved
+            ))
+            if new_status == 'cancelled':
+                result['product_ids'] = restock(cursor, moved)
+        conn.commit()
+        return result
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
@@ -0,0 +1,251 @@
+"""
+Blob storage for uploaded files
+Files are content-addressed (see image_pipeline.save_upload), reference
+counted in the blobs table and removed by a garbage collector once nothing
+points at them. An upload is claimed in blobs before its file is written or
+reused, so the collector never removes a file a request is about to use.
+Two backends: the local uploads folder, or any S3-compatible service (AWS
+S3, MinIO, ...) through the optional boto3 package.
+"""
+
+import mimetypes
+import os
+import re
+import shutil
+import threading
+import time
+
+# Names save_upload() gives originals; variants (<hash>-<width>.webp), manifests (<hash>.json)
+# and bundled images never match
+UPLOAD_NAME = re.compile(r'^[0-9a-f]{32}\.(png|jpe?g|gif)$')
+
+
+def _check_name(name):
+    """Blob names are single file names; refuse anything that could leave the uploads folder or prefix"""
+    if not name or '/' in name or '\\' in name or '..' in name or '\0' in name:
+        raise ValueError(f"Invalid blob name {name!r}")
+    return name
+
+
+class LocalStorage:
+    """Blobs stored as files in the uploads folder and served as static files"""
+
+    def __init__(self, folder, url_prefix='/static/uploads'):
+        self.folder = folder
+        self.url_prefix = url_prefix.rstrip('/')
+
+    def _path(self, name):
+        return os.path.join(self.folder, _check_name(name))
+
+    def put_file(self, local_path, name):
+        dest = self._path(name)
+        if os.path.abspath(local_path) != os.path.abspath(dest):
+            os.makedirs(self.folder, exist_ok=True)
+            shutil.copyfile(local_path, dest)
+
+    def read(self, name):
+        try:
+            with open(self._path(name), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def exists(self, name):
+        return os.path.exists(self._path(name))
+
+    def delete(self, name):
+        try:
+            os.remove(self._path(name))
+        except FileNotFoundError:
+            pass
+
+    def list_names(self):
+        try:
+            return os.listdir(self.folder)
+        except FileNotFoundError:
+            return []
+
+    def url(self, name):
+        return f"{self.url_prefix}/{name}"
+
+    @property
+    def is_local(self):
+        return True
+
+
+class S3Storage:
+    """Blobs stored in an S3-compatible bucket (point endpoint_url at MinIO for local testing)"""
+
+    def __init__(self, bucket, endpoint_url=None, public_url=None, prefix='uploads/', **client_kwargs):
+        import boto3  # optional dependency, only needed for the S3 backend
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = boto3.client('s3', endpoint_url=endpoint_url, **client_kwargs)
+        base = public_url or (f"{endpoint_url.rstrip('/')}/{bucket}" if endpoint_url else f"https://{bucket}.s3.amazonaws.com")
+        self.public_url = base.rstrip('/')
+
+    def _key(self, name):
+        return f"{self.prefix}{_check_name(name)}"
+
+    def put_file(self, local_path, name):
+        content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        self.client.upload_file(local_path, self.bucket, self._key(name), ExtraArgs={
+            'ContentType': content_type,
+            # Names are content hashes, so a blob never changes once written
+            'CacheControl': 'public, max-age=31536000, immutable',
+        })
+
+    def read(self, name):
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=self._key(name))['Body'].read()
+        except self.client.exceptions.NoSuchKey:
+            return None
+
+    def exists(self, name):
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._key(name))
+            return True
+        except Exception:
+            return False
+
+    def delete(self, name):
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(name))
+
+    def list_names(self):
+        names = []
+        for page in self.client.get_paginator('list_objects_v2').paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for item in page.get('Contents', []):
+                name = item['Key'][len(self.prefix):]
+                if '/' not in name:
+                    names.append(name)
+        return names
+
+    def url(self, name):
+        return f"{self.public_url}/{self._key(name)}"
+
+    @property
+    def is_local(self):
+        return False
+
+
+def make_storage(config, static_url_path='/static'):
+    """Build the configured backend from app.config"""
+    if config.get('STORAGE_BACKEND', 'local') == 's3':
+        return S3Storage(
+            config['S3_BUCKET'],
+            endpoint_url=config.get('S3_ENDPOINT_URL'),
+            public_url=config.get('S3_PUBLIC_URL'),
+            prefix=config.get('S3_PREFIX', 'uploads/'),
+        )
+    return LocalStorage(config['UPLOAD_FOLDER'], url_prefix=f"{static_url_path}/uploads")
+
+
+# Reference counting -------------------------------------------------------
+
+def claim_blob(conn, name):
+    """
+    Record a fresh upload before its file is written or reused, and commit.
+    The new updated_at keeps the collector off the blob for its grace period,
+    which is the writer's time to add_ref() it; an upload nothing ever
+    references is collected after that. If the collector is removing this
+    blob right now, this waits for it to finish, so the caller then finds
+    the file gone and writes it again.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "INSERT INTO blobs (name, ref_count) VALUES (%s, 0) ON DUPLICATE KEY UPDATE updated_at = CURRENT_TIMESTAMP",
+            (name,)
+        )
+        conn.commit()
+    finally:
+        cursor.close()
+
+
+def add_ref(cursor, name):
+    """Record one more row pointing at a blob (call in the writer's transaction)"""
+    cursor.execute(
+        "INSERT INTO blobs (name, ref_count) VALUES (%s, 1) ON DUPLICATE KEY UPDATE ref_count = ref_count + 1",
+        (name,)
+    )
+
+
+def drop_ref(cursor, name):
+    """Record that one row no longer points at a blob; GC removes it once unreferenced"""
+    cursor.execute(
+        "UPDATE blobs SET ref_count = ref_count - 1 WHERE name = %s AND ref_count > 0",
+        (name,)
+    )
+
+
+def collect_garbage(conn, storage, delete_files, grace_seconds=3600):
+    """
+    Recount references from products (covers cascaded deletes and images
+    uploaded before blob tracking existed), register stored uploads that have
+    no blobs row at all, then delete blobs that have had no references for at
+    least `grace_seconds`. `delete_files(name)` removes the blob and anything
+    derived from it. Returns the number of blobs removed.
+    """
+    cursor = conn.cursor()
+    cursor.execute(
+        """INSERT IGNORE INTO blobs (name, ref_count)
+           SELECT DISTINCT image, 0 FROM products WHERE image IS NOT NULL AND image != 'default-product.jpg'"""
+    )
+    cursor.execute(
+        """UPDATE blobs b
+           LEFT JOIN (SELECT image, COUNT(*) AS refs FROM products GROUP BY image) p ON p.image = b.name
+           SET b.ref_count = COALESCE(p.refs, 0)
+           WHERE b.ref_count != COALESCE(p.refs, 0)"""
+    )
+    # Files nothing ever recorded (the product was never saved) start their grace period now
+    orphans = [(name,) for name in storage.list_names() if UPLOAD_NAME.match(name)]
+    for start in range(0, len(orphans), 500):
+        cursor.executemany("INSERT IGNORE INTO blobs (name, ref_count) VALUES (%s, 0)", orphans[start:start + 500])
+    conn.commit()
+
+    due = "ref_count = 0 AND updated_at < NOW() - INTERVAL %s SECOND"
+    cursor.execute(f"SELECT name FROM blobs WHERE {due}", (grace_seconds,))
+    names = [row[0] for row in cursor.fetchall()]
+    removed = 0
+    try:
+        for name in names:
+            # Lock the row and check again: a claim_blob() or add_ref() since the SELECT above
+            # makes it no longer due, and one arriving now waits until the file is gone
+            cursor.execute(f"SELECT name FROM blobs WHERE name = %s AND {due} FOR UPDATE", (name, grace_seconds))
+            if cursor.fetchone():
+                try:
+                    delete_files(name)
+                except ValueError as e:
+                    # A name that isn't a plain file name (see _check_name): forget it, touch no files
+                    print(f"Not removing files for blob {name!r}: {e}")
+                cursor.execute("DELETE FROM blobs WHERE name = %s", (name,))
+                removed += 1
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    return removed
+
+
+def start_collector(get_connection, storage, delete_files, interval, grace_seconds):
+    """Run collect_garbage() every `interval` seconds in a daemon thread"""
+    def loop():
+        while True:
+            time.sleep(interval)
+            conn = get_connection()
+            if not conn:
+                continue
+            try:
+                removed = collect_garbage(conn, storage, delete_files, grace_seconds)
+                if removed:
+                    print(f"Removed {removed} unreferenced upload(s)")
+            except Exception as e:
+                print(f"Error collecting unused uploads: {e}")
+            finally:
+                conn.close()
+
+    thread = threading.Thread(target=loop, name='storage-gc', daemon=True)
+    thread.start()
+    return thread
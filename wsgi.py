@@ -0,0 +1,17 @@
+"""
+WSGI entry point for production servers
+
+    gunicorn -c gunicorn.conf.py
+
+Importing this module only builds the Flask app; the schema is initialized
+once by the gunicorn master (see gunicorn.conf.py), not by every worker.
+"""
+
+import time
+
+_import_started = time.perf_counter()
+
+from app import app as application  # noqa: E402
+
+# Reported by the gunicorn master once it is ready
+IMPORT_SECONDS = time.perf_counter() - _import_started